@@ -1,24 +1,231 @@
-async def get_visible_groups(user_id: int, bot, all_groups):
+import os
+import time
+import asyncio
+import logging
+from typing import Tuple
+from telegram.ext import ChatMemberHandler
+import metrics
+from database import (_call_db, replace_chat_admins, mark_admin_index_attempt, set_admin_index_role,
+                      get_chat_admin_index, drop_admin_index_chat, get_admin_groups, list_stale_admin_chats, count_unindexed_admin_chats)
+
+logger = logging.getLogger(__name__)
+
+# --- Admin-Cache ---
+# Pro Chat die Admin-IDs (inkl. Inhaber): beim ersten Bedarf per get_chat_administrators
+# geladen, danach aus CHAT_MEMBER/MY_CHAT_MEMBER-Updates fortgeschrieben und spätestens
+# nach ADMIN_CACHE_TTL_S neu geholt. Spart 1–3 Telegram-Requests pro Nachricht.
+# Scheitert der erste Abruf, gilt der persistente Admin-Index; fehlt auch der (known=False),
+# wird wie früher je Nutzer per get_chat_member gefragt – schlägt auch das fehl, werden
+# keine Privilegien angenommen.
+ADMIN_CACHE_TTL_S = float(os.getenv("ADMIN_CACHE_TTL_S", "900"))
+# nach einem Fehler (z. B. Flood-Limit) erst nach dieser Pause erneut fragen
+ADMIN_CACHE_RETRY_S = float(os.getenv("ADMIN_CACHE_RETRY_S", "30"))
+# persistenter Admin-Index (DB): Alter, ab dem der Refresh-Job einen Chat neu abfragt
+ADMIN_INDEX_MAX_AGE_S = float(os.getenv("ADMIN_INDEX_MAX_AGE_S", "21600"))
+ADMIN_INDEX_RETRY_S = float(os.getenv("ADMIN_INDEX_RETRY_S", "3600"))
+ADMIN_INDEX_CONCURRENCY = int(os.getenv("ADMIN_INDEX_CONCURRENCY", "5"))
+ADMIN_INDEX_BATCH = int(os.getenv("ADMIN_INDEX_BATCH", "200"))
+
+class _ChatAdmins:
+    __slots__ = ("owner_id", "admin_ids", "expires", "known")
+
+    def __init__(self, owner_id, admin_ids: frozenset, expires: float, known: bool = True):
+        self.owner_id = owner_id
+        self.admin_ids = admin_ids
+        self.expires = expires
+        self.known = known
+
+_admins: dict[int, _ChatAdmins] = {}
+_inflight: dict[int, asyncio.Future] = {}
+_admin_stats = {"hits": 0, "loads": 0, "load_errors": 0, "updates": 0, "index_fallbacks": 0, "unknown": 0,
+                "member_fallbacks": 0}
+
+metrics.gauge("admin_cache", lambda: dict(_admin_stats, chats=len(_admins)))
+
+async def _load_admins(bot, chat_id: int) -> _ChatAdmins:
+    # gleichzeitige Anfragen für denselben Chat teilen sich einen Request
+    fut = _inflight.get(chat_id)
+    if fut is not None:
+        entry = await asyncio.shield(fut)
+        if entry is None:   # erster Aufrufer abgebrochen → selbst laden
+            return await _load_admins(bot, chat_id)
+        return entry
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[chat_id] = fut
+    try:
+        _admin_stats["loads"] += 1
+        try:
+            admins = await bot.get_chat_administrators(chat_id)
+            owner = next((a.user.id for a in admins if a.status == "creator"), None)
+            entry = _ChatAdmins(owner, frozenset(a.user.id for a in admins), time.monotonic() + ADMIN_CACHE_TTL_S)
+            await _index_call(replace_chat_admins, chat_id,
+                              [(a.user.id, "creator" if a.user.id == owner else "administrator") for a in admins])
+        except Exception as e:
+            _admin_stats["load_errors"] += 1
+            logger.debug(f"get_chat_administrators({chat_id}) fehlgeschlagen: {e}")
+            await _index_call(mark_admin_index_attempt, chat_id)
+            # alten Stand weiterverwenden, sonst den Index; kurz später erneut versuchen
+            entry = _admins.get(chat_id) or await _from_index(chat_id)
+            entry = _ChatAdmins(entry.owner_id, entry.admin_ids, time.monotonic() + ADMIN_CACHE_RETRY_S, entry.known)
+        _admins[chat_id] = entry
+        fut.set_result(entry)
+        return entry
+    finally:
+        # nicht abbrechen: die übrigen Wartenden wurden nicht gecancelt und laden selbst neu
+        if not fut.done():
+            fut.set_result(None)
+        _inflight.pop(chat_id, None)
+
+async def _from_index(chat_id: int) -> _ChatAdmins:
+    try:
+        indexed, rows = await _call_db(get_chat_admin_index, chat_id)
+    except Exception as e:
+        logger.warning(f"Admin-Index für {chat_id} nicht lesbar: {e}")
+        indexed, rows = False, []
+    if not indexed:
+        _admin_stats["unknown"] += 1
+        return _ChatAdmins(None, frozenset(), 0.0, known=False)
+    _admin_stats["index_fallbacks"] += 1
+    owner = next((uid for uid, role in rows if role == "creator"), None)
+    return _ChatAdmins(owner, frozenset(uid for uid, _ in rows), 0.0)
+
+def _ids(chat, user, bot):
+    chat_id = chat if isinstance(chat, int) else chat.id
+    user_id = user if (user is None or isinstance(user, int)) else user.id
+    if bot is None:
+        bot = chat.get_bot()
+    return chat_id, user_id, bot
+
+async def get_chat_admins(chat, bot=None) -> _ChatAdmins:
+    chat_id, _, bot = _ids(chat, None, bot)
+    entry = _admins.get(chat_id)
+    if entry is not None and entry.expires > time.monotonic():
+        _admin_stats["hits"] += 1
+        return entry
+    return await _load_admins(bot, chat_id)
+
+async def get_admin_role(chat, user, bot=None) -> str | None:
+    """'creator', 'administrator' oder None – aus dem Admin-Cache."""
+    chat_id, user_id, bot = _ids(chat, user, bot)
+    if user_id is None:
+        return None
+    entry = await get_chat_admins(chat_id, bot)
+    if not entry.known:
+        return await _member_role(bot, chat_id, user_id)
+    if user_id == entry.owner_id:
+        return "creator"
+    return "administrator" if user_id in entry.admin_ids else None
+
+async def _member_role(bot, chat_id: int, user_id: int) -> str | None:
+    # Admin-Stand des Chats unbekannt → Einzelabfrage; bei Fehler lieber keine Privilegien annehmen
+    _admin_stats["member_fallbacks"] += 1
+    try:
+        cm = await bot.get_chat_member(chat_id, user_id)
+    except Exception as e:
+        logger.debug(f"get_chat_member({chat_id}, {user_id}) fehlgeschlagen: {e}")
+        return None
+    status = getattr(cm, "status", None)
+    return status if status in ("creator", "administrator") else None
+
+async def is_privileged(chat, user, bot=None) -> bool:
+    """Ist user Admin oder Inhaber von chat? chat/user als Objekt oder ID (bei IDs bot angeben)."""
+    return (await get_admin_role(chat, user, bot)) is not None
+
+def invalidate_admins(chat_id: int) -> None:
+    _admins.pop(chat_id, None)
+
+async def _index_call(fn, *args):
+    # der Index ist nur eine Beschleunigung: DB-Fehler dürfen den Admin-Check nicht kippen
+    try:
+        await _call_db(fn, *args)
+    except Exception as e:
+        logger.warning(f"Admin-Index ({fn.__name__}) fehlgeschlagen: {e}")
+
+async def admin_cache_tracker(update, context):
+    """Schreibt den Admin-Cache aus CHAT_MEMBER/MY_CHAT_MEMBER-Updates fort (ohne API-Aufruf)."""
+    cmu = update.chat_member or update.my_chat_member
+    if cmu is None:
+        return
+    chat_id = cmu.chat.id
+    new = cmu.new_chat_member
+    if update.my_chat_member is not None and new.status in ("left", "kicked"):
+        _admins.pop(chat_id, None)
+        await _index_call(drop_admin_index_chat, chat_id)
+        return
+    # der Index wird immer fortgeschrieben, auch wenn der Chat gerade nicht im Speicher liegt
+    role = new.status if new.status in ("creator", "administrator") else None
+    await _index_call(set_admin_index_role, chat_id, new.user.id, role)
+    entry = _admins.get(chat_id)
+    if entry is None:
+        return  # noch nicht geladen → wird beim ersten Bedarf frisch geholt
+    _admin_stats["updates"] += 1
+    uid = new.user.id
+    ids = set(entry.admin_ids)
+    owner = entry.owner_id
+    if new.status == "creator":
+        owner = uid
+        ids.add(uid)
+    elif new.status == "administrator":
+        ids.add(uid)
+        if owner == uid:
+            owner = None
+    else:
+        ids.discard(uid)
+        if owner == uid:
+            owner = None
+    _admins[chat_id] = _ChatAdmins(owner, frozenset(ids), entry.expires, entry.known)
+
+def register_admin_cache(app):
+    # eigene Gruppe: track_members (Gruppe 0) bekommt die Updates weiterhin
+    app.add_handler(ChatMemberHandler(admin_cache_tracker, ChatMemberHandler.ANY_CHAT_MEMBER), group=-4)
+
+async def refresh_admin_index(bot, limit: int | None = None) -> int:
+    """Veraltete/nie indizierte Gruppen neu abfragen (höchstens ADMIN_INDEX_CONCURRENCY parallel)."""
+    chat_ids = await _call_db(list_stale_admin_chats, ADMIN_INDEX_MAX_AGE_S, ADMIN_INDEX_RETRY_S,
+                              limit or ADMIN_INDEX_BATCH)
+    if not chat_ids:
+        return 0
+    sem = asyncio.Semaphore(max(1, ADMIN_INDEX_CONCURRENCY))
+
+    async def _one(chat_id):
+        async with sem:
+            await _load_admins(bot, chat_id)   # schreibt den Index (oder den Fehlversuch) selbst
+
+    await asyncio.gather(*(_one(cid) for cid in chat_ids))
+    return len(chat_ids)
+
+async def get_visible_groups(user_id: int, bot, all_groups=None):
     """
-    Gibt nur Gruppen zurück, in denen der Bot aktiv ist und der Nutzer Admin ist.
+    Gibt nur Gruppen zurück, in denen der Bot aktiv ist und der Nutzer Admin ist (aus dem Admin-Index).
+    all_groups wird nicht mehr benötigt (Index ist mit groups gejoint), bleibt für alte Aufrufer.
     """
-    visible = []
-    for chat_id, title in all_groups:
+    visible = await _call_db(get_admin_groups, user_id)
+    if not visible and await _call_db(count_unindexed_admin_chats):
+        # Kaltstart (Index noch leer): Abfrage im Hintergrund starten, sofort mit dem Indexstand antworten
+        _start_cold_refresh(bot)
+    return [(chat_id, title) for chat_id, title in visible]
+
+_cold_refresh_task: asyncio.Task | None = None
+
+def _start_cold_refresh(bot) -> None:
+    global _cold_refresh_task
+    if _cold_refresh_task is not None and not _cold_refresh_task.done():
+        return
+
+    async def _run():
         try:
-            admins = await bot.get_chat_administrators(chat_id)
-            if any(a.user.id == user_id for a in admins):
-                visible.append((chat_id, title))
-        except:
-            continue
-    return visible
+            n = await refresh_admin_index(bot)
+            logger.info(f"Admin-Index (Kaltstart): {n} Gruppen abgefragt")
+        except Exception as e:
+            logger.warning(f"Admin-Index (Kaltstart) fehlgeschlagen: {e}")
 
-from typing import Tuple
+    _cold_refresh_task = asyncio.get_running_loop().create_task(_run())
 
 async def resolve_privileged_flags(message, context) -> Tuple[bool, bool, bool, bool, int, int]:
     """
     Liefert (is_owner, is_admin, is_anon_admin, is_topic_owner, chat_id, user_id).
 
-    - Owner/Admin werden via get_chat_member festgestellt
+    - Owner/Admin kommen aus dem Admin-Cache (get_admin_role)
     - Anonyme Admins/Inhaber: message.sender_chat.id == chat.id
     - Topic-Owner: aktuell immer False (kann erweitert werden)
     """
@@ -41,10 +248,9 @@ async def resolve_privileged_flags(message, context) -> Tuple[bool, bool, bool,
 
     user_id = from_user.id
 
-    # 3) ChatMember-Status prüfen
+    # 3) Rolle aus dem Admin-Cache
     try:
-        cm = await context.bot.get_chat_member(chat_id, user_id)
-        status = getattr(cm, "status", None)
+        status = await get_admin_role(chat_id, user_id, context.bot)
         if status == "creator":
             is_owner = True
         elif status == "administrator":
@@ -52,4 +258,4 @@ async def resolve_privileged_flags(message, context) -> Tuple[bool, bool, bool,
     except Exception:
         pass  # bei Fehler lieber keine Privilegien annehmen
 
-    return (is_owner, is_admin, is_anon_admin, is_topic_owner, chat_id, user_id)
\ No newline at end of file
+    return (is_owner, is_admin, is_anon_admin, is_topic_owner, chat_id, user_id)
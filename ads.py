@@ -12,6 +12,7 @@ from telegram.ext import ContextTypes, CommandHandler, Application, filters
 # interne Imports aus eurer Codebase
 from database import (
     _with_cursor,
+    register_migration,
     get_registered_groups,      # (chat_id, title)
     get_group_language,         # chat -> 'de'/'en'/...
 )
@@ -486,6 +487,8 @@ def init_ads_schema():
     """Nach DB-Init aufrufen."""
     ensure_adv_schema()
 
+register_migration(7, "adv_schema", ensure_adv_schema)
+
 def register_ads(app: Application):
     """Kommandos registrieren (nur Developer haben Zugriff)."""
     app.add_handler(CommandHandler("set_adv_topic", set_adv_topic_command, filters=filters.ChatType.GROUPS))
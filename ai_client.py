@@ -0,0 +1,183 @@
+"""
+Prozessweiter OpenAI-Client für alle KI-Aufrufe (Moderation, Zusammenfassungen, Übersetzung).
+
+Ein AsyncOpenAI mit eigenem httpx-Verbindungspool (Keep-Alive statt TLS-Handshake pro Aufruf),
+festen Timeouts, begrenzter Parallelität (AI_CONCURRENCY) und Wiederholungen mit Full-Jitter
+bei 408/409/429/5xx und Verbindungsfehlern. Für Code, der in Threads läuft (Übersetzungs-
+Fallback, Katalog-Füllung), gibt es dasselbe als synchrone Variante (chat_sync).
+Ohne OPENAI_API_KEY oder ohne openai-Paket ist available() False.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import metrics
+
+try:
+    import httpx
+    import openai
+except ImportError:  # KI-Funktionen optional
+    httpx = None
+    openai = None
+
+logger = logging.getLogger(__name__)
+
+AI_TIMEOUT_S = float(os.getenv("AI_TIMEOUT_S", "30"))
+AI_CONNECT_TIMEOUT_S = float(os.getenv("AI_CONNECT_TIMEOUT_S", "5"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_MAX_KEEPALIVE = int(os.getenv("AI_MAX_KEEPALIVE", "10"))
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "8"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_RETRY_BASE_S = float(os.getenv("AI_RETRY_BASE_S", "0.5"))
+AI_RETRY_MAX_S = float(os.getenv("AI_RETRY_MAX_S", "8"))
+
+_RETRY_STATUS = {408, 409, 429}
+
+_async_client = None
+_sync_client = None
+_client_lock = threading.Lock()
+_async_sem: asyncio.Semaphore | None = None
+_sync_sem = threading.BoundedSemaphore(max(1, AI_CONCURRENCY))
+_stats = {"calls": 0, "retries": 0, "errors": 0, "in_flight": 0}
+
+metrics.gauge("ai_client", lambda: dict(_stats))
+
+
+def available() -> bool:
+    return openai is not None and bool(os.getenv("OPENAI_API_KEY"))
+
+
+def _timeout():
+    return httpx.Timeout(AI_TIMEOUT_S, connect=AI_CONNECT_TIMEOUT_S)
+
+
+def _limits():
+    return httpx.Limits(max_connections=AI_MAX_CONNECTIONS, max_keepalive_connections=AI_MAX_KEEPALIVE)
+
+
+def get_client():
+    """Der gemeinsame AsyncOpenAI (eigene Wiederholungen → max_retries=0)."""
+    global _async_client
+    if _async_client is None:
+        if not available():
+            raise RuntimeError("OpenAI nicht verfügbar (OPENAI_API_KEY/openai fehlt)")
+        _async_client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            timeout=_timeout(), max_retries=0,
+        )
+    return _async_client
+
+
+def get_sync_client():
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            if not available():
+                raise RuntimeError("OpenAI nicht verfügbar (OPENAI_API_KEY/openai fehlt)")
+            _sync_client = openai.OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                timeout=_timeout(), max_retries=0,
+            )
+    return _sync_client
+
+
+def _retry_delay(exc, attempt: int) -> float | None:
+    """Wartezeit vor dem nächsten Versuch oder None (nicht wiederholbar / Versuche aufgebraucht)."""
+    if attempt >= AI_MAX_RETRIES:
+        return None
+    if isinstance(exc, openai.APIConnectionError):   # inkl. APITimeoutError
+        pass
+    elif isinstance(exc, openai.APIStatusError):
+        if exc.status_code not in _RETRY_STATUS and exc.status_code < 500:
+            return None
+        retry_after = exc.response.headers.get("retry-after") if exc.response is not None else None
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), AI_RETRY_MAX_S)
+        except ValueError:
+            pass
+    else:
+        return None
+    return random.uniform(0, min(AI_RETRY_MAX_S, AI_RETRY_BASE_S * (2 ** attempt)))
+
+
+async def _call(fn, **kwargs):
+    global _async_sem
+    if _async_sem is None:
+        _async_sem = asyncio.Semaphore(max(1, AI_CONCURRENCY))
+    attempt = 0
+    while True:
+        async with _async_sem:
+            _stats["calls"] += 1
+            _stats["in_flight"] += 1
+            try:
+                return await fn(**kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    _stats["errors"] += 1
+                    raise
+            finally:
+                _stats["in_flight"] -= 1
+        # außerhalb des Semaphors warten, damit andere Aufrufe weiterlaufen
+        attempt += 1
+        _stats["retries"] += 1
+        logger.debug(f"OpenAI-Aufruf wird in {delay:.2f}s wiederholt (Versuch {attempt + 1})")
+        await asyncio.sleep(delay)
+
+
+def _call_sync(fn, **kwargs):
+    attempt = 0
+    while True:
+        with _sync_sem:
+            _stats["calls"] += 1
+            _stats["in_flight"] += 1
+            try:
+                return fn(**kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    _stats["errors"] += 1
+                    raise
+            finally:
+                _stats["in_flight"] -= 1
+        attempt += 1
+        _stats["retries"] += 1
+        time.sleep(delay)
+
+
+async def chat(**kwargs):
+    """chat.completions.create über den gemeinsamen Client (Argumente wie bei openai)."""
+    return await _call(get_client().chat.completions.create, **kwargs)
+
+
+async def moderate(**kwargs):
+    """moderations.create über den gemeinsamen Client."""
+    return await _call(get_client().moderations.create, **kwargs)
+
+
+def chat_sync(**kwargs):
+    """Blockierende Variante für Threads – nie direkt im Event-Loop aufrufen."""
+    return _call_sync(get_sync_client().chat.completions.create, **kwargs)
+
+
+async def aclose() -> None:
+    """Verbindungspools beim Shutdown schließen."""
+    global _async_client, _sync_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug(f"AsyncOpenAI.close fehlgeschlagen: {e}")
+    with _client_lock:
+        sync_client, _sync_client = _sync_client, None
+    if sync_client is not None:
+        try:
+            sync_client.close()
+        except Exception as e:
+            logger.debug(f"OpenAI.close fehlgeschlagen: {e}")
@@ -0,0 +1,268 @@
+"""
+Cold-Storage-Archiv für reine Ereignis-Tabellen (spam_events, ai_mod_logs, …).
+
+Zeilen älter als ARCHIVE_AFTER_DAYS werden batchweise als komprimierte Dateien unter
+ARCHIVE_DIR/<tabelle>/chat=<id>/month=<JJJJ-MM>/ abgelegt und danach in Postgres gelöscht.
+Mit pyarrow: Parquet (zstd), sonst gzip-JSON-Lines. Die Leser (read_archived/count_archived)
+kennen beide Formate, so dass Exporte und Auswertungen archivierte Zeiträume mitzählen.
+
+ARCHIVE_DIR hat keinen Default: es muss ein absoluter, vorhandener Pfad auf dauerhaftem Speicher
+sein (Volume oder gemountetes Object Storage). Auf Heroku-Dynos ist das Dateisystem flüchtig –
+dort wird nur archiviert (und gelöscht), wenn ARCHIVE_DIR_PERSISTENT=1 den Mount bestätigt.
+
+Zeitangaben: gespeicherte TIMESTAMP-Spalten (ohne Zone) sind UTC. Die Grenzen start/end der Leser
+müssen dagegen zeitzonenbehaftet sein (oder ein date = UTC-Kalendertag); naive datetimes werden
+abgewiesen, statt stillschweigend als UTC zu gelten.
+"""
+import os
+import json
+import gzip
+import time
+import logging
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+from database import _with_cursor, _utcnow, use_pool
+
+logger = logging.getLogger(__name__)
+
+try:  # optional: Parquet/zstd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+ARCHIVE_DIR = (os.getenv("ARCHIVE_DIR") or "").strip() or None
+ARCHIVE_DIR_PERSISTENT = os.getenv("ARCHIVE_DIR_PERSISTENT", "0").strip().lower() in ("1", "true", "yes", "on")
+# 0 = Archivierung aus. Untergrenze 7 Tage: Rollups (agg_group_day) lesen den Vortag aus den Rohtabellen.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "5000"))
+ARCHIVE_PAUSE_S = float(os.getenv("ARCHIVE_PAUSE_S", "0.2"))
+
+# Tabelle → Zeitstempel-Spalte
+ARCHIVE_TABLES = {
+    "spam_events":          "ts",
+    "ai_mod_logs":          "ts",
+    "feature_interactions": "ts",
+    "command_logs":         "used_at",
+    "night_events":         "ts",
+    "auto_responses":       "ts",
+    "reply_times":          "ts",
+    "adv_impressions":      "ts",
+}
+
+_UTC = ZoneInfo("UTC")
+_seq = itertools.count()
+
+
+def archive_dir_problem() -> str | None:
+    """Warum ARCHIVE_DIR nicht als dauerhafter Speicher taugt – None, wenn archiviert werden darf."""
+    if not ARCHIVE_DIR:
+        return "ARCHIVE_DIR nicht gesetzt"
+    if not os.path.isabs(ARCHIVE_DIR):
+        return f"ARCHIVE_DIR={ARCHIVE_DIR!r} ist kein absoluter Pfad"
+    if not os.path.isdir(ARCHIVE_DIR):
+        return f"ARCHIVE_DIR={ARCHIVE_DIR!r} existiert nicht (Volume/Mount fehlt?)"
+    if os.getenv("DYNO") and not ARCHIVE_DIR_PERSISTENT:
+        return "Heroku-Dateisystem ist flüchtig (ARCHIVE_DIR_PERSISTENT=1 nur für einen dauerhaften Mount setzen)"
+    return None
+
+
+def _bound(ts, name: str) -> datetime:
+    """Grenze einer Abfrage: date = UTC-Tag, datetime nur mit Zeitzone."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            raise ValueError(f"{name}={ts!r} ohne Zeitzone – UTC bitte ausdrücklich angeben")
+        return ts.astimezone(_UTC)
+    if isinstance(ts, date):
+        return datetime(ts.year, ts.month, ts.day, tzinfo=_UTC)
+    raise TypeError(f"{name}: datetime oder date erwartet, nicht {type(ts).__name__}")
+
+
+def _as_utc(ts) -> datetime | None:
+    if ts is None:
+        return None
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    elif isinstance(ts, date) and not isinstance(ts, datetime):
+        ts = datetime(ts.year, ts.month, ts.day)
+    # TIMESTAMP-Spalten (ohne Zone) werden als UTC behandelt
+    return ts.replace(tzinfo=_UTC) if ts.tzinfo is None else ts.astimezone(_UTC)
+
+
+def _plain(v):
+    """Werte in Parquet-/JSON-taugliche Typen bringen (JSONB → Text, NUMERIC → float)."""
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, ensure_ascii=False)
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+def _partition_dir(table: str, chat_id, month: str) -> str:
+    chat = "none" if chat_id is None else str(chat_id)
+    return os.path.join(ARCHIVE_DIR, table, f"chat={chat}", f"month={month}")
+
+
+def _write_file(directory: str, rows: list[dict]) -> str:
+    """Schreibt eine unveränderliche Archivdatei (erst .tmp, dann atomar umbenennen)."""
+    os.makedirs(directory, exist_ok=True)
+    ext = "parquet" if pq is not None else "jsonl.gz"
+    path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{os.getpid()}-{next(_seq)}.{ext}")
+    tmp = path + ".tmp"
+    if pq is not None:
+        pq.write_table(pa.Table.from_pylist(rows), tmp, compression="zstd")
+    else:
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False, default=_json_default))
+                f.write("\n")
+    os.replace(tmp, path)
+    return path
+
+
+def _read_file(path: str) -> list[dict]:
+    if path.endswith(".parquet"):
+        if pq is None:
+            logger.warning(f"Archivdatei {path} übersprungen (pyarrow nicht installiert)")
+            return []
+        return pq.read_table(path).to_pylist()
+    if path.endswith(".jsonl.gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return []
+
+
+@_with_cursor
+def _archive_batch(cur, table: str, ts_col: str, cutoff: datetime, limit: int) -> int:
+    cur.execute(
+        f"SELECT ctid::text, * FROM {table} WHERE {ts_col} < %s LIMIT %s FOR UPDATE;",
+        (cutoff, limit)
+    )
+    fetched = cur.fetchall()
+    if not fetched:
+        return 0
+    cols = [d[0] for d in cur.description[1:]]
+    groups: dict[tuple, list[dict]] = {}
+    ctids = []
+    for rec in fetched:
+        ctids.append(rec[0])
+        row = {c: _plain(v) for c, v in zip(cols, rec[1:])}
+        ts = _as_utc(row.get(ts_col))
+        groups.setdefault((row.get("chat_id"), f"{ts:%Y-%m}"), []).append(row)
+
+    written = []
+    try:
+        for (chat_id, month), rows in groups.items():
+            written.append(_write_file(_partition_dir(table, chat_id, month), rows))
+        cur.execute(f"DELETE FROM {table} WHERE ctid = ANY(%s::tid[]);", (ctids,))
+    except Exception:
+        # Dateien zurücknehmen, die Zeilen bleiben in der DB
+        for path in written:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    return len(fetched)
+
+
+def archive_table(table: str, older_than_days: int | None = None) -> int:
+    """Archiviert alle Zeilen einer Tabelle, die älter als older_than_days sind. Liefert die Anzahl."""
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    if days <= 0:
+        return 0
+    problem = archive_dir_problem()
+    if problem:
+        # ohne dauerhaften Speicher wären die Zeilen nach dem Löschen verloren
+        raise RuntimeError(f"Archivierung verweigert: {problem}")
+    ts_col = ARCHIVE_TABLES[table]
+    cutoff = _utcnow() - timedelta(days=max(7, days))
+    moved = 0
+    while True:
+        n = _archive_batch(table, ts_col, cutoff, ARCHIVE_BATCH_ROWS)
+        moved += n
+        if n < ARCHIVE_BATCH_ROWS:
+            break
+        if ARCHIVE_PAUSE_S:
+            time.sleep(ARCHIVE_PAUSE_S)
+    if moved:
+        logger.info(f"📦 {table}: {moved} Zeilen nach {ARCHIVE_DIR} archiviert")
+    return moved
+
+
+def run_archiver() -> dict[str, int]:
+    """Archiviert alle Ereignis-Tabellen (Fehler einer Tabelle halten die anderen nicht auf)."""
+    result = {}
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return result
+    problem = archive_dir_problem()
+    if problem:
+        logger.error(f"Archivierung übersprungen, keine Zeile gelöscht: {problem}")
+        return result
+    with use_pool("maintenance"):
+        for table in ARCHIVE_TABLES:
+            try:
+                result[table] = archive_table(table)
+            except Exception:
+                logger.exception(f"Archivierung von {table} fehlgeschlagen")
+    return result
+
+
+def _months(start: datetime, end: datetime):
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        yield f"{y:04d}-{m:02d}"
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+def read_archived(table: str, chat_id: int, start, end) -> list[dict]:
+    """Archivierte Zeilen eines Chats mit start <= ts < end (leer, wenn nichts archiviert ist)."""
+    start, end = _bound(start, "start"), _bound(end, "end")
+    if not ARCHIVE_DIR:
+        return []
+    base = os.path.join(ARCHIVE_DIR, table, f"chat={chat_id}")
+    if not os.path.isdir(base):
+        return []
+    ts_col = ARCHIVE_TABLES[table]
+    out = []
+    for month in _months(start, end):
+        directory = os.path.join(base, f"month={month}")
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".tmp"):
+                continue
+            for row in _read_file(os.path.join(directory, name)):
+                ts = _as_utc(row.get(ts_col))
+                if ts is not None and start <= ts < end:
+                    row[ts_col] = ts
+                    out.append(row)
+    return out
+
+
+def count_archived(table: str, chat_id: int, start, end, key: str, weight: str | None = None) -> Counter:
+    """Zählt archivierte Zeilen je Wert von key (optional Summe über weight)."""
+    counts = Counter()
+    for row in read_archived(table, chat_id, start, end):
+        counts[row.get(key)] += int(row.get(weight) or 0) if weight else 1
+    return counts
+
+
+def merge_counts(rows, extra: Counter, key: str, cnt: str = "cnt") -> list[dict]:
+    """DB-Zeilen (key, cnt) und archivierte Zählungen zusammenführen, absteigend sortiert."""
+    if not extra:
+        return rows
+    acc = Counter({row[key]: int(row[cnt] or 0) for row in rows})
+    acc.update(extra)
+    return [{key: k, cnt: n} for k, n in acc.most_common()]
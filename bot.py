@@ -3,18 +3,23 @@ import datetime
 import logging
 import statistic
 import asyncio
+import ai_client
 from telegram.ext import filters, MessageHandler, Application, PicklePersistence
 from telethon_client import telethon_client, start_telethon
 from telethon import TelegramClient
 from handlers import register_handlers, error_handler
+from access import register_admin_cache
+from message_context import register_message_context
 from menu import register_menu
 from rss import register_rss
-from database import init_all_schemas
+from database import init_all_schemas, use_async_engine, start_pool_reaper, flush_write_buffer, update_session, start_backfills, start_settings_listener
+from metrics import start_metrics_server
+from catalog import start_catalog
 from logger import setup_logging
 from mood import register_mood
 from jobs import register_jobs
 from request_config import create_request_with_increased_pool
-from ads import init_ads_schema, register_ads, register_ads_jobs
+from ads import register_ads, register_ads_jobs
 from devmenu import register_dev_handlers
 from statistic import register_statistics_handlers
 
@@ -31,6 +36,15 @@ WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 if not WEBHOOK_URL:
     raise ValueError("WEBHOOK_URL ist nicht gesetzt.")
 PORT = int(os.getenv("PORT", 8443))
+# Nur im async-Engine-Modus sinnvoll: Updates verschiedener Chats parallel verarbeiten
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+
+class SessionApplication(Application):
+    """Application mit einer DB-Session (eine Verbindung, Commit je Aufruf) pro Update."""
+
+    async def process_update(self, update: object) -> None:
+        async with update_session():
+            await super().process_update(update)
 
 async def log_update(update, context):
     logging.debug(f"Update angekommen: {update}")
@@ -51,7 +65,13 @@ async def post_shutdown(application: Application) -> None:
     Kann für Aufräumarbeiten verwendet werden.
     """
     logging.info("Bot wird heruntergefahren.")
-    # Wenn nötig, hier zusätzliche Ressourcen freigeben
+    # Gepufferte Log-/Zähler-Zeilen garantiert wegschreiben
+    try:
+        flush_write_buffer()
+    except Exception:
+        logging.exception("Write-behind-Flush beim Shutdown fehlgeschlagen")
+    # HTTP-Verbindungspools des OpenAI-Clients schließen
+    await ai_client.aclose()
     try:
         await application.bot.send_message(chat_id=os.getenv("DEVELOPER_CHAT_ID", "5114518219"),
                                   text="🛑 Der Bot wird heruntergefahren.")
@@ -72,29 +92,41 @@ async def shutdown(signal, loop, client: TelegramClient, app: Application):
 
 def main():
     setup_logging()
+    # Schema über das Migration-Ledger (inkl. ads/statistic), Backfills laufen im Hintergrund
     init_all_schemas()
-    init_ads_schema()  # <- Hinzufügen
-    statistic.init_stats_db()
+    start_backfills()
+    start_pool_reaper()
+    start_settings_listener()
+    # UI-Texte: tr() aus vorkompilierten Katalogen (Lücken füllt ein Hintergrund-Thread)
+    start_catalog()
+    start_metrics_server()
 
     # Telethon (User-Session) verbinden
     asyncio.get_event_loop().run_until_complete(start_telethon())
 
     # Erstelle eine Application mit angepasstem Request-Objekt
     persistence = PicklePersistence(filepath="state.pickle")
-    app = (
+    builder = (
         Application.builder()
+        .application_class(SessionApplication)
         .token(BOT_TOKEN)
         .persistence(persistence)
         .request(create_request_with_increased_pool())
         .post_init(post_init)
         .post_shutdown(post_shutdown)
-        .build()
     )
+    if use_async_engine() and CONCURRENT_UPDATES > 1:
+        # DB-I/O blockiert den Loop nicht mehr → andere Chats parallel bedienen
+        builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+        logging.info(f"DB-Engine async, concurrent_updates={CONCURRENT_UPDATES}")
+    app = builder.build()
 
     app.add_error_handler(error_handler)
     app.add_handler(MessageHandler(filters.ALL, log_update), group=-2)
     
     # Handler-Reihenfolge korrigieren:
+    register_admin_cache(app)   # group=-4 (Admin-Cache aus ChatMember-Updates)
+    register_message_context(app)  # group=-3 (MessageContext je Update, für alle Enforcer)
     register_statistics_handlers(app)
     register_handlers(app)  # group=0 (Commands)
     register_mood(app)      # group=0 (Mood-Commands) - FRÜHER
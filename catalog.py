@@ -0,0 +1,149 @@
+"""
+Vorkompilierte UI-Textkataloge je Sprache.
+
+Die tr_async()-Texte in menu.py, handlers.py, jobs.py und user_manual.py sind Literale. Beim Start
+werden sie per AST eingesammelt, ihre Übersetzungen je Sprache mit einer Abfrage aus
+translations_cache geholt und in translator installiert – tr_async() ist danach ein dict-Lookup ohne
+DB oder Netzwerk. Fehlende Übersetzungen füllt ein Hintergrund-Thread über translate_hybrid
+(landet dabei in translations_cache); bis dahin und für alle Texte außerhalb des Katalogs
+(f-Strings, Nutzertexte) greift der normale Hybrid-Pfad.
+
+`python catalog.py` füllt translations_cache vorab für alle Sprachen (z. B. im Release-Schritt).
+"""
+import os
+import ast
+import logging
+import threading
+import translator
+from database import get_cached_translations, translation_key, use_pool
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SOURCES = ("menu.py", "handlers.py", "jobs.py", "user_manual.py")
+CATALOG_LANGUAGES = [l.strip() for l in os.getenv("CATALOG_LANGUAGES", "de,en,es,fr,it,ru").split(",") if l.strip()]
+# Sprache der Literale im Code: dafür ist der Katalog die Identität (kein API-Aufruf)
+CATALOG_SOURCE_LANG = os.getenv("CATALOG_SOURCE_LANG", "de")
+CATALOG_FILL = (os.getenv("CATALOG_FILL", "1").strip().lower() not in ("0", "false", "no", "off"))
+
+_TR_NAMES = {"tr", "tr_async", "translate_hybrid", "translate_hybrid_async"}
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_strings: list[str] = []
+_fill_thread: threading.Thread | None = None
+
+
+def _call_name(func) -> str | None:
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _str_const(node) -> str | None:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def collect_strings(sources=CATALOG_SOURCES) -> list[str]:
+    """Alle String-Literale (und Modulkonstanten wie HELP_TEXT), die an tr()/translate_hybrid gehen."""
+    trees = []
+    constants: dict[str, str] = {}
+    for name in sources:
+        path = os.path.join(_BASE_DIR, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (OSError, SyntaxError) as e:
+            logger.warning(f"Katalog: {name} nicht lesbar: {e}")
+            continue
+        trees.append(tree)
+        for stmt in tree.body:
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+                value = _str_const(stmt.value)
+                if value is not None:
+                    constants[stmt.targets[0].id] = value
+
+    found: dict[str, None] = {}   # geordnet, ohne Duplikate
+    for tree in trees:
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and node.args and _call_name(node.func) in _TR_NAMES):
+                continue
+            arg = node.args[0]
+            text = _str_const(arg)
+            if text is None and isinstance(arg, ast.Name):
+                text = constants.get(arg.id)
+            if text and text.strip():
+                found[text] = None
+    return list(found)
+
+
+def load_catalog(languages=None) -> dict[str, int]:
+    """Kataloge aus translations_cache bauen und installieren; liefert je Sprache die Zahl fehlender Texte."""
+    global _strings
+    _strings = collect_strings()
+    keys = {text: translation_key(text) for text in _strings}
+    missing = {}
+    for lang in languages or CATALOG_LANGUAGES:
+        if lang == CATALOG_SOURCE_LANG:
+            translator.install_catalog(lang, {text: text for text in _strings})
+            missing[lang] = 0
+            continue
+        try:
+            rows = get_cached_translations(lang, list(keys.values()))
+        except Exception as e:
+            logger.error(f"Katalog {lang}: translations_cache nicht lesbar: {e}")
+            rows = {}
+        table = {text: rows[h] for text, h in keys.items() if h in rows}
+        translator.install_catalog(lang, table)
+        missing[lang] = len(_strings) - len(table)
+    logger.info(f"UI-Katalog: {len(_strings)} Texte geladen, fehlend je Sprache: {missing}")
+    return missing
+
+
+def fill_catalog(languages=None) -> int:
+    """Fehlende Katalogtexte übersetzen (translate_hybrid → translations_cache) und nachtragen."""
+    filled = 0
+    for lang in languages or CATALOG_LANGUAGES:
+        if lang == CATALOG_SOURCE_LANG:
+            continue
+        added = {}
+        for text in _strings:
+            if translator.catalog_lookup(text, lang) is not None:
+                continue
+            translated = translator.translate_hybrid(text, lang, source_lang=CATALOG_SOURCE_LANG)
+            # unverändert = API-Fehler oder nichts zu übersetzen → beim nächsten Start erneut
+            if translated and translated != text:
+                added[text] = translated
+        if added:
+            translator.install_catalog(lang, added, merge=True)
+            filled += len(added)
+    if filled:
+        logger.info(f"UI-Katalog: {filled} Übersetzungen nachgetragen")
+    return filled
+
+
+def start_catalog() -> None:
+    """Beim Start: Kataloge laden (blockierend, eine Abfrage je Sprache), Lücken im Hintergrund füllen."""
+    global _fill_thread
+    missing = load_catalog()
+    if not CATALOG_FILL or not any(missing.values()) or (_fill_thread and _fill_thread.is_alive()):
+        return
+
+    def _run():
+        with use_pool("maintenance"):
+            try:
+                fill_catalog([lang for lang, n in missing.items() if n])
+            except Exception:
+                logger.exception("UI-Katalog: Nachfüllen abgebrochen")
+
+    _fill_thread = threading.Thread(target=_run, name="ui-catalog-fill", daemon=True)
+    _fill_thread.start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    load_catalog()
+    fill_catalog()
+    print(load_catalog())
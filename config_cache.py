@@ -0,0 +1,144 @@
+"""
+In-Process-Cache für Gruppen-Konfiguration (ChatConfig je Chat, Abschnitte je Topic).
+
+Die Getter in database.py (Sprache, Nachtmodus, Link-/Spam-/KI-Policy, Welcome, Captcha …)
+laufen pro Nachricht mehrfach. Ihre Ergebnisse liegen hier als Abschnitte eines ChatConfig
+(Schlüssel: (abschnitt, argumente)); jeder passende set_*/delete_* verwirft nach dem
+Schreiben den kompletten Eintrag des Chats und meldet die Änderung per NOTIFY an alle
+anderen Prozesse (Listener in database.start_settings_listener). CONFIG_CACHE_TTL_S ist
+nur das Sicherheitsnetz für Änderungen, die am Bot vorbei in der DB landen.
+"""
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CACHE_ENABLED = (os.getenv("CONFIG_CACHE", "1").strip().lower() not in ("0", "false", "no", "off"))
+CONFIG_CACHE_TTL_S = float(os.getenv("CONFIG_CACHE_TTL_S", "300"))
+CONFIG_CACHE_MAX_CHATS = int(os.getenv("CONFIG_CACHE_MAX_CHATS", "5000"))
+
+_MISSING = object()
+
+
+class ChatConfig:
+    """Geladene Konfigurations-Abschnitte eines Chats."""
+    __slots__ = ("chat_id", "sections", "loaded_at")
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.sections: dict[tuple, object] = {}
+        self.loaded_at = time.monotonic()
+
+    def expired(self, ttl: float) -> bool:
+        return ttl > 0 and (time.monotonic() - self.loaded_at) > ttl
+
+
+def _copy(value):
+    # Aufrufer verändern gelieferte dicts/Listen gern (base.update(...)) → nie das Cache-Objekt herausgeben
+    if isinstance(value, (dict, list, set)):
+        return copy.deepcopy(value)
+    return value
+
+
+class ConfigCache:
+    def __init__(self, ttl_s: float, max_chats: int):
+        self.ttl = ttl_s
+        self.max_chats = max(1, max_chats)
+        self._lock = threading.Lock()
+        self._chats: "OrderedDict[int, ChatConfig]" = OrderedDict()
+        # Generation je Chat (+ globale Epoche für clear()): ein Ladevorgang, der eine
+        # Invalidierung überlappt, speichert nicht
+        self._gen: dict[int, int] = {}
+        self._epoch = 0
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0,
+                      "remote_invalidations": 0, "resyncs": 0}
+
+    def peek(self, chat_id: int, section: str, key: tuple = ()):
+        """Cache-Treffer oder _MISSING (ohne zu laden)."""
+        with self._lock:
+            cfg = self._chats.get(chat_id)
+            if cfg is None:
+                return _MISSING
+            if cfg.expired(self.ttl):
+                del self._chats[chat_id]
+                return _MISSING
+            value = cfg.sections.get((section, key), _MISSING)
+            if value is _MISSING:
+                return _MISSING
+            self._chats.move_to_end(chat_id)
+            self.stats["hits"] += 1
+        return _copy(value)
+
+    def get(self, chat_id: int, section: str, key: tuple, loader):
+        value = self.peek(chat_id, section, key)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            gen = (self._epoch, self._gen.get(chat_id, 0))
+            self.stats["misses"] += 1
+        value = loader()
+        self.store(chat_id, section, key, value, gen)
+        return _copy(value)
+
+    def store(self, chat_id: int, section: str, key: tuple, value, gen: tuple) -> None:
+        with self._lock:
+            if (self._epoch, self._gen.get(chat_id, 0)) != gen:
+                return
+            cfg = self._chats.get(chat_id)
+            if cfg is None:
+                cfg = self._chats[chat_id] = ChatConfig(chat_id)
+                while len(self._chats) > self.max_chats:
+                    self._chats.popitem(last=False)
+                    self.stats["evictions"] += 1
+            else:
+                self._chats.move_to_end(chat_id)
+            cfg.sections[(section, key)] = value
+
+    def invalidate(self, chat_id: int, remote: bool = False) -> None:
+        with self._lock:
+            self._gen[chat_id] = self._gen.get(chat_id, 0) + 1
+            self._chats.pop(chat_id, None)
+            self.stats["remote_invalidations" if remote else "invalidations"] += 1
+
+    def clear(self, resync: bool = False) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._chats.clear()
+            self._gen.clear()
+            self.stats["resyncs" if resync else "invalidations"] += 1
+
+    def size(self) -> int:
+        return len(self._chats)
+
+
+_cache = ConfigCache(CONFIG_CACHE_TTL_S, CONFIG_CACHE_MAX_CHATS)
+
+
+def is_enabled() -> bool:
+    return CONFIG_CACHE_ENABLED
+
+
+def peek(chat_id: int, section: str, key: tuple = ()):
+    return _cache.peek(chat_id, section, key)
+
+
+def get(chat_id: int, section: str, key: tuple, loader):
+    return _cache.get(chat_id, section, key, loader)
+
+
+def invalidate(chat_id: int, remote: bool = False) -> None:
+    """remote=True: ausgelöst durch eine Änderung in einem anderen Prozess (NOTIFY)."""
+    _cache.invalidate(chat_id, remote)
+
+
+def clear(resync: bool = False) -> None:
+    """Alles verwerfen – resync=True nach einem (Wieder-)Verbinden des Listeners."""
+    _cache.clear(resync)
+
+
+def get_stats() -> dict:
+    return dict(_cache.stats, chats=_cache.size())
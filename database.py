@@ -2,25 +2,316 @@
 _pi_col_cache: str | None = None
 
 import os
+import re
 import json
+import time
+import hashlib
+import select
 import logging
+import asyncio
+import threading
+import inspect
+import functools
+import heapq
+import itertools
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 from datetime import date
 from typing import List, Dict, Tuple, Optional, Any
+import psycopg2
 from psycopg2 import pool, OperationalError, InterfaceError
-from psycopg2.extras import Json
+from psycopg2 import extensions as _ext
+from psycopg2.extras import Json, execute_values
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
+import write_buffer
+import metrics
+import config_cache
+from policies import (AiModPolicy, LinkPolicy, SpamPolicy,
+                      compile_ai_mod_policy, compile_link_policy, compile_spam_policy)
+from collections import deque
 
 # Logger setup
 logger = logging.getLogger(__name__)
 
 # --- Connection Pool Setup ---
 
-def _init_pool(dsn: dict, minconn: int = 1, maxconn: int = 10) -> pool.ThreadedConnectionPool:
+# Pool-Gesundheit (für Dev-Menü / Monitoring)
+_pool_stats = {"recycled": 0, "broken": 0, "replaced": 0, "reaper_runs": 0,
+               "queued": 0, "timeouts": 0, "shrunk": 0, "loop_timeouts": 0}
+
+def get_pool_stats() -> dict:
+    return dict(_pool_stats)
+
+# --- Prioritäten beim Warten auf eine Verbindung ---
+# Kleinere Zahl = früher bedient. Moderation (Spam/KI/Nachtmodus) vor normalen Handlern,
+# Statistik/Export/Jobs zuletzt. Gesetzt per ContextVar → gilt auch im DB-Executor.
+PRIO_REALTIME = 0
+PRIO_NORMAL = 1
+PRIO_BACKGROUND = 2
+_PRIO_NAMES = {PRIO_REALTIME: "realtime", PRIO_NORMAL: "normal", PRIO_BACKGROUND: "background"}
+_db_priority: contextvars.ContextVar = contextvars.ContextVar("db_priority", default=PRIO_NORMAL)
+
+@contextlib.contextmanager
+def db_priority(level: int):
+    """Setzt die Pool-Priorität für alle DB-Aufrufe im Block (sync und async nutzbar)."""
+    token = _db_priority.set(level)
     try:
-        pool_inst = pool.ThreadedConnectionPool(minconn, maxconn, **dsn)
-        logger.info(f"🔌 Initialized DB pool with {minconn}-{maxconn} connections")
+        yield
+    finally:
+        _db_priority.reset(token)
+
+def with_db_priority(level: int):
+    """Decorator für async Handler/Jobs: alle DB-Aufrufe darin laufen mit `level`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapped(*args, **kwargs):
+            with db_priority(level):
+                return await fn(*args, **kwargs)
+        return wrapped
+    return deco
+
+DB_POOL_WAIT_TIMEOUT_S = float(os.getenv("DB_POOL_WAIT_TIMEOUT_S", "10"))
+# sync-Engine: Ausleihen direkt auf dem Event-Loop-Thread warten nur kurz (0 = sofort PoolError),
+# sonst stünde bei erschöpftem Pool der ganze Bot bis DB_POOL_WAIT_TIMEOUT_S. Die lange Wartezeit
+# gilt nur in Executor-/Worker-Threads.
+DB_POOL_LOOP_WAIT_S = float(os.getenv("DB_POOL_LOOP_WAIT_S", "0.2"))
+DB_POOL_QUEUE_MAX = int(os.getenv("DB_POOL_QUEUE_MAX", "200"))
+DB_POOL_IDLE_S = float(os.getenv("DB_POOL_IDLE_S", "300"))   # freie Verbindungen über minconn → schließen
+
+def _on_event_loop() -> bool:
+    """Läuft der Aufrufer im Thread eines laufenden asyncio-Loops?"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+class _Waiter:
+    __slots__ = ("event", "conn", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+        self.cancelled = False
+
+class _AdaptivePool(pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool mit Warteschlange statt sofortigem PoolError:
+    - ist der Pool erschöpft, warten Ausleiher (nach Priorität, dann FIFO) bis DB_POOL_WAIT_TIMEOUT_S,
+      auf dem Event-Loop-Thread nur bis DB_POOL_LOOP_WAIT_S;
+      eine zurückgegebene Verbindung geht direkt an den vordersten Wartenden
+    - wächst bei Bedarf bis maxconn; freie Verbindungen bleiben liegen und werden erst nach
+      DB_POOL_IDLE_S (Reaper) bis auf minconn abgebaut – kein Connect/Close-Pingpong bei Lastspitzen
+    - kein Ping beim Ausleihen: defekte Verbindungen verwirft _with_cursor beim Fehler,
+      der Reaper prüft freie Verbindungen und recycelt zu alte
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        self._born: dict[int, float] = {}
+        self._idle_since: dict[int, float] = {}
+        self._waiters: list = []          # Heap: (prio, seq, _Waiter)
+        self._seq = itertools.count()
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self._born[id(conn)] = time.monotonic()
+        if key is None:
+            self._idle_since[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn, counter: str | None = None):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._born.pop(id(conn), None)
+        self._idle_since.pop(id(conn), None)
+        if counter:
+            _pool_stats[counter] += 1
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, w in self._waiters if not w.cancelled)
+
+    # --- Ausleihen ---
+    def _take_locked(self):
+        """Freie Verbindung oder neue (unter maxconn); None = erschöpft. Nur unter self._lock."""
+        key = self._getkey()
+        if self._pool:
+            conn = self._pool.pop()
+            self._idle_since.pop(id(conn), None)
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+            return conn
+        if len(self._used) < self.maxconn:
+            return self._connect(key)
+        return None
+
+    def _next_waiter_locked(self):
+        while self._waiters:
+            _, _, w = heapq.heappop(self._waiters)
+            if not w.cancelled:
+                return w
+        return None
+
+    def getconn(self, key=None, timeout: float | None = None):
+        prio = _db_priority.get()
+        on_loop = timeout is None and _on_event_loop()
+        if timeout is None:
+            timeout = DB_POOL_LOOP_WAIT_S if on_loop else DB_POOL_WAIT_TIMEOUT_S
+        with self._lock:
+            if self.closed:
+                raise pool.PoolError("connection pool is closed")
+            if key is not None and key in self._used:
+                return self._used[key]
+            # Wartende nicht überholen – außer es ist ohnehin noch Platz
+            if not self._waiters or self._pool or len(self._used) < self.maxconn:
+                conn = self._take_locked()
+                if conn is not None:
+                    return conn
+            if timeout == 0:
+                if on_loop:
+                    _pool_stats["loop_timeouts"] += 1
+                raise pool.PoolError("connection pool exhausted")
+            if len(self._waiters) >= DB_POOL_QUEUE_MAX:
+                _pool_stats["timeouts"] += 1
+                raise pool.PoolError("connection pool exhausted (Warteschlange voll)")
+            w = _Waiter()
+            heapq.heappush(self._waiters, (prio, next(self._seq), w))
+            _pool_stats["queued"] += 1
+        t0 = time.perf_counter()
+        w.event.wait(timeout)
+        with self._lock:
+            metrics.observe("db_pool_queue_wait_seconds", time.perf_counter() - t0,
+                            priority=_PRIO_NAMES.get(prio, str(prio)))
+            if w.conn is not None:
+                return w.conn
+            w.cancelled = True
+            self._waiters = [e for e in self._waiters if e[2] is not w]
+            heapq.heapify(self._waiters)
+            _pool_stats["loop_timeouts" if on_loop else "timeouts"] += 1
+        raise pool.PoolError(f"connection pool exhausted (nach {time.perf_counter() - t0:.1f}s Wartezeit)")
+
+    # --- Zurückgeben ---
+    def _hand_over_locked(self, conn) -> bool:
+        w = self._next_waiter_locked()
+        if w is None:
+            return False
+        key = self._getkey()
+        self._used[key] = conn
+        self._rused[id(conn)] = key
+        w.conn = conn
+        w.event.set()
+        return True
+
+    def putconn(self, conn, key=None, close=False):
+        with self._lock:
+            if self.closed:
+                return super()._putconn(conn, key, close)
+            key = key if key is not None else self._rused.get(id(conn))
+            if key is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+            self._used.pop(key, None)
+            self._rused.pop(id(conn), None)
+            broken = close or conn.closed
+            if not broken:
+                status = conn.info.transaction_status
+                if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                    broken = True
+                elif status != _ext.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        broken = True
+            if broken:
+                # close=True: der Aufrufer hat den Defekt bereits gezählt
+                self._discard(conn, None if close else "broken")
+                # Platz frei geworden → für den vordersten Wartenden neu verbinden
+                if any(not w.cancelled for _, _, w in self._waiters):
+                    try:
+                        fresh = self._connect()
+                        self._pool.remove(fresh)
+                        self._idle_since.pop(id(fresh), None)
+                        if not self._hand_over_locked(fresh):
+                            self._pool.append(fresh)
+                            self._idle_since[id(fresh)] = time.monotonic()
+                    except Exception as e:
+                        logger.warning(f"Pool: Ersatzverbindung für Wartende fehlgeschlagen: {e}")
+                return
+            if not self._hand_over_locked(conn):
+                self._pool.append(conn)
+                self._idle_since[id(conn)] = time.monotonic()
+
+    def closeall(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for _, _, w in waiters:
+            w.event.set()
+        super().closeall()
+
+    def reap(self, max_age_s: float, idle_s: float | None = None) -> None:
+        """Prüft alle *freien* Verbindungen einzeln (der Hot-Path wird nie blockiert)
+        und baut lange ungenutzte Verbindungen bis auf minconn ab."""
+        idle_s = DB_POOL_IDLE_S if idle_s is None else idle_s
+        now = time.monotonic()
+        with self._lock:
+            if self.closed:
+                return
+            idle_count = len(self._pool)
+        for _ in range(idle_count):
+            with self._lock:
+                if self.closed or not self._pool:
+                    break
+                conn = self._pool.pop(0)
+                idle_since = self._idle_since.pop(id(conn), now)
+                surplus = len(self._pool) + len(self._used) + 1 > self.minconn
+            if conn.closed:
+                self._discard(conn, "broken")
+                continue
+            if max_age_s and now - self._born.get(id(conn), now) > max_age_s:
+                self._discard(conn, "recycled")
+                continue
+            if idle_s and surplus and now - idle_since > idle_s:
+                self._discard(conn, "shrunk")
+                continue
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                conn.rollback()
+            except Exception:
+                self._discard(conn, "broken")
+                continue
+            with self._lock:
+                if not self._hand_over_locked(conn):
+                    self._pool.append(conn)
+                    self._idle_since[id(conn)] = idle_since
+
+        # verworfene Verbindungen bis minconn ersetzen, Altlasten im _born-Index aufräumen
+        with self._lock:
+            if self.closed:
+                return
+            missing = self.minconn - (len(self._pool) + len(self._used))
+            for _ in range(max(0, missing)):
+                try:
+                    self._connect()
+                    _pool_stats["replaced"] += 1
+                except Exception as e:
+                    logger.warning(f"Pool-Reaper: Ersatzverbindung fehlgeschlagen: {e}")
+                    break
+            alive = {id(c) for c in self._pool} | {id(c) for c in self._used.values()}
+            for k in [k for k in self._born if k not in alive]:
+                self._born.pop(k, None)
+        _pool_stats["reaper_runs"] += 1
+
+def _init_pool(dsn: dict, minconn: int = 1, maxconn: int = 10, name: str = "realtime") -> pool.ThreadedConnectionPool:
+    try:
+        pool_inst = _AdaptivePool(minconn, maxconn, **dsn)
+        logger.info(f"🔌 Initialized DB pool '{name}' with {minconn}-{maxconn} connections "
+                    f"(Wartezeit max. {DB_POOL_WAIT_TIMEOUT_S:.0f}s, auf dem Event-Loop {DB_POOL_LOOP_WAIT_S:g}s)")
         return pool_inst
     except Exception as e:
         logger.error(f"❌ Could not initialize connection pool: {e}")
@@ -41,65 +332,693 @@ dsn = {
     'port': parsed.port,
     'sslmode': 'require',
 }
-_db_pool = _init_pool(dsn, minconn=1, maxconn=10)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+# --- Bulkheads: getrennte Pools ---
+# realtime:    Handler-Hot-Path (Moderation, Logging, Settings) – Default für @_with_cursor
+# analytics:   Statistik, Exporte, Dev-Übersichten (@_with_analytics_cursor)
+# maintenance: Migrationen, Backfills, Archiv/Retention (use_pool("maintenance"))
+# Jeder Pool hat eigene Größe und eigenen statement_timeout (0 = keiner); ein Analytics-Sturm
+# kann so keine Verbindungen (und im async-Modus keine Executor-Threads) des Hot-Paths belegen.
+DB_POOL_CONFIG = {
+    "realtime": (DB_POOL_MIN, DB_POOL_MAX,
+                 int(os.getenv("DB_REALTIME_STATEMENT_TIMEOUT_MS", "15000"))),
+    "analytics": (int(os.getenv("DB_ANALYTICS_POOL_MIN", "0")), int(os.getenv("DB_ANALYTICS_POOL_MAX", "3")),
+                  int(os.getenv("DB_ANALYTICS_STATEMENT_TIMEOUT_MS", "120000"))),
+    "maintenance": (0, int(os.getenv("DB_MAINTENANCE_POOL_MAX", "3")),
+                    int(os.getenv("DB_MAINTENANCE_STATEMENT_TIMEOUT_MS", "0"))),
+}
 
-# Decorator to acquire/release connections and cursors
-def _with_cursor(func):
-    def wrapped(*args, **kwargs):
-        # bis zu 2 Versuche bei transienten Verbindungsproblemen
-        import time
-        last_exc = None
-        for attempt in (1, 2):
-            conn = _db_pool.getconn()
-            try:
-                # Verbindung „gesund“? (sofortiger Ping)
-                if getattr(conn, "closed", 0):
-                    raise OperationalError("connection closed")
-                with conn.cursor() as cur_ping:
-                    cur_ping.execute("SELECT 1;")
-                # eigentlicher DB-Call
-                with conn.cursor() as cur:
-                    res = func(cur, *args, **kwargs)
-                    conn.commit()
-                    return res
-            except (OperationalError, InterfaceError) as e:
-                last_exc = e
-                # defekte Verbindung hart schließen und aus dem Pool entfernen
+def _pool_dsn(statement_timeout_ms: int) -> dict:
+    d = dict(dsn)
+    if statement_timeout_ms:
+        d["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    return d
+
+_db_pools = {
+    name: _init_pool(_pool_dsn(timeout_ms), minconn=mn, maxconn=mx, name=name)
+    for name, (mn, mx, timeout_ms) in DB_POOL_CONFIG.items()
+}
+_db_pool = _db_pools["realtime"]   # bisheriger Name bleibt der Hot-Path-Pool
+
+# explizite Umleitung (z. B. Migrations-Thread → maintenance); None = Pool der Funktion
+_db_pool_override: contextvars.ContextVar = contextvars.ContextVar("db_pool_override", default=None)
+
+@contextlib.contextmanager
+def use_pool(name: str):
+    """Alle DB-Aufrufe im Block laufen über den benannten Pool."""
+    if name not in _db_pools:
+        raise ValueError(f"Unbekannter DB-Pool: {name}")
+    token = _db_pool_override.set(name)
+    try:
+        yield
+    finally:
+        _db_pool_override.reset(token)
+
+def _effective_pool(default: str = "realtime") -> str:
+    return _db_pool_override.get() or default
+
+# --- Engine-Modus ---
+# DB_ENGINE=sync  (Default): DB-Funktionen laufen direkt im Aufrufer.
+# DB_ENGINE=async: Handler awaiten die DB-Aufrufe; diese laufen auf einem eigenen
+#                  Executor, damit kein Query den Event-Loop blockiert. Der Executor ist
+#                  größer als der Pool: überzählige Aufrufe warten in der Pool-Warteschlange,
+#                  wo die Priorität (Moderation vor Statistik) greift – nicht FIFO im Executor.
+DB_ENGINE = (os.getenv("DB_ENGINE") or "sync").strip().lower()
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX * 2)))
+# je Pool ein eigener Executor (Bulkhead auch auf Thread-Ebene)
+_db_executors = {
+    name: ThreadPoolExecutor(max_workers=(DB_EXECUTOR_WORKERS if name == "realtime" else mx * 2),
+                             thread_name_prefix=f"db-{name}")
+    for name, (_mn, mx, _t) in DB_POOL_CONFIG.items()
+}
+_db_executor = _db_executors["realtime"]
+
+def use_async_engine() -> bool:
+    return DB_ENGINE == "async"
+
+async def _run_in_db_executor(fn, *args, **kwargs):
+    """Führt eine synchrone DB-Funktion auf dem Executor ihres Pools aus (ContextVars werden mitgenommen)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    executor = _db_executors[_db_pool_override.get() or getattr(fn, "db_pool", "realtime")]
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+# --- Pool-Reaper ---
+# Kein Ping mehr pro Ausleihe: freie Verbindungen werden periodisch geprüft,
+# nach DB_CONN_MAX_AGE_S recycelt und defekte bis minconn ersetzt.
+DB_REAPER_INTERVAL_S = float(os.getenv("DB_REAPER_INTERVAL_S", "60"))
+DB_CONN_MAX_AGE_S = float(os.getenv("DB_CONN_MAX_AGE_S", "1800"))
+_reaper_thread: threading.Thread | None = None
+
+def start_pool_reaper(interval_s: float | None = None, max_age_s: float | None = None) -> None:
+    global _reaper_thread
+    if _reaper_thread and _reaper_thread.is_alive():
+        return
+    interval = interval_s or DB_REAPER_INTERVAL_S
+    max_age = DB_CONN_MAX_AGE_S if max_age_s is None else max_age_s
+
+    def _loop():
+        while not _db_pool.closed:
+            time.sleep(interval)
+            for name, p in _db_pools.items():
                 try:
-                    conn.close()
+                    p.reap(max_age)
                 except Exception:
-                    pass
-                try:
-                    _db_pool.putconn(conn, close=True)
-                except TypeError:
-                    # ältere psycopg2 ohne close-Flag
-                    try: _db_pool.putconn(conn)
-                    except Exception: pass
-                if attempt == 2:
-                    raise
-                # kurzer Backoff, dann neuer Versuch
-                time.sleep(0.2)
-                continue
-            finally:
+                    logger.exception(f"Pool-Reaper ({name}) fehlgeschlagen")
+
+    _reaper_thread = threading.Thread(target=_loop, name="db-pool-reaper", daemon=True)
+    _reaper_thread.start()
+    logger.info(f"🧹 Pool-Reaper aktiv (alle {interval:.0f}s, max. Alter {max_age:.0f}s)")
+
+# --- Update-Session ---
+# Pro Telegram-Update eine Verbindung: alle _with_cursor-Aufrufe der Handler laufen darüber
+# (kein getconn/putconn je Aufruf). Jeder Aufruf committet sofort – zwischen zwei DB-Aufrufen
+# liegen fast immer Telegram-/OpenAI-Requests, und die Verbindung soll dabei weder „idle in
+# transaction“ stehen noch Zeilensperren halten. Ein fehlgeschlagener Aufruf rollt deshalb
+# nur seine eigenen Statements zurück, nie die bereits erfolgreichen früherer Handler.
+# Die Verbindung wird erst beim ersten DB-Zugriff geliehen; höchstens DB_SESSION_MAX Sessions
+# halten gleichzeitig eine, alle weiteren Updates laufen wie bisher pro Aufruf.
+DB_UPDATE_SESSION = os.getenv("DB_UPDATE_SESSION", "1").strip().lower() not in ("0", "false", "no", "off")
+DB_SESSION_MAX = int(os.getenv("DB_SESSION_MAX", str(max(1, DB_POOL_MAX // 2))))
+_session_slots = threading.BoundedSemaphore(DB_SESSION_MAX)
+
+class _DbSession:
+    __slots__ = ("conn", "lock", "closed", "has_slot")
+
+    def __init__(self):
+        self.conn = None
+        self.lock = threading.Lock()   # ein Query zur Zeit (auch über Executor-Threads)
+        self.closed = False
+        self.has_slot = False
+
+_db_session: contextvars.ContextVar = contextvars.ContextVar("db_session", default=None)
+
+def _session_connection(sess: _DbSession):
+    if sess.conn is None:
+        if not sess.has_slot:
+            if not _session_slots.acquire(blocking=False):
+                return None
+            sess.has_slot = True
+        try:
+            # nie auf eine Session-Verbindung warten: lieber pro Aufruf (mit Warteschlange) weiter
+            sess.conn = _timed_getconn("session", timeout=0)
+        except pool.PoolError:
+            # Pool ausgeschöpft → dieses Update ohne Session weiterlaufen lassen
+            sess.has_slot = False
+            _session_slots.release()
+            return None
+    return sess.conn
+
+def _release_session(sess: _DbSession, commit: bool = True) -> None:
+    # commit bleibt für alte Aufrufer: jeder Aufruf ist schon committet, hier gibt es nichts zu verwerfen
+    with sess.lock:
+        sess.closed = True
+        conn, sess.conn = sess.conn, None
+        try:
+            if conn is not None and not conn.closed:
                 try:
-                    if conn and not getattr(conn, "closed", 0):
-                        _db_pool.putconn(conn)
+                    conn.rollback()   # nur zur Sicherheit; die Verbindung ist idle
                 except Exception:
                     pass
+                _db_pool.putconn(conn)
+        finally:
+            if sess.has_slot:
+                sess.has_slot = False
+                _session_slots.release()
+
+@contextlib.contextmanager
+def db_session():
+    """Synchrone Session (z. B. für Skripte): eine Verbindung für alle Aufrufe im Block."""
+    if not DB_UPDATE_SESSION or _db_session.get() is not None:
+        yield None
+        return
+    sess = _DbSession()
+    token = _db_session.set(sess)
+    ok = False
+    try:
+        yield sess
+        ok = True
+    finally:
+        _db_session.reset(token)
+        _release_session(sess, commit=ok)
+
+@contextlib.asynccontextmanager
+async def update_session():
+    """Async-Variante für den Update-Durchlauf; die Rückgabe läuft im async-Modus auf dem DB-Executor."""
+    if not DB_UPDATE_SESSION or _db_session.get() is not None:
+        yield None
+        return
+    sess = _DbSession()
+    token = _db_session.set(sess)
+    ok = False
+    try:
+        yield sess
+        ok = True
+    finally:
+        _db_session.reset(token)
+        if sess.conn is not None and use_async_engine():
+            await _run_in_db_executor(_release_session, sess, ok)
+        else:
+            _release_session(sess, commit=ok)
+
+def _run_in_session(sess: _DbSession, func, args, kwargs):
+    """
+    Führt func über die Session-Verbindung aus. Liefert (True, res) oder (False, None),
+    wenn die Session nicht nutzbar ist und der normale Pool-Pfad greifen soll.
+    """
+    if sess.closed or not sess.lock.acquire(blocking=False):
+        # parallel genutzt (z. B. block=False-Handler) oder schon beendet → eigener Aufruf
+        return False, None
+    try:
+        if sess.closed:
+            return False, None
+        conn = _session_connection(sess)
+        if conn is None:
+            return False, None
+        try:
+            with conn.cursor() as cur:
+                res = func(cur, *args, **kwargs)
+                conn.commit()
+                _record_rows(func.__name__, cur)
+                return True, res
+        except (OperationalError, InterfaceError):
+            # Verbindung tot: Session-Verbindung verwerfen, Aufruf über den Pool wiederholen
+            _pool_stats["broken"] += 1
+            sess.conn = None
+            try: _db_pool.putconn(conn, close=True)
+            except Exception: pass
+            return False, None
+        except Exception:
+            # verwirft nur die Statements dieses Aufrufs – frühere sind bereits committet
+            try: conn.rollback()
+            except Exception: pass
+            raise
+    finally:
+        sess.lock.release()
+
+# --- Query-Metriken (Latenz, Pool-Wartezeit, Zeilen, Fehler) + Slow-Query-Log ---
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))   # 0 = aus
+DB_SLOW_QUERY_ARGS = (os.getenv("DB_SLOW_QUERY_ARGS", "1").strip().lower() not in ("0", "false", "no", "off"))
+_slow_queries: deque = deque(maxlen=50)
+
+metrics.describe("db_query_seconds", "Laufzeit je DB-Funktion inkl. Pool-Wartezeit")
+metrics.describe("db_pool_wait_seconds", "Wartezeit auf eine Pool-Verbindung")
+metrics.describe("db_rows_total", "Gelesene/geänderte Zeilen je DB-Funktion (cursor.rowcount)")
+metrics.describe("db_errors_total", "Fehlgeschlagene Aufrufe je DB-Funktion")
+
+def _short_repr(v, limit: int = 200) -> str:
+    r = repr(v)
+    return r if len(r) <= limit else r[:limit] + "…"
+
+def _timed_getconn(site: str, timeout: float | None = None, pool_name: str = "realtime"):
+    t0 = time.perf_counter()
+    try:
+        return _db_pools[pool_name].getconn(timeout=timeout)
+    finally:
+        metrics.observe("db_pool_wait_seconds", time.perf_counter() - t0, site=site, pool=pool_name)
+
+def _record_rows(fn_name: str, cur) -> None:
+    n = getattr(cur, "rowcount", -1)
+    if n and n > 0:
+        metrics.inc("db_rows_total", n, fn=fn_name)
+
+def _record_query(fn_name: str, elapsed: float, ok: bool, args=(), kwargs=None) -> None:
+    metrics.observe("db_query_seconds", elapsed, fn=fn_name)
+    if not ok:
+        metrics.inc("db_errors_total", fn=fn_name)
+    ms = elapsed * 1000
+    if DB_SLOW_QUERY_MS and ms >= DB_SLOW_QUERY_MS:
+        shown = (_short_repr(args), _short_repr(kwargs or {})) if DB_SLOW_QUERY_ARGS else ("…", "…")
+        _slow_queries.append((time.time(), fn_name, ms, shown[0], shown[1]))
+        logger.warning("Langsame DB-Abfrage %s: %.0f ms args=%s kwargs=%s", fn_name, ms, *shown)
+
+metrics.describe("db_pool_queue_wait_seconds", "Wartezeit in der Pool-Warteschlange je Priorität")
+metrics.gauge("db_pool_connections", lambda: {
+    f"{name}_{kind}": n for name, p in _db_pools.items()
+    for kind, n in (("used", len(p._used)), ("idle", len(p._pool)))
+})
+metrics.gauge("db_pool_queue_depth", lambda: {name: p.queue_depth() for name, p in _db_pools.items()})
+metrics.gauge("db_pool_events", get_pool_stats)
+metrics.gauge("db_write_behind", write_buffer.get_stats)
+
+def get_slow_queries(limit: int = 10) -> list[tuple]:
+    """Letzte langsame Aufrufe: (unix_ts, funktion, ms, args, kwargs), neueste zuerst."""
+    return list(_slow_queries)[-limit:][::-1]
+
+@contextlib.contextmanager
+def borrow_connection(label: str, autocommit: bool = False, pool_name: str = "realtime"):
+    """
+    Rohe Pool-Verbindung für Stellen ohne @_with_cursor (statt getconn/putconn von Hand).
+    Misst Wartezeit/Laufzeit/Fehler wie _with_cursor und gibt die Verbindung sauber zurück
+    (autocommit wird zurückgesetzt, damit spätere Nutzer wieder Transaktionen bekommen).
+    """
+    pool_name = _effective_pool(pool_name)
+    db_pool = _db_pools[pool_name]
+    conn = _timed_getconn(label, pool_name=pool_name)
+    t0 = time.perf_counter()
+    ok = broken = False
+    try:
+        if autocommit:
+            conn.autocommit = True
+        yield conn
+        ok = True
+    except (OperationalError, InterfaceError):
+        broken = True
+        _pool_stats["broken"] += 1
+        raise
+    finally:
+        _record_query(label, time.perf_counter() - t0, ok)
+        try:
+            if broken or conn.closed:
+                db_pool.putconn(conn, close=True)
+            else:
+                if autocommit:
+                    conn.autocommit = False
+                elif not ok:
+                    conn.rollback()
+                db_pool.putconn(conn)
+        except Exception:
+            logger.exception(f"Verbindung ({label}) konnte nicht zurückgegeben werden")
+
+# Decorator to acquire/release connections and cursors
+def _with_cursor(func=None, *, pool_name: str = "realtime"):
+    """@_with_cursor (Hot-Path-Pool) oder @_with_cursor(pool_name="analytics")."""
+    if func is None:
+        return functools.partial(_with_cursor, pool_name=pool_name)
+    fn_name = func.__name__
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            res = _cursor_call(func, fn_name, args, kwargs, _effective_pool(pool_name))
+            ok = True
+            return res
+        finally:
+            _record_query(fn_name, time.perf_counter() - t0, ok, args, kwargs)
+
+    async def aio(*args, **kwargs):
+        # async-Variante: gleiche Signatur, läuft auf dem Executor des Pools
+        return await _run_in_db_executor(wrapped, *args, **kwargs)
+
+    wrapped.aio = aio
+    wrapped.db_pool = pool_name
     return wrapped
 
+# Statistik/Exporte/Dev-Übersichten: eigener Pool mit eigenem statement_timeout
+_with_analytics_cursor = _with_cursor(pool_name="analytics")
+
+def _cursor_call(func, fn_name: str, args, kwargs, pool_name: str = "realtime"):
+    db_pool = _db_pools[pool_name]
+    sess = _db_session.get()
+    # die Update-Session hält eine realtime-Verbindung; andere Pools laufen nie darüber
+    if sess is not None and pool_name == "realtime":
+        used, res = _run_in_session(sess, func, args, kwargs)
+        if used:
+            return res
+    # bis zu 2 Versuche bei transienten Verbindungsproblemen.
+    # Kein Ping vorab: eine tote Verbindung fällt beim eigentlichen Query auf
+    # (validate-on-error) und wird dann verworfen.
+    last_exc = None
+    for attempt in (1, 2):
+        conn = _timed_getconn(fn_name, pool_name=pool_name)
+        try:
+            if getattr(conn, "closed", 0):
+                raise OperationalError("connection closed")
+            # eigentlicher DB-Call
+            with conn.cursor() as cur:
+                res = func(cur, *args, **kwargs)
+                conn.commit()
+                _record_rows(fn_name, cur)
+                return res
+        except (OperationalError, InterfaceError) as e:
+            last_exc = e
+            _pool_stats["broken"] += 1
+            # defekte Verbindung hart schließen und aus dem Pool entfernen
+            try:
+                conn.close()
+            except Exception:
+                pass
+            try:
+                db_pool.putconn(conn, close=True)
+            except TypeError:
+                # ältere psycopg2 ohne close-Flag
+                try: db_pool.putconn(conn)
+                except Exception: pass
+            if attempt == 2:
+                raise
+            # kurzer Backoff, dann neuer Versuch
+            time.sleep(0.2)
+            continue
+        finally:
+            try:
+                if conn and not getattr(conn, "closed", 0):
+                    db_pool.putconn(conn)
+            except Exception:
+                pass
+
+async def _call_db(fn, *args, **kwargs):
+    """
+    Ruft eine DB-Funktion aus einem Handler auf.
+    - async-Engine: über die .aio-Variante bzw. den DB-Executor (Event-Loop bleibt frei)
+    - sync-Engine: direkt wie bisher
+    Coroutine-Funktionen werden einfach awaited.
+    """
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args, **kwargs)
+    if use_async_engine():
+        aio = getattr(fn, "aio", None)
+        if aio is not None:
+            return await aio(*args, **kwargs)
+        return await _run_in_db_executor(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+async def _call_analytics(fn, *args, **kwargs):
+    """
+    Statistik/Exporte aus Handlern und Jobs: laufen immer auf dem Analytics-Executor und
+    -Pool – auch in der sync-Engine, denn deren statement_timeout (bis 120 s) darf nie
+    den Event-Loop halten.
+    """
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args, **kwargs)
+    with use_pool("analytics"):
+        return await _run_in_db_executor(fn, *args, **kwargs)
+
 async def _call_db_safe(fn, *args, **kwargs):
     """
     Führt eine (synchrone) DB-Funktion sicher aus, loggt Exceptions
     und lässt sie nach oben steigen, damit der Aufrufer reagieren kann.
-    Absichtlich 'async', damit bestehende Aufrufe mit 'await' unverändert bleiben.
+    Im async-Engine-Modus wird der Aufruf vom Event-Loop ausgelagert.
     """
     try:
-        return fn(*args, **kwargs)
+        return await _call_db(fn, *args, **kwargs)
     except Exception:
         logger.exception("DB-Fehler in %s", getattr(fn, "__name__", str(fn)))
         raise
 
+# --- Write-behind (gepufferte Hot-Path-Inserts) ---
+@_with_cursor
+def _flush_write_batch(cur, spec, rows):
+    # eine Tabelle je Transaktion: eine fehlerhafte Zeile hält die anderen Tabellen nicht auf
+    execute_values(cur, spec.sql, rows, template=spec.template, page_size=max(len(rows), 1))
+
+def _flush_write_batch_isolated(spec, rows):
+    # nie über eine Update-Session schreiben (der Flush läuft ggf. im Thread eines Handlers)
+    return contextvars.Context().run(_flush_write_batch, spec, rows)
+
+def _write_error_is_transient(exc) -> bool:
+    return isinstance(exc, (OperationalError, InterfaceError, pool.PoolError))
+
+write_buffer.configure(_flush_write_batch_isolated, _write_error_is_transient)
+
+def _write_behind(table: str, to_row):
+    """
+    Puffert den Aufruf als Zeile für `table`, statt sofort zu schreiben
+    (DB_WRITE_BEHIND=0 schaltet auf direkte Einzel-Inserts zurück).
+    to_row bekommt die Aufrufargumente (ohne cur) und liefert das Tupel für execute_values.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            if not write_buffer.is_enabled():
+                return fn(*args, **kwargs)
+            write_buffer.put(table, to_row(*args, **kwargs))
+
+        async def aio(*args, **kwargs):
+            if not write_buffer.is_enabled():
+                return await fn.aio(*args, **kwargs)
+            row = to_row(*args, **kwargs)
+            if not write_buffer.offer(table, row):
+                # Puffer voll → Backpressure-Flush nicht im Event-Loop ausführen
+                await _run_in_db_executor(write_buffer.put, table, row)
+
+        wrapped.aio = aio
+        return wrapped
+    return deco
+
+def _plus_pending(table: str, match):
+    """
+    Für Zählungen, die eigene gepufferte Zeilen sehen müssen (Limits/Eskalation): statt vorher zu
+    flushen, werden die passenden noch ungeschriebenen Zeilen von `table` zum DB-Ergebnis addiert.
+    match(row, *args, **kwargs) bekommt die Pufferzeile und die Aufrufargumente (ohne cur).
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            if not write_buffer.is_enabled():
+                return fn(*args, **kwargs)
+            # Puffer zuerst: eine dazwischen geschriebene Zeile zählt doppelt statt gar nicht
+            pending = write_buffer.count_pending(table, lambda row: match(row, *args, **kwargs))
+            return fn(*args, **kwargs) + pending
+
+        async def aio(*args, **kwargs):
+            return await _run_in_db_executor(wrapped, *args, **kwargs)
+
+        wrapped.aio = aio
+        return wrapped
+    return deco
+
+# --- ChatConfig-Cache (config_cache.py): Getter lesen aus dem Speicher, Setter invalidieren ---
+def _config_chat_key(args, kwargs):
+    """(chat_id, übrige Argumente) – die Getter/Setter haben chat_id immer als erstes Argument."""
+    if args:
+        chat_id, rest = args[0], args[1:]
+    else:
+        chat_id, rest = kwargs.get("chat_id"), ()
+    extra = tuple(sorted((k, v) for k, v in kwargs.items() if k != "chat_id"))
+    return chat_id, rest + extra
+
+def _cached_config(section: str):
+    """
+    Liest den Abschnitt aus dem ChatConfig des Chats (einmal laden, danach aus dem Speicher).
+    Die .aio-Variante beantwortet Treffer direkt im Event-Loop, nur Misses gehen auf den Executor.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            chat_id, key = _config_chat_key(args, kwargs)
+            if not config_cache.is_enabled() or chat_id is None:
+                return fn(*args, **kwargs)
+            return config_cache.get(chat_id, section, key, lambda: fn(*args, **kwargs))
+
+        async def aio(*args, **kwargs):
+            chat_id, key = _config_chat_key(args, kwargs)
+            if config_cache.is_enabled() and chat_id is not None:
+                hit = config_cache.peek(chat_id, section, key)
+                if hit is not config_cache._MISSING:
+                    return hit
+            return await _run_in_db_executor(wrapped, *args, **kwargs)
+
+        wrapped.aio = aio
+        wrapped.db_pool = getattr(fn, "db_pool", "realtime")
+        return wrapped
+    return deco
+
+def _invalidates_config(table: str, topic_arg: bool = False):
+    """
+    Write-through: nach dem Schreiben den ChatConfig des Chats verwerfen und die Änderung
+    per NOTIFY an die anderen Prozesse melden (topic_arg: zweites Argument ist die Topic-ID).
+    Steht über @_with_cursor: das NOTIFY läuft auf dem Cursor des Setters, in derselben
+    Transaktion – Postgres stellt es erst mit dem COMMIT zu, nie für verworfene Writes.
+    """
+    def deco(fn):
+        raw = getattr(fn, "__wrapped__", None)
+        if raw is None or not hasattr(fn, "db_pool"):
+            raise TypeError(f"@_invalidates_config gehört über @_with_cursor ({fn.__name__})")
+
+        @functools.wraps(raw)
+        def write_and_notify(cur, *args, **kwargs):
+            res = raw(cur, *args, **kwargs)
+            chat_id, _ = _config_chat_key(args, kwargs)
+            if chat_id is not None:
+                topic_id = (args[1] if len(args) > 1 else kwargs.get("topic_id")) if topic_arg else None
+                cur.execute("SELECT pg_notify(%s, %s);",
+                            (SETTINGS_NOTIFY_CHANNEL, _settings_payload(table, chat_id, topic_id)))
+            return res
+
+        write = _with_cursor(write_and_notify, pool_name=fn.db_pool)
+
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            chat_id, _ = _config_chat_key(args, kwargs)
+            try:
+                return write(*args, **kwargs)
+            finally:
+                if chat_id is not None:
+                    config_cache.invalidate(chat_id)
+
+        async def aio(*args, **kwargs):
+            return await _run_in_db_executor(wrapped, *args, **kwargs)
+
+        wrapped.aio = aio
+        wrapped.db_pool = getattr(fn, "db_pool", "realtime")
+        return wrapped
+    return deco
+
+# --- Prozessübergreifende Invalidierung (LISTEN/NOTIFY) ---
+# Jeder Settings-Writer sendet {"table", "chat_id", "topic_id"} auf SETTINGS_NOTIFY_CHANNEL.
+# Jeder Bot-Prozess hält eine eigene Listener-Verbindung.
+SETTINGS_NOTIFY_CHANNEL = os.getenv("SETTINGS_NOTIFY_CHANNEL", "settings_changed")
+SETTINGS_LISTENER_ENABLED = (os.getenv("SETTINGS_LISTENER", "1").strip().lower() not in ("0", "false", "no", "off"))
+SETTINGS_LISTENER_PING_S = float(os.getenv("SETTINGS_LISTENER_PING_S", "60"))
+# eigene Meldungen ignorieren (lokal ist schon invalidiert); PIDs sind über Container hinweg nicht eindeutig
+_SETTINGS_ORIGIN = f"{os.getpid()}-{os.urandom(4).hex()}"
+_settings_listener_thread: threading.Thread | None = None
+
+def _settings_payload(table: str, chat_id: int, topic_id: int | None = None) -> str:
+    return json.dumps({"table": table, "chat_id": chat_id, "topic_id": topic_id, "origin": _SETTINGS_ORIGIN})
+
+def _apply_settings_notify(payload: str) -> None:
+    try:
+        data = json.loads(payload or "{}")
+    except ValueError:
+        logger.warning(f"Ungültiges Settings-NOTIFY: {payload!r}")
+        return
+    if data.get("origin") == _SETTINGS_ORIGIN:
+        return
+    chat_id = data.get("chat_id")
+    if chat_id is None:
+        config_cache.clear(resync=True)
+    else:
+        config_cache.invalidate(int(chat_id), remote=True)
+
+def _listen_settings_once() -> None:
+    """Eine Listener-Verbindung bis zum ersten Fehler (Verbindung außerhalb der Pools)."""
+    conn = psycopg2.connect(**dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {_ext.quote_ident(SETTINGS_NOTIFY_CHANNEL, conn)};")
+        # während der Verbindungslücke (oder vor dem Start) verpasste Änderungen: kompletter Resync
+        config_cache.clear(resync=True)
+        logger.info(f"🔔 Settings-Listener verbunden (Kanal {SETTINGS_NOTIFY_CHANNEL})")
+        while not _db_pool.closed:
+            if select.select([conn], [], [], SETTINGS_LISTENER_PING_S) == ([], [], []):
+                # Keepalive: tote Verbindungen (z. B. nach Failover) fallen hier auf
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+            conn.poll()
+            while conn.notifies:
+                _apply_settings_notify(conn.notifies.pop(0).payload)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def start_settings_listener() -> None:
+    """Startet den LISTEN-Thread, der Cache-Einträge anderer Prozesse verwirft (SETTINGS_LISTENER=0 → aus)."""
+    global _settings_listener_thread
+    if not SETTINGS_LISTENER_ENABLED or not config_cache.is_enabled():
+        return
+    if _settings_listener_thread and _settings_listener_thread.is_alive():
+        return
+
+    def _loop():
+        backoff = 1.0
+        while not _db_pool.closed:
+            t0 = time.monotonic()
+            try:
+                _listen_settings_once()
+            except Exception as e:
+                logger.warning(f"Settings-Listener getrennt: {e}")
+            if time.monotonic() - t0 > 60:
+                backoff = 1.0
+            time.sleep(backoff)
+            backoff = min(60.0, backoff * 2)
+
+    _settings_listener_thread = threading.Thread(target=_loop, name="db-settings-listener", daemon=True)
+    _settings_listener_thread.start()
+
+metrics.gauge("config_cache", config_cache.get_stats)
+
+def _utcnow() -> datetime:
+    return datetime.now(ZoneInfo("UTC"))
+
+write_buffer.register_table(
+    "daily_stats",
+    "INSERT INTO daily_stats (chat_id, stat_date, user_id, messages) VALUES %s "
+    "ON CONFLICT (chat_id, stat_date, user_id) DO UPDATE SET messages = daily_stats.messages + EXCLUDED.messages;",
+    merge=write_buffer.merge_sum(3),
+)
+write_buffer.register_table(
+    "members",
+    "INSERT INTO members (chat_id, user_id) VALUES %s ON CONFLICT DO NOTHING;",
+    merge=write_buffer.merge_unique(2),
+)
+write_buffer.register_table(
+    "forum_topics",
+    """
+    INSERT INTO forum_topics (chat_id, topic_id, name, last_seen) VALUES %s
+    ON CONFLICT (chat_id, topic_id) DO UPDATE
+       SET name = COALESCE(EXCLUDED.name, forum_topics.name),
+           last_seen = GREATEST(forum_topics.last_seen, EXCLUDED.last_seen);
+    """,
+    # letzter Zeitstempel gewinnt, ein gesetzter Name bleibt erhalten
+    merge=write_buffer.merge_unique(2, lambda a, b: (b[0], b[1], b[2] or a[2], max(a[3], b[3]))),
+)
+write_buffer.register_table(
+    "reply_times",
+    """
+    INSERT INTO reply_times (chat_id, question_msg_id, question_user, answer_msg_id, answer_user, delta_ms, ts)
+    VALUES %s ON CONFLICT DO NOTHING;
+    """,
+)
+write_buffer.register_table(
+    "ai_mod_logs",
+    """
+    INSERT INTO ai_mod_logs (chat_id, topic_id, user_id, message_id, category, score, action, details, ts)
+    VALUES %s;
+    """,
+)
+
+def flush_write_buffer() -> None:
+    """Schreibt alle gepufferten Zeilen und stoppt den Puffer (post_shutdown)."""
+    write_buffer.close()
+
 # --- Schema Initialization & Migrations ---
 @_with_cursor
 def init_db(cur):
@@ -376,15 +1295,7 @@ def init_db(cur):
         """
     )
     # ADD MISSING TABLES FOR STATISTICS
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS message_logs (
-            chat_id BIGINT,
-            user_id BIGINT,
-            timestamp TIMESTAMPTZ DEFAULT NOW()
-        );
-        """
-    )
+    create_message_logs(cur)
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS member_events (
@@ -596,6 +1507,7 @@ def ensure_ai_moderation_schema(cur):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_ai_mod_logs_chat_ts ON ai_mod_logs(chat_id, ts DESC);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_ai_mod_logs_user_day ON ai_mod_logs(chat_id, user_id, ts DESC);")
 
+@_invalidates_config("ai_mod_settings", topic_arg=True)
 @_with_cursor
 def set_ai_mod_settings(cur, chat_id:int, topic_id:int, **fields):
     allowed = {
@@ -616,6 +1528,7 @@ def set_ai_mod_settings(cur, chat_id:int, topic_id:int, **fields):
       ON CONFLICT (chat_id, topic_id) DO UPDATE SET {", ".join(cols)};
     """, (chat_id, topic_id, *vals))
 
+@_cached_config("ai_mod")
 @_with_cursor
 def get_ai_mod_settings(cur, chat_id:int, topic_id:int) -> dict|None:
     cur.execute("""
@@ -639,20 +1552,24 @@ def get_ai_mod_settings(cur, chat_id:int, topic_id:int) -> dict|None:
             "strike_points_per_hit","strike_mute_threshold","strike_ban_threshold","strike_decay_days"]
     return {k: r[i] for i,k in enumerate(keys)}
 
-def effective_ai_mod_policy(chat_id:int, topic_id:int|None) -> dict:
-    base = get_ai_mod_settings(chat_id, 0) or {
-        "enabled": False, "shadow_mode": True, "model":"omni-moderation-latest", "lang":"de",
-        "tox_thresh":0.90,"hate_thresh":0.85,"sex_thresh":0.90,"harass_thresh":0.90,"selfharm_thresh":0.95,"violence_thresh":0.90,
-        "link_risk_thresh":0.95, "action_primary":"delete","action_secondary":"warn",
-        "escalate_after":3,"escalate_action":"mute","mute_minutes":60,"exempt_admins":True,"exempt_topic_owner":True,
-        "max_calls_per_min":20,"cooldown_s":30,"warn_text":"⚠️ Inhalt entfernt (KI-Moderation).","appeal_url":None,
-        "visual_nudity_thresh":0.90,"visual_violence_thresh":0.90,"visual_weapons_thresh":0.95,"block_sexual_minors":True,
-        "strike_points_per_hit":1,"strike_mute_threshold":3,"strike_ban_threshold":5,"strike_decay_days":30,
-    }
+_AI_MOD_DEFAULTS = {
+    "enabled": False, "shadow_mode": True, "model":"omni-moderation-latest", "lang":"de",
+    "tox_thresh":0.90,"hate_thresh":0.85,"sex_thresh":0.90,"harass_thresh":0.90,"selfharm_thresh":0.95,"violence_thresh":0.90,
+    "link_risk_thresh":0.95, "action_primary":"delete","action_secondary":"warn",
+    "escalate_after":3,"escalate_action":"mute","mute_minutes":60,"exempt_admins":True,"exempt_topic_owner":True,
+    "max_calls_per_min":20,"cooldown_s":30,"warn_text":"⚠️ Inhalt entfernt (KI-Moderation).","appeal_url":None,
+    "visual_nudity_thresh":0.90,"visual_violence_thresh":0.90,"visual_weapons_thresh":0.95,"block_sexual_minors":True,
+    "strike_points_per_hit":1,"strike_mute_threshold":3,"strike_ban_threshold":5,"strike_decay_days":30,
+}
+
+@_cached_config("ai_mod_policy")
+def effective_ai_mod_policy(chat_id:int, topic_id:int|None) -> AiModPolicy:
+    """Kompilierte KI-Policy (Defaults ← Chat-Zeile ← Topic-Override), neu gebaut erst nach einem Setter."""
+    base = get_ai_mod_settings(chat_id, 0) or dict(_AI_MOD_DEFAULTS)
     if topic_id:
         ov = get_ai_mod_settings(chat_id, topic_id)
         if ov: base.update({k:v for k,v in ov.items() if v is not None})
-    return base
+    return compile_ai_mod_policy(base, _AI_MOD_DEFAULTS)
 
 @_with_cursor
 def add_strike_points(cur, chat_id:int, user_id:int, points:int, reason:str):
@@ -680,6 +1597,8 @@ def top_strike_users(cur, chat_id:int, limit:int=10):
     cur.execute("SELECT user_id, points FROM user_strikes WHERE chat_id=%s ORDER BY points DESC, updated DESC LIMIT %s;", (chat_id, limit))
     return cur.fetchall() or []
 
+@_write_behind("ai_mod_logs", lambda chat_id, topic_id, user_id, message_id, category, score, action, details:
+               (chat_id, topic_id, user_id, message_id, category, score, action, json.dumps(details or {}), _utcnow()))
 @_with_cursor
 def log_ai_mod_action(cur, chat_id:int, topic_id:int|None, user_id:int|None, message_id:int|None,
                       category:str, score:float, action:str, details:dict|None):
@@ -688,6 +1607,10 @@ def log_ai_mod_action(cur, chat_id:int, topic_id:int|None, user_id:int|None, mes
       VALUES (%s,%s,%s,%s,%s,%s,%s,%s);
     """, (chat_id, topic_id, user_id, message_id, category, score, action, json.dumps(details or {})))
 
+# ai_mod_logs-Zeile im Puffer: (chat_id, topic_id, user_id, message_id, category, score, action, details, ts)
+@_plus_pending("ai_mod_logs", lambda r, chat_id, user_id: (
+    r[0] == chat_id and r[2] == user_id and r[6] in ('delete', 'warn', 'mute', 'ban')
+    and r[8].date() == _utcnow().date()))
 @_with_cursor
 def count_ai_hits_today(cur, chat_id:int, user_id:int) -> int:
     cur.execute("""
@@ -697,6 +1620,7 @@ def count_ai_hits_today(cur, chat_id:int, user_id:int) -> int:
     return int(cur.fetchone()[0])
 
 # --- Group Management ---
+@_invalidates_config("group_settings")
 @_with_cursor
 def register_group(cur, chat_id: int, title: str, welcome_topic_id: int = 0):
     cur.execute(
@@ -778,6 +1702,7 @@ def prune_pending_inputs_older_than(cur, hours:int=48):
     cur.execute("DELETE FROM pending_inputs WHERE created_at < NOW() - (%s || ' hours')::interval;", (hours,))
 
 # --- Member Management ---
+@_write_behind("members", lambda chat_id, user_id: (chat_id, user_id))
 @_with_cursor
 def add_member(cur, chat_id: int, user_id: int):
     cur.execute(
@@ -856,6 +1781,7 @@ def ensure_forum_topics_schema(cur):
     """)
     cur.execute("CREATE INDEX IF NOT EXISTS idx_forum_topics_seen ON forum_topics(chat_id, last_seen DESC);")
 
+@_write_behind("forum_topics", lambda chat_id, topic_id, name=None: (chat_id, topic_id, name, _utcnow()))
 @_with_cursor
 def upsert_forum_topic(cur, chat_id:int, topic_id:int, name:str|None=None):
     cur.execute("""
@@ -913,6 +1839,7 @@ def get_topic_owners(cur, chat_id: int) -> List[int]:
     cur.execute("SELECT user_id FROM user_topics WHERE chat_id = %s;", (chat_id,))
     return [row[0] for row in cur.fetchall()]
 
+@_cached_config("link")
 @_with_cursor
 def get_link_settings(cur, chat_id:int):
     cur.execute("""
@@ -930,6 +1857,7 @@ def get_link_settings(cur, chat_id:int):
         "exceptions_enabled": bool(row[3]),
     }
 
+@_invalidates_config("group_settings")
 @_with_cursor
 def set_link_settings(cur, chat_id: int,
                       protection: bool | None = None,
@@ -963,6 +1891,7 @@ def set_link_settings(cur, chat_id: int,
     cur.execute(sql, params)
 
 # --- Daily Stats ---
+@_write_behind("daily_stats", lambda chat_id, user_id, stat_date: (chat_id, stat_date, user_id, 1))
 @_with_cursor
 def inc_message_count(cur, chat_id: int, user_id: int, stat_date: date):
     cur.execute(
@@ -971,7 +1900,7 @@ def inc_message_count(cur, chat_id: int, user_id: int, stat_date: date):
         (chat_id, stat_date, user_id)
     )
 
-@_with_cursor
+@_with_analytics_cursor
 def get_group_stats(cur, chat_id: int, stat_date: date) -> List[Tuple[int, int]]:
     cur.execute(
         "SELECT user_id, messages FROM daily_stats "
@@ -1001,6 +1930,8 @@ def set_daily_stats(cur, chat_id: int, enabled: bool):
         (chat_id, enabled)
     )
 
+@_write_behind("reply_times", lambda chat_id, question_msg_id, question_user, answer_msg_id, answer_user, delta_ms:
+               (chat_id, question_msg_id, question_user, answer_msg_id, answer_user, delta_ms, _utcnow()))
 @_with_cursor
 def record_reply_time(cur, chat_id: int,
                       question_msg_id: int, question_user: int,
@@ -1051,7 +1982,7 @@ def upsert_agg_group_day(cur, chat_id:int, stat_date, payload:dict):
             spam_actions=EXCLUDED.spam_actions, night_deletes=EXCLUDED.night_deletes;
     """, dict(payload, chat_id=chat_id, stat_date=stat_date))
 
-@_with_cursor
+@_with_analytics_cursor
 def compute_agg_group_day(cur, chat_id:int, stat_date):
     # Start/Ende UTC für den Tag
     cur.execute("SELECT %s::date, (%s::date + INTERVAL '1 day')", (stat_date, stat_date))
@@ -1134,7 +2065,7 @@ def compute_agg_group_day(cur, chat_id:int, stat_date):
         "night_deletes":    int(night_deletes or 0),
     }
 
-@_with_cursor
+@_with_analytics_cursor
 def get_agg_summary(cur, chat_id:int, d_start, d_end):
     _ensure_agg_group_day(cur)
     cur.execute("""
@@ -1176,7 +2107,7 @@ def get_agg_summary(cur, chat_id:int, d_start, d_end):
         "night_deletes":    int(night_del or 0),
     }
 
-@_with_cursor
+@_with_analytics_cursor
 def get_heatmap(cur, chat_id:int, ts_start, ts_end):
     # 0=Sonntag → 1..7 (Mo..So)
     cur.execute("""
@@ -1193,7 +2124,7 @@ def get_heatmap(cur, chat_id:int, ts_start, ts_end):
         grid[dow-1][hour] = int(cnt)
     return grid
 
-@_with_cursor
+@_with_analytics_cursor
 def get_agg_rows(cur, chat_id: int, d_start, d_end):
     cur.execute("""
         SELECT stat_date, messages_total, active_users, joins, leaves, kicks,
@@ -1205,7 +2136,7 @@ def get_agg_rows(cur, chat_id: int, d_start, d_end):
     """, (chat_id, d_start, d_end))
     return cur.fetchall()
 
-@_with_cursor
+@_with_analytics_cursor
 def get_top_responders(cur, chat_id: int, d_start, d_end, limit: int = 10):
     cur.execute("""
         SELECT answer_user,
@@ -1266,6 +2197,7 @@ _LEVEL_PRESETS = {
     "strict": {"emoji_max_per_msg": 6, "emoji_max_per_min": 30, "max_msgs_per_10s": 4}
 }
 
+@_invalidates_config("spam_policy_topic", topic_arg=True)
 @_with_cursor
 def set_spam_policy_topic(cur, chat_id: int, topic_id: int, **fields):
     """
@@ -1298,6 +2230,7 @@ def set_spam_policy_topic(cur, chat_id: int, topic_id: int, **fields):
     """
     cur.execute(sql, (chat_id, topic_id, *values))
 
+@_cached_config("spam_topic")
 @_with_cursor
 def get_spam_policy_topic(cur, chat_id:int, topic_id:int) -> dict|None:
     cols = [
@@ -1314,6 +2247,7 @@ def get_spam_policy_topic(cur, chat_id:int, topic_id:int) -> dict|None:
     row = cur.fetchone()
     return dict(zip(cols, row)) if row else None
 
+@_invalidates_config("spam_policy_topic", topic_arg=True)
 @_with_cursor
 def delete_spam_policy_topic(cur, chat_id:int, topic_id:int):
     cur.execute("DELETE FROM spam_policy_topic WHERE chat_id=%s AND topic_id=%s;", (chat_id, topic_id))
@@ -1348,7 +2282,7 @@ def _extract_link_flags(link_settings):
     # Fallback
     return False, False, DEFAULT_TEXT, True
 
-def effective_spam_policy(chat_id:int, topic_id:int|None, link_settings) -> dict:
+def effective_spam_policy(chat_id:int, topic_id:int|None, link_settings) -> SpamPolicy:
     """
     link_settings kann tuple/list oder dict sein.
     """
@@ -1370,7 +2304,12 @@ def effective_spam_policy(chat_id:int, topic_id:int|None, link_settings) -> dict
             # ggf. erneut Preset ziehen, falls das Override den Level geändert hat
             base.update(_LEVEL_PRESETS.get(base["level"], {}))
 
-    return base
+    return compile_spam_policy(base)
+
+@_cached_config("spam_policy")
+def get_effective_spam_policy(chat_id:int, topic_id:int|None) -> SpamPolicy:
+    """Wie effective_spam_policy, Link-Flags aus group_settings; je (Chat, Topic) gecacht."""
+    return effective_spam_policy(chat_id, topic_id, get_link_settings(chat_id) or {})
 
 # --- Topic Router ---
 @_with_cursor
@@ -1488,6 +2427,7 @@ def get_mood_topic(cur, chat_id: int) -> Optional[int]:
     return int(row[0]) if row and row[0] else None
 
 # --- Welcome / Rules / Farewell ---
+@_invalidates_config("welcome")
 @_with_cursor
 def set_welcome(cur, chat_id: int, photo_id: Optional[str], text: Optional[str]):
     try:
@@ -1502,15 +2442,18 @@ def set_welcome(cur, chat_id: int, photo_id: Optional[str], text: Optional[str])
         logger.error(f"DB-Fehler in set_welcome: {e}", exc_info=True)
         raise
 
+@_cached_config("welcome")
 @_with_cursor
 def get_welcome(cur, chat_id: int) -> Optional[Tuple[str, str]]:
     cur.execute("SELECT photo_id, text FROM welcome WHERE chat_id = %s;", (chat_id,))
     return cur.fetchone()
 
+@_invalidates_config("welcome")
 @_with_cursor
 def delete_welcome(cur, chat_id: int):
     cur.execute("DELETE FROM welcome WHERE chat_id = %s;", (chat_id,))
 
+@_invalidates_config("rules")
 @_with_cursor
 def set_rules(cur, chat_id: int, photo_id: Optional[str], text: Optional[str]):
     cur.execute(
@@ -1519,15 +2462,18 @@ def set_rules(cur, chat_id: int, photo_id: Optional[str], text: Optional[str]):
         (chat_id, photo_id, text)  # Korrekte Reihenfolge
     )
 
+@_cached_config("rules")
 @_with_cursor
 def get_rules(cur, chat_id: int) -> Optional[Tuple[str, str]]:
     cur.execute("SELECT photo_id, text FROM rules WHERE chat_id = %s;", (chat_id,))
     return cur.fetchone()
 
+@_invalidates_config("rules")
 @_with_cursor
 def delete_rules(cur, chat_id: int):
     cur.execute("DELETE FROM rules WHERE chat_id = %s;", (chat_id,))
 
+@_invalidates_config("farewell")
 @_with_cursor
 def set_farewell(cur, chat_id: int, photo_id: Optional[str], text: Optional[str]):
     cur.execute(
@@ -1536,15 +2482,18 @@ def set_farewell(cur, chat_id: int, photo_id: Optional[str], text: Optional[str]
         (chat_id, photo_id, text)  # Korrekte Reihenfolge
     )
 
+@_cached_config("farewell")
 @_with_cursor
 def get_farewell(cur, chat_id: int) -> Optional[Tuple[str, str]]:
     cur.execute("SELECT photo_id, text FROM farewell WHERE chat_id = %s;", (chat_id,))
     return cur.fetchone()
 
+@_invalidates_config("farewell")
 @_with_cursor
 def delete_farewell(cur, chat_id: int):
     cur.execute("DELETE FROM farewell WHERE chat_id = %s;", (chat_id,))
 
+@_cached_config("captcha")
 @_with_cursor
 def get_captcha_settings(cur, chat_id: int):
     cur.execute(
@@ -1553,6 +2502,7 @@ def get_captcha_settings(cur, chat_id: int):
     )
     return cur.fetchone() or (False, 'button', 'kick')
 
+@_invalidates_config("group_settings")
 @_with_cursor
 def set_captcha_settings(cur, chat_id: int, enabled: bool, ctype: str, behavior: str):
     cur.execute(
@@ -1651,12 +2601,14 @@ def get_rss_feeds_full(cur):
 
 # --- KI ---
 
+@_cached_config("ai")
 @_with_cursor
 def get_ai_settings(cur, chat_id:int) -> tuple[bool,bool]:
     cur.execute("SELECT ai_faq_enabled, ai_rss_summary FROM group_settings WHERE chat_id=%s;", (chat_id,))
     row = cur.fetchone()
     return (row[0], row[1]) if row else (False, False)
 
+@_invalidates_config("group_settings")
 @_with_cursor
 def set_ai_settings(cur, chat_id:int, faq:bool|None=None, rss:bool|None=None):
     parts, params = [], []
@@ -1745,14 +2697,6 @@ def list_candidate_chats_for_ads(cur) -> List[int]:
     cur.execute("SELECT DISTINCT chat_id FROM message_logs WHERE timestamp > NOW() - INTERVAL '30 days';")
     return [r[0] for r in (cur.fetchall() or [])]
 
-@_with_cursor
-def set_adv_topic(cur, chat_id:int, topic_id:int|None):
-    cur.execute("""
-      INSERT INTO adv_settings (chat_id, adv_topic_id)
-      VALUES (%s, %s)
-      ON CONFLICT (chat_id) DO UPDATE SET adv_topic_id=EXCLUDED.adv_topic_id;
-    """, (chat_id, topic_id))
-
 @_with_cursor
 def get_adv_settings(cur, chat_id:int) -> dict:
     cur.execute("""
@@ -1862,7 +2806,8 @@ def set_last_posted_link(cur, chat_id: int, feed_url: str, link: str):
             SET link = EXCLUDED.link, posted_at = EXCLUDED.posted_at;
     """, (chat_id, feed_url, link))
 
-def get_effective_link_policy(chat_id: int, topic_id: int | None) -> dict:
+@_cached_config("link_policy")
+def get_effective_link_policy(chat_id: int, topic_id: int | None) -> LinkPolicy:
     # 1) Link-Flags (global) tolerant extrahieren
     link_settings = get_link_settings(chat_id) or {}
     prot_on, warn_on, warn_text, except_on = _extract_link_flags(link_settings)
@@ -1872,17 +2817,14 @@ def get_effective_link_policy(chat_id: int, topic_id: int | None) -> dict:
 
     # 2) Topic-Overrides nur für WL/BL/Aktion
     sp = get_spam_policy_topic(chat_id, int(topic_id or 0)) or {}
-    wl     = list(sp.get("link_whitelist") or [])
-    bl     = list(sp.get("domain_blacklist") or [])
-    action = (sp.get("action_primary") or "delete").lower()
 
-    return {
-        "admins_only": admins_only,
-        "warning_text": warning_text,
-        "whitelist": wl,
-        "blacklist": bl,
-        "action": action,
-    }
+    return compile_link_policy(
+        admins_only=admins_only,
+        warning_text=warning_text,
+        whitelist=sp.get("link_whitelist"),
+        blacklist=sp.get("domain_blacklist"),
+        action=sp.get("action_primary"),
+    )
 
 def _pending_inputs_col(cur) -> str:
     """Ermittelt, ob pending_inputs die Spalte 'chat_id' oder 'ctx_chat_id' hat."""
@@ -1903,8 +2845,7 @@ def _pending_inputs_col(cur) -> str:
     return _pi_col_cache
 
 def prune_posted_links(chat_id, keep_last=100):
-    conn = _db_pool.getconn()
-    try:
+    with borrow_connection("prune_posted_links") as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 DELETE FROM last_posts
@@ -1917,17 +2858,12 @@ def prune_posted_links(chat_id, keep_last=100):
                    )
             """, (chat_id, chat_id, keep_last))
         conn.commit()
-    finally:
-        _db_pool.putconn(conn)
 
 def get_all_group_ids():
-    conn = _db_pool.getconn()
-    try:
+    with borrow_connection("get_all_group_ids") as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT chat_id FROM group_settings")
             return [row[0] for row in cur.fetchall()]
-    finally:
-        _db_pool.putconn(conn)
 
 def _default_policy():
     return {
@@ -1946,6 +2882,9 @@ def _default_policy():
     }
 
 
+# message_logs-Zeile im Puffer (statistic._message_log_row): chat_id [0], topic_id [2], user_id [4], timestamp [12]
+@_plus_pending("message_logs", lambda r, chat_id, topic_id, user_id, start_dt, end_dt: (
+    r[0] == chat_id and r[2] == topic_id and r[4] == user_id and start_dt <= r[12] < end_dt))
 @_with_cursor
 def count_topic_user_messages_between(cur, chat_id:int, topic_id:int, user_id:int, start_dt, end_dt) -> int:
     cur.execute("""
@@ -1966,12 +2905,16 @@ def count_topic_user_messages_today(chat_id:int, topic_id:int, user_id:int, tz:s
 
 # Mulitlanguage
 
+def translation_key(source_text: str) -> str:
+    """sha256 (hex) des Quelltexts – Schlüssel in translations_cache (lange Texte sprengen sonst den B-Tree)."""
+    return hashlib.sha256(source_text.encode("utf-8")).hexdigest()
+
 @_with_cursor
 def get_cached_translation(cur, source_text: str, lang: str) -> Optional[str]:
     cur.execute(
         "SELECT translated FROM translations_cache "
-        "WHERE source_text=%s AND language_code=%s;",
-        (source_text, lang)
+        "WHERE source_hash=%s AND language_code=%s;",
+        (translation_key(source_text), lang)
     )
     row = cur.fetchone()
     return row[0] if row else None
@@ -1982,15 +2925,42 @@ def set_cached_translation(cur, source_text: str, lang: str,
     cur.execute(
         """
         INSERT INTO translations_cache
-          (source_text, language_code, translated, is_override)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (source_text, language_code) DO UPDATE
+          (source_hash, source_text, language_code, translated, is_override)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (source_hash, language_code) DO UPDATE
           SET translated = EXCLUDED.translated,
               is_override = EXCLUDED.is_override;
         """,
-        (source_text, lang, translated, override)
+        (translation_key(source_text), source_text, lang, translated, override)
+    )
+
+@_with_cursor
+def get_cached_translations(cur, lang: str, source_hashes: list[str]) -> dict[str, str]:
+    """Mehrere Übersetzungen auf einmal: {source_hash: translated}."""
+    if not source_hashes:
+        return {}
+    cur.execute(
+        "SELECT source_hash, translated FROM translations_cache "
+        "WHERE language_code=%s AND source_hash = ANY(%s);",
+        (lang, list(source_hashes))
     )
+    return {h: t for h, t in cur.fetchall()}
+
+@_with_cursor
+def translations_source_hash(cur):
+    """translations_cache: Primärschlüssel (source_text, lang) → (sha256(source_text), lang)."""
+    cur.execute("ALTER TABLE translations_cache ADD COLUMN IF NOT EXISTS source_hash TEXT;")
+    # sha256() ist ab PostgreSQL 11 eingebaut, liefert dasselbe wie translation_key()
+    cur.execute("""
+        UPDATE translations_cache
+           SET source_hash = encode(sha256(convert_to(source_text, 'UTF8')), 'hex')
+         WHERE source_hash IS NULL;
+    """)
+    cur.execute("ALTER TABLE translations_cache ALTER COLUMN source_hash SET NOT NULL;")
+    cur.execute("ALTER TABLE translations_cache DROP CONSTRAINT IF EXISTS translations_cache_pkey;")
+    cur.execute("ALTER TABLE translations_cache ADD PRIMARY KEY (source_hash, language_code);")
 
+@_cached_config("language")
 @_with_cursor
 def get_group_language(cur, chat_id: int) -> str:
     cur.execute(
@@ -2000,6 +2970,7 @@ def get_group_language(cur, chat_id: int) -> str:
     row = cur.fetchone()
     return row[0] if row else 'de'
 
+@_invalidates_config("group_settings")
 @_with_cursor
 def set_group_language(cur, chat_id: int, lang: str):
     cur.execute(
@@ -2009,6 +2980,7 @@ def set_group_language(cur, chat_id: int, lang: str):
     )
 
 # --- Night Mode Settings ---
+@_cached_config("night_mode")
 @_with_cursor
 def get_night_mode(cur, chat_id: int):
     cur.execute("""
@@ -2022,6 +2994,7 @@ def get_night_mode(cur, chat_id: int):
         return (False, 1320, 360, True, True, 'Europe/Berlin', False, None)
     return row
 
+@_invalidates_config("night_mode")
 @_with_cursor
 def set_night_mode(cur, chat_id: int,
                    enabled=None,
@@ -2125,8 +3098,7 @@ def migrate_db():
         cur.execute("ALTER TABLE rss_feeds ADD COLUMN IF NOT EXISTS enabled       BOOLEAN;")
         cur.execute("ALTER TABLE rss_feeds ALTER COLUMN post_images SET DEFAULT FALSE;")
         cur.execute("ALTER TABLE rss_feeds ALTER COLUMN enabled     SET DEFAULT TRUE;")
-        cur.execute("UPDATE rss_feeds SET post_images=FALSE WHERE post_images IS NULL;")
-        cur.execute("UPDATE rss_feeds SET enabled=TRUE  WHERE enabled     IS NULL;")
+        # NULL-Werte in post_images/enabled füllt der Backfill „rss_feeds_defaults“ im Hintergrund
         # --- reply_times auf neues Schema heben (idempotent) ---
         cur.execute("CREATE TABLE IF NOT EXISTS reply_times (chat_id BIGINT, question_msg_id BIGINT, question_user BIGINT, answer_msg_id BIGINT, answer_user BIGINT, delta_ms BIGINT, ts TIMESTAMP DEFAULT NOW());")
         cur.execute("ALTER TABLE reply_times ADD COLUMN IF NOT EXISTS chat_id BIGINT;")
@@ -2217,17 +3189,692 @@ def init_ads_schema():
     """Initialize advertising system schema"""
     init_db()  # Ensure base schema exists first
 
+# --- Migration-Ledger ---
+# Jede Migration hat eine feste Nummer und läuft genau einmal (schema_migrations).
+# Neue Schemaänderungen bekommen eine neue Nummer – bestehende nie umnummerieren!
+# Andere Module (statistic, ads, …) registrieren ihre Migrationen beim Import. Fehlt eine
+# Nummer unterhalb der höchsten (Modul nicht importiert, z. B. `python database.py` ohne ads),
+# verweigert der Lauf – sonst liefen die fehlenden später außer der Reihe.
+_MIGRATIONS: dict[int, tuple[str, Any]] = {}
+_MIGRATION_LOCK_ID = 724_310_001  # pg_advisory_lock: nur ein Prozess migriert
+
+def register_migration(version: int, name: str, fn) -> None:
+    prev = _MIGRATIONS.get(version)
+    if prev and prev[0] != name:
+        raise ValueError(f"Migration {version} doppelt vergeben: {prev[0]} / {name}")
+    _MIGRATIONS[version] = (name, fn)
+
+@_with_cursor
+def _ensure_migration_ledger(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version    INT PRIMARY KEY,
+          name       TEXT NOT NULL,
+          applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+          name       TEXT PRIMARY KEY,
+          position   BIGINT NOT NULL DEFAULT 0,
+          done       BOOLEAN NOT NULL DEFAULT FALSE,
+          updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+
+@_with_cursor
+def _applied_migrations(cur) -> set[int]:
+    cur.execute("SELECT version FROM schema_migrations;")
+    return {r[0] for r in cur.fetchall()}
+
+@_with_cursor
+def _record_migration(cur, version: int, name: str):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING;",
+        (version, name)
+    )
+
+def run_migrations() -> int:
+    """Führt alle noch nicht angewendeten Migrationen in Nummernfolge aus. Liefert die Anzahl."""
+    # eigener Pool ohne statement_timeout: Migrationen dürfen lange laufen
+    with use_pool("maintenance"):
+        return _run_migrations_locked()
+
+def _migration_gaps(applied: set[int]) -> list[int]:
+    """Nummern unterhalb der höchsten registrierten, die weder registriert noch angewendet sind."""
+    if not _MIGRATIONS:
+        return []
+    return [v for v in range(1, max(_MIGRATIONS)) if v not in _MIGRATIONS and v not in applied]
+
+def _run_migrations_locked() -> int:
+    _ensure_migration_ledger()
+    maint_pool = _db_pools["maintenance"]
+    lock_conn = maint_pool.getconn()
+    try:
+        lock_conn.autocommit = True
+        with lock_conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s);", (_MIGRATION_LOCK_ID,))
+        try:
+            applied = _applied_migrations()
+            missing = _migration_gaps(applied)
+            if missing:
+                raise RuntimeError(
+                    f"Migrationen {missing} nicht registriert (Modul nicht importiert?) – "
+                    f"Lauf abgebrochen, damit sie nicht später außer der Reihe laufen"
+                )
+            ran = 0
+            for version in sorted(_MIGRATIONS):
+                if version in applied:
+                    continue
+                name, fn = _MIGRATIONS[version]
+                logger.info(f"🛠 Migration {version:04d} ({name}) …")
+                fn()
+                _record_migration(version, name)
+                ran += 1
+            return ran
+        finally:
+            with lock_conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (_MIGRATION_LOCK_ID,))
+    finally:
+        lock_conn.autocommit = False
+        maint_pool.putconn(lock_conn)
+
+register_migration(1, "base_schema", init_db)
+register_migration(2, "legacy_migrate_db", migrate_db)
+register_migration(3, "stats_rollup", migrate_stats_rollup)
+register_migration(4, "spam_topic_schema", ensure_spam_topic_schema)
+register_migration(5, "forum_topics_schema", ensure_forum_topics_schema)
+register_migration(6, "ai_moderation_schema", ensure_ai_moderation_schema)
+
+# --- Backfills (batchweise, fortsetzbar, im Hintergrund) ---
+# Statt großer UPDATEs beim Start: Tabelle in ctid-Blockbereichen abarbeiten,
+# Fortschritt in schema_backfills merken → nach Neustart geht es dort weiter.
+DB_BACKFILL_BLOCKS = int(os.getenv("DB_BACKFILL_BLOCKS", "1000"))
+DB_BACKFILL_PAUSE_S = float(os.getenv("DB_BACKFILL_PAUSE_S", "0.2"))
+_BACKFILLS: dict[str, tuple[str, str, str]] = {}
+# Folgeschritt je Backfill (idempotent): läuft nach dem Abschluss und bei jedem Start danach erneut
+_BACKFILL_AFTER: dict[str, Any] = {}
+_backfill_thread: threading.Thread | None = None
+
+def register_backfill(name: str, table: str, set_clause: str, where: str, after=None) -> None:
+    _BACKFILLS[name] = (table, set_clause, where)
+    if after is not None:
+        _BACKFILL_AFTER[name] = after
+
+@_with_cursor
+def _backfill_state(cur, name: str) -> tuple[int, bool]:
+    cur.execute(
+        "INSERT INTO schema_backfills (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;", (name,)
+    )
+    cur.execute("SELECT position, done FROM schema_backfills WHERE name=%s;", (name,))
+    pos, done = cur.fetchone()
+    return int(pos), bool(done)
+
+@_with_cursor
+def _backfill_total_blocks(cur, table: str) -> int:
+    # bei partitionierten Tabellen zählt die größte Partition (ctid gilt je Partition)
+    cur.execute("""
+        SELECT COALESCE(MAX(pg_relation_size(c.oid)), 0) / current_setting('block_size')::int
+          FROM pg_class c
+         WHERE c.oid = %s::regclass
+            OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass);
+    """, (table, table))
+    return int(cur.fetchone()[0] or 0)
+
+@_with_cursor
+def _backfill_batch(cur, name: str, table: str, set_clause: str, where: str, start: int, end: int) -> int:
+    cur.execute(
+        f"UPDATE {table} SET {set_clause} "
+        f"WHERE ctid >= %s::tid AND ctid < %s::tid AND ({where});",
+        (f"({start},0)", f"({end},0)")
+    )
+    n = cur.rowcount
+    cur.execute(
+        "UPDATE schema_backfills SET position=%s, updated_at=NOW() WHERE name=%s;", (end, name)
+    )
+    return n
+
+@_with_cursor
+def _backfill_finish(cur, name: str):
+    cur.execute("UPDATE schema_backfills SET done=TRUE, updated_at=NOW() WHERE name=%s;", (name,))
+
+def run_backfill(name: str) -> int:
+    """Arbeitet einen Backfill ab (fortsetzbar). Liefert die Anzahl aktualisierter Zeilen."""
+    table, set_clause, where = _BACKFILLS[name]
+    pos, done = _backfill_state(name)
+    after = _BACKFILL_AFTER.get(name)
+    if done:
+        if after is not None:
+            after()
+        return 0
+    total = _backfill_total_blocks(table)
+    updated = 0
+    while pos <= total:
+        end = pos + DB_BACKFILL_BLOCKS
+        updated += _backfill_batch(name, table, set_clause, where, pos, end)
+        pos = end
+        if DB_BACKFILL_PAUSE_S:
+            time.sleep(DB_BACKFILL_PAUSE_S)
+    _backfill_finish(name)
+    logger.info(f"✅ Backfill {name} abgeschlossen ({updated} Zeilen)")
+    if after is not None:
+        after()
+    return updated
+
+def start_backfills() -> None:
+    """Startet alle offenen Backfills in einem Hintergrund-Thread (blockiert main() nicht)."""
+    global _backfill_thread
+    if not _BACKFILLS or (_backfill_thread and _backfill_thread.is_alive()):
+        return
+
+    def _run():
+        with use_pool("maintenance"):
+            for name in list(_BACKFILLS):
+                try:
+                    run_backfill(name)
+                except Exception:
+                    logger.exception(f"Backfill {name} abgebrochen (wird beim nächsten Start fortgesetzt)")
+
+    _backfill_thread = threading.Thread(target=_run, name="db-backfills", daemon=True)
+    _backfill_thread.start()
+
+register_backfill("rss_feeds_defaults", "rss_feeds",
+                  "post_images = COALESCE(post_images, FALSE), enabled = COALESCE(enabled, TRUE)",
+                  "post_images IS NULL OR enabled IS NULL")
+
+# --- message_logs: monatliche Partitionen + Aufbewahrung ---
+# message_logs ist nach "timestamp" RANGE-partitioniert (ein Monat je Partition, UTC).
+# Bereichsabfragen (Heatmap, Insights, Kontingente …) lesen so nur die betroffenen Monate,
+# alte Monate werden per DROP entfernt statt per DELETE.
+MESSAGE_LOG_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_LOG_PARTITIONS_AHEAD", "3"))
+# Standard-Aufbewahrung in Tagen (0 = unbegrenzt); pro Chat über group_settings.message_retention_days
+MESSAGE_LOG_RETENTION_DAYS = int(os.getenv("MESSAGE_LOG_RETENTION_DAYS", "0"))
+_PARTITION_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+def _month_start(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1, tzinfo=ZoneInfo("UTC"))
+
+def _add_months(d: datetime, n: int) -> datetime:
+    y, m = divmod(d.month - 1 + n, 12)
+    return d.replace(year=d.year + y, month=m + 1, day=1)
+
+def _parse_bound(val: str) -> datetime | None:
+    val = val.strip()
+    if val in ("MINVALUE", "MAXVALUE"):
+        return None
+    val = val.strip("'")
+    if re.search(r"[+-]\d\d$", val):
+        val += ":00"
+    return datetime.fromisoformat(val)
+
+def _create_month_partition(cur, start: datetime):
+    end = _add_months(start, 1)
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS message_logs_p{start:%Y%m} PARTITION OF message_logs "
+        f"FOR VALUES FROM (%s) TO (%s);",
+        (start, end)
+    )
+
+# Name des CHECK, der beim Umbau den Scan von ATTACH PARTITION erspart
+_MESSAGE_LOGS_BOUND = "message_logs_partition_bound"
+# ATTACH/RENAME brauchen kurz ACCESS EXCLUSIVE: nicht ewig hinter laufenden Abfragen warten
+MESSAGE_LOG_SWAP_LOCK_TIMEOUT = os.getenv("MESSAGE_LOG_SWAP_LOCK_TIMEOUT", "10s")
+
+def _message_logs_partitioned_tail(cur, first_month: datetime):
+    # Auffangbecken für Ausreißer (NULL/ferne Zeitstempel) – sonst scheitert der ganze Insert-Batch
+    cur.execute("CREATE TABLE IF NOT EXISTS message_logs_default PARTITION OF message_logs DEFAULT;")
+    # Indizes am Parent: vorhandene gleichartige Indizes der Partitionen werden übernommen, nicht neu gebaut
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_message_logs_chat_ts ON message_logs(chat_id, "timestamp" DESC);')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_msglogs_topic_user_ts ON message_logs(chat_id, topic_id, user_id, "timestamp" DESC);')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_message_logs_group ON message_logs(group_id);")
+    for i in range(MESSAGE_LOG_PARTITIONS_AHEAD + 1):
+        _create_month_partition(cur, _add_months(first_month, i))
+
+@_with_cursor
+def _message_logs_relkind(cur) -> str | None:
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('message_logs');")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def create_message_logs(cur):
+    """Frische Installation: message_logs gleich partitioniert anlegen (Migration 1 bzw. 8).
+    Eine bestehende Tabelle bleibt unangetastet – die baut der Backfill message_logs_timestamp um."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('message_logs');")
+    if cur.fetchone() is not None:
+        return
+    cur.execute("""
+        CREATE TABLE message_logs (
+            chat_id BIGINT, group_id BIGINT, topic_id BIGINT, message_id BIGINT, user_id BIGINT,
+            content TEXT,
+            is_photo BOOLEAN DEFAULT FALSE, is_video BOOLEAN DEFAULT FALSE,
+            is_sticker BOOLEAN DEFAULT FALSE, is_voice BOOLEAN DEFAULT FALSE,
+            is_location BOOLEAN DEFAULT FALSE, is_reply BOOLEAN DEFAULT FALSE,
+            "timestamp" TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            last_message_time TIMESTAMPTZ
+        ) PARTITION BY RANGE ("timestamp");
+    """)
+    _create_month_partition(cur, _month_start(_utcnow()))
+
+@_with_cursor
+def partition_message_logs(cur):
+    """Migration: Partitionen im Voraus, DEFAULT-Partition und Indizes für message_logs.
+    Angelegt wird die Tabelle schon partitioniert (create_message_logs). Eine unpartitionierte
+    Alt-Tabelle wird hier nicht angefasst (kein Vollscan beim Start): NULL-Zeitstempel füllt der
+    Backfill message_logs_timestamp, danach hängt convert_message_logs_partitioned den Altbestand
+    ohne Umkopieren als Partition an."""
+    cur.execute("ALTER TABLE group_settings ADD COLUMN IF NOT EXISTS message_retention_days INT;")
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('message_logs');")
+    row = cur.fetchone()
+    if row is None or row[0] != "p":
+        return
+    _message_logs_partitioned_tail(cur, _add_months(_month_start(_utcnow()), 1))
+
+@_with_cursor
+def _add_message_logs_bound(cur, bound: datetime):
+    # NOT VALID: nur kurze Sperre, prüft ab jetzt neue Zeilen; der Altbestand folgt per VALIDATE
+    cur.execute(f"ALTER TABLE message_logs DROP CONSTRAINT IF EXISTS {_MESSAGE_LOGS_BOUND};")
+    cur.execute(
+        f'ALTER TABLE message_logs ADD CONSTRAINT {_MESSAGE_LOGS_BOUND} '
+        f'CHECK ("timestamp" IS NOT NULL AND "timestamp" < %s) NOT VALID;',
+        (bound,)
+    )
+
+@_with_cursor
+def _validate_message_logs_bound(cur):
+    # SHARE UPDATE EXCLUSIVE: der Scan blockiert keine Inserts
+    cur.execute(f"ALTER TABLE message_logs VALIDATE CONSTRAINT {_MESSAGE_LOGS_BOUND};")
+
+@_with_cursor
+def _swap_message_logs_partitioned(cur, bound: datetime) -> bool:
+    cur.execute("SET LOCAL lock_timeout = %s;", (MESSAGE_LOG_SWAP_LOCK_TIMEOUT,))
+    cur.execute("LOCK TABLE message_logs IN ACCESS EXCLUSIVE MODE;")
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('message_logs');")
+    if cur.fetchone()[0] == "p":
+        return False
+    cur.execute("ALTER TABLE message_logs RENAME TO message_logs_legacy;")
+    for idx in ("idx_message_logs_chat_ts", "idx_msglogs_topic_user_ts", "idx_message_logs_group"):
+        cur.execute(f"ALTER INDEX IF EXISTS {idx} RENAME TO {idx}_legacy;")
+    cur.execute("""
+        CREATE TABLE message_logs (LIKE message_logs_legacy INCLUDING DEFAULTS)
+        PARTITION BY RANGE ("timestamp");
+    """)
+    # der validierte CHECK entspricht genau der Partitionsgrenze → ATTACH ohne Tabellenscan
+    cur.execute(
+        "ALTER TABLE message_logs ATTACH PARTITION message_logs_legacy FOR VALUES FROM (MINVALUE) TO (%s);",
+        (bound,)
+    )
+    cur.execute(f"ALTER TABLE message_logs_legacy DROP CONSTRAINT {_MESSAGE_LOGS_BOUND};")
+    _message_logs_partitioned_tail(cur, bound)
+    return True
+
+def convert_message_logs_partitioned() -> bool:
+    """Folgeschritt des Backfills message_logs_timestamp (Maintenance-Pool, Hintergrund):
+    CHECK NOT VALID → VALIDATE (ohne Schreibsperre) → kurzer Tausch mit ATTACH ohne Scan."""
+    if _message_logs_relkind() in (None, "p"):
+        return False
+    # zwei Monate Luft: neue Zeilen müssen die Grenze bis zum Tausch einhalten
+    bound = _add_months(_month_start(_utcnow()), 2)
+    _add_message_logs_bound(bound)
+    _validate_message_logs_bound()
+    if _swap_message_logs_partitioned(bound):
+        logger.info(f"✅ message_logs partitioniert (Altbestand bis {bound:%Y-%m-%d} als Partition)")
+        return True
+    return False
+
+# Zeilen ohne jeden Zeitstempel auf die Epoche datieren: NOW() würde sie dem laufenden Monat
+# zuschlagen (Statistik) und sie einen vollen Aufbewahrungszeitraum lang vor dem Löschen bewahren
+register_backfill("message_logs_timestamp", "message_logs",
+                  '"timestamp" = COALESCE(last_message_time, TIMESTAMPTZ \'epoch\')', '"timestamp" IS NULL',
+                  after=convert_message_logs_partitioned)
+
+@_with_cursor
+def list_message_log_partitions(cur) -> list[tuple[str, datetime | None, datetime | None]]:
+    """(name, von, bis) je Partition; None = MINVALUE/MAXVALUE. Die DEFAULT-Partition fehlt."""
+    cur.execute("SET LOCAL TimeZone = 'UTC';")
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+          FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = to_regclass('message_logs');
+    """)
+    out = []
+    for name, bound in cur.fetchall():
+        m = _PARTITION_RE.search(bound or "")
+        if m:
+            out.append((name, _parse_bound(m.group(1)), _parse_bound(m.group(2))))
+    return sorted(out, key=lambda p: p[2] or datetime.max.replace(tzinfo=ZoneInfo("UTC")))
+
+@_with_cursor
+def ensure_message_log_partitions(cur, months_ahead: int | None = None) -> int:
+    """Legt fehlende Monatspartitionen bis months_ahead Monate in die Zukunft an. Liefert die Anzahl."""
+    months_ahead = MESSAGE_LOG_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    if _message_logs_relkind() != "p":
+        return 0   # Umbau läuft noch (Backfill message_logs_timestamp)
+    parts = list_message_log_partitions()
+    covered = max((hi for _, _, hi in parts if hi), default=None)
+    start = _month_start(_utcnow())
+    if covered and covered > start:
+        start = _month_start(covered)
+    last = _add_months(_month_start(_utcnow()), months_ahead)
+    created = 0
+    while start <= last:
+        _create_month_partition(cur, start)
+        start = _add_months(start, 1)
+        created += 1
+    return created
+
+@_with_cursor
+def set_message_retention_days(cur, chat_id: int, days: int | None):
+    """None = globaler Standard (MESSAGE_LOG_RETENTION_DAYS), 0 = unbegrenzt."""
+    cur.execute(
+        "UPDATE group_settings SET message_retention_days=%s WHERE chat_id=%s;",
+        (days, chat_id)
+    )
+
+@_with_cursor
+def get_message_retention_days(cur, chat_id: int) -> int:
+    cur.execute("SELECT message_retention_days FROM group_settings WHERE chat_id=%s;", (chat_id,))
+    row = cur.fetchone()
+    return MESSAGE_LOG_RETENTION_DAYS if not row or row[0] is None else int(row[0])
+
+@_with_cursor
+def _message_retention_overrides(cur) -> dict[int, int]:
+    cur.execute("SELECT chat_id, message_retention_days FROM group_settings WHERE message_retention_days IS NOT NULL;")
+    return {int(cid): int(days) for cid, days in cur.fetchall()}
+
+@_with_cursor
+def _drop_message_log_partition(cur, name: str):
+    cur.execute(f"ALTER TABLE message_logs DETACH PARTITION {name};")
+    cur.execute(f"DROP TABLE {name};")
+
+@_with_cursor
+def _delete_chat_messages_before(cur, chat_id: int, cutoff: datetime) -> int:
+    cur.execute('DELETE FROM message_logs WHERE chat_id=%s AND "timestamp" < %s;', (chat_id, cutoff))
+    return cur.rowcount
+
+def apply_message_log_retention() -> dict:
+    """Setzt die Aufbewahrung durch.
+    Partitionen, die vollständig älter als die *längste* geltende Frist sind, werden gedroppt.
+    Chats mit kürzerer Frist teilen sich die Monatspartitionen mit anderen – dort wird gezielt
+    per (chat_id, timestamp)-Index gelöscht."""
+    overrides = _message_retention_overrides()
+    horizons = [MESSAGE_LOG_RETENTION_DAYS] + list(overrides.values())
+    now = _utcnow()
+    dropped = []
+    if all(d > 0 for d in horizons):
+        cutoff = now - timedelta(days=max(horizons))
+        for name, _, hi in list_message_log_partitions():
+            if hi is not None and hi <= cutoff:
+                _drop_message_log_partition(name)
+                dropped.append(name)
+                logger.info(f"🗑 message_logs-Partition {name} entfernt (älter als {max(horizons)} Tage)")
+    longest = 0 if any(d <= 0 for d in horizons) else max(horizons)
+    deleted = 0
+    for chat_id, days in overrides.items():
+        if days > 0 and (longest == 0 or days < longest):
+            deleted += _delete_chat_messages_before(chat_id, now - timedelta(days=days))
+    if MESSAGE_LOG_RETENTION_DAYS > 0 and (longest == 0 or MESSAGE_LOG_RETENTION_DAYS < longest):
+        # Chats ohne eigene Frist, deren Standardfrist kürzer ist als die längste Einzelfrist
+        cutoff = now - timedelta(days=MESSAGE_LOG_RETENTION_DAYS)
+        for chat_id in _chats_with_default_retention():
+            deleted += _delete_chat_messages_before(chat_id, cutoff)
+    return {"dropped": dropped, "deleted": deleted}
+
+@_with_cursor
+def _chats_with_default_retention(cur) -> list[int]:
+    cur.execute("SELECT chat_id FROM group_settings WHERE message_retention_days IS NULL;")
+    return [r[0] for r in cur.fetchall()]
+
+register_migration(9, "message_logs_partitioning", partition_message_logs)
+
+# --- Admin-Index (User → Gruppen, in denen er Admin ist) ---
+# Gespeist aus dem Admin-Cache (access.py) und ChatMember-Updates; /start, /menu und die
+# Gruppenauswahl lesen nur noch hier statt pro Gruppe get_chat_administrators aufzurufen.
+@_with_cursor
+def ensure_admin_index_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_index (
+          chat_id BIGINT NOT NULL,
+          user_id BIGINT NOT NULL,
+          role    TEXT   NOT NULL DEFAULT 'administrator',
+          PRIMARY KEY (chat_id, user_id)
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_admin_index_user ON admin_index(user_id);")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_index_chats (
+          chat_id      BIGINT PRIMARY KEY,
+          refreshed_at TIMESTAMPTZ,
+          attempted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+
+@_with_cursor
+def replace_chat_admins(cur, chat_id: int, admins: list[tuple[int, str]]):
+    """Kompletten Admin-Stand eines Chats übernehmen (nach get_chat_administrators)."""
+    cur.execute("DELETE FROM admin_index WHERE chat_id = %s;", (chat_id,))
+    if admins:
+        execute_values(cur, "INSERT INTO admin_index (chat_id, user_id, role) VALUES %s ON CONFLICT DO NOTHING;",
+                       [(chat_id, uid, role) for uid, role in admins])
+    cur.execute("""
+        INSERT INTO admin_index_chats (chat_id, refreshed_at, attempted_at) VALUES (%s, NOW(), NOW())
+        ON CONFLICT (chat_id) DO UPDATE SET refreshed_at = NOW(), attempted_at = NOW();
+    """, (chat_id,))
+
+@_with_cursor
+def mark_admin_index_attempt(cur, chat_id: int):
+    """Fehlgeschlagener Abruf: erst nach der Retry-Pause erneut versuchen."""
+    cur.execute("""
+        INSERT INTO admin_index_chats (chat_id, attempted_at) VALUES (%s, NOW())
+        ON CONFLICT (chat_id) DO UPDATE SET attempted_at = NOW();
+    """, (chat_id,))
+
+@_with_cursor
+def set_admin_index_role(cur, chat_id: int, user_id: int, role: str | None):
+    """Einzelne Änderung aus einem ChatMember-Update (role=None → kein Admin mehr)."""
+    if role is None:
+        cur.execute("DELETE FROM admin_index WHERE chat_id = %s AND user_id = %s;", (chat_id, user_id))
+        return
+    if role == "creator":
+        # es gibt nur einen Inhaber
+        cur.execute("UPDATE admin_index SET role = 'administrator' WHERE chat_id = %s AND role = 'creator';", (chat_id,))
+    cur.execute("""
+        INSERT INTO admin_index (chat_id, user_id, role) VALUES (%s, %s, %s)
+        ON CONFLICT (chat_id, user_id) DO UPDATE SET role = EXCLUDED.role;
+    """, (chat_id, user_id, role))
+
+@_with_cursor
+def get_chat_admin_index(cur, chat_id: int) -> tuple[bool, list[tuple[int, str]]]:
+    """(je erfolgreich indiziert?, [(user_id, role)]) – Rückfall, wenn Telegram gerade nicht antwortet."""
+    cur.execute("SELECT refreshed_at IS NOT NULL FROM admin_index_chats WHERE chat_id = %s;", (chat_id,))
+    row = cur.fetchone()
+    if not row or not row[0]:
+        return False, []
+    cur.execute("SELECT user_id, role FROM admin_index WHERE chat_id = %s;", (chat_id,))
+    return True, [(int(uid), role) for uid, role in cur.fetchall()]
+
+@_with_cursor
+def drop_admin_index_chat(cur, chat_id: int):
+    cur.execute("DELETE FROM admin_index WHERE chat_id = %s;", (chat_id,))
+    cur.execute("DELETE FROM admin_index_chats WHERE chat_id = %s;", (chat_id,))
+
+@_with_cursor
+def get_admin_groups(cur, user_id: int) -> List[Tuple[int, str]]:
+    """Registrierte Gruppen, in denen user_id laut Index Admin/Inhaber ist."""
+    cur.execute("""
+        SELECT g.chat_id, g.title
+          FROM admin_index a
+          JOIN groups g ON g.chat_id = a.chat_id
+         WHERE a.user_id = %s
+         ORDER BY g.title;
+    """, (user_id,))
+    return cur.fetchall()
+
+@_with_cursor
+def list_stale_admin_chats(cur, max_age_s: float, retry_s: float, limit: int) -> list[int]:
+    """Registrierte Gruppen ohne oder mit veraltetem Index-Stand (nie indizierte zuerst)."""
+    cur.execute("""
+        SELECT g.chat_id
+          FROM groups g
+          LEFT JOIN admin_index_chats c ON c.chat_id = g.chat_id
+         WHERE c.chat_id IS NULL
+            OR ((c.refreshed_at IS NULL OR c.refreshed_at < NOW() - make_interval(secs => %s))
+                AND c.attempted_at < NOW() - make_interval(secs => %s))
+         ORDER BY c.refreshed_at NULLS FIRST, c.attempted_at NULLS FIRST
+         LIMIT %s;
+    """, (max_age_s, retry_s, limit))
+    return [r[0] for r in cur.fetchall()]
+
+@_with_cursor
+def count_unindexed_admin_chats(cur) -> int:
+    cur.execute("""
+        SELECT COUNT(*) FROM groups g
+         WHERE NOT EXISTS (SELECT 1 FROM admin_index_chats c WHERE c.chat_id = g.chat_id);
+    """)
+    return int(cur.fetchone()[0])
+
+# --- Moderations-Urteile (persistente Stufe des Caches in moderation.py) ---
+@_with_cursor
+def ensure_moderation_cache_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS moderation_verdicts (
+          kind       TEXT        NOT NULL,
+          key        TEXT        NOT NULL,
+          verdict    JSONB       NOT NULL,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+          expires_at TIMESTAMPTZ NOT NULL,
+          PRIMARY KEY (kind, key)
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moderation_verdicts_expires ON moderation_verdicts(expires_at);")
+
+@_with_cursor
+def get_moderation_verdict(cur, kind: str, key: str):
+    """(verdict, restliche Gültigkeit in s) oder None."""
+    cur.execute("""
+        SELECT verdict, EXTRACT(EPOCH FROM expires_at - NOW())
+          FROM moderation_verdicts
+         WHERE kind = %s AND key = %s AND expires_at > NOW();
+    """, (kind, key))
+    row = cur.fetchone()
+    return (row[0], float(row[1])) if row else None
+
+@_with_cursor
+def put_moderation_verdict(cur, kind: str, key: str, verdict: dict, ttl_s: float):
+    cur.execute("""
+        INSERT INTO moderation_verdicts (kind, key, verdict, expires_at)
+        VALUES (%s, %s, %s, NOW() + make_interval(secs => %s))
+        ON CONFLICT (kind, key) DO UPDATE
+          SET verdict = EXCLUDED.verdict, created_at = NOW(), expires_at = EXCLUDED.expires_at;
+    """, (kind, key, Json(verdict, dumps=json.dumps), ttl_s))
+
+@_with_cursor
+def prune_moderation_verdicts(cur) -> int:
+    cur.execute("DELETE FROM moderation_verdicts WHERE expires_at <= NOW();")
+    return cur.rowcount
+
+# --- bekannte schlechte Inhalte (Vorfilter in prefilter.py) ---
+@_with_cursor
+def ensure_bad_hashes_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS moderation_bad_hashes (
+          hash     TEXT PRIMARY KEY,
+          category TEXT NOT NULL,
+          score    REAL NOT NULL DEFAULT 1.0,
+          added_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+
+@_with_cursor
+def load_bad_hashes(cur) -> dict[str, tuple[str, float]]:
+    cur.execute("SELECT hash, category, score FROM moderation_bad_hashes;")
+    return {h: (cat, float(score)) for h, cat, score in cur.fetchall()}
+
+@_with_cursor
+def add_bad_hash(cur, hash_hex: str, category: str, score: float = 1.0):
+    cur.execute(
+        "INSERT INTO moderation_bad_hashes (hash, category, score) VALUES (%s, %s, %s) ON CONFLICT (hash) DO NOTHING;",
+        (hash_hex, category, score)
+    )
+
+# --- Vertrauensstufen je (Chat, Nutzer) (trust.py) ---
+_TRUST_DEFAULTS = (True, 30, 50, 0.1)
+
+@_with_cursor
+def ensure_trust_schema(cur):
+    cur.execute("""
+        ALTER TABLE group_settings
+          ADD COLUMN IF NOT EXISTS trust_enabled     BOOLEAN NOT NULL DEFAULT TRUE,
+          ADD COLUMN IF NOT EXISTS trust_min_days    INT     NOT NULL DEFAULT 30,
+          ADD COLUMN IF NOT EXISTS trust_min_msgs    INT     NOT NULL DEFAULT 50,
+          ADD COLUMN IF NOT EXISTS trust_sample_rate REAL    NOT NULL DEFAULT 0.1;
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_spam_events_chat_user_ts ON spam_events(chat_id, user_id, ts DESC);")
+
+@_cached_config("trust")
+@_with_cursor
+def get_trust_settings(cur, chat_id: int):
+    """(enabled, min_days, min_msgs, sample_rate)"""
+    cur.execute(
+        "SELECT trust_enabled, trust_min_days, trust_min_msgs, trust_sample_rate FROM group_settings WHERE chat_id=%s",
+        (chat_id,)
+    )
+    return cur.fetchone() or _TRUST_DEFAULTS
+
+@_invalidates_config("group_settings")
+@_with_cursor
+def set_trust_settings(cur, chat_id: int, enabled: bool, min_days: int, min_msgs: int, sample_rate: float):
+    cur.execute(
+        """
+        INSERT INTO group_settings (chat_id, trust_enabled, trust_min_days, trust_min_msgs, trust_sample_rate)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (chat_id) DO UPDATE
+          SET trust_enabled     = EXCLUDED.trust_enabled,
+              trust_min_days    = EXCLUDED.trust_min_days,
+              trust_min_msgs    = EXCLUDED.trust_min_msgs,
+              trust_sample_rate = EXCLUDED.trust_sample_rate;
+        """,
+        (chat_id, enabled, min_days, min_msgs, sample_rate)
+    )
+
+@_with_analytics_cursor
+def get_trust_history(cur, chat_id: int, user_id: int, window_days: int = 90, msg_cap: int = 1000):
+    """
+    Grundlage für den Vertrauenswert: (joined_at, Nachrichten im Fenster (gedeckelt),
+    Strike-Punkte, Spam-Events und KI-Treffer im Fenster).
+    """
+    cur.execute("""
+        SELECT
+          (SELECT joined_at FROM members WHERE chat_id = %(c)s AND user_id = %(u)s),
+          (SELECT COUNT(*) FROM (
+             SELECT 1 FROM message_logs
+              WHERE chat_id = %(c)s AND user_id = %(u)s
+                AND "timestamp" > NOW() - make_interval(days => %(d)s)
+              LIMIT %(cap)s) m),
+          (SELECT COALESCE(points, 0) FROM user_strikes WHERE chat_id = %(c)s AND user_id = %(u)s),
+          (SELECT COUNT(*) FROM spam_events
+            WHERE chat_id = %(c)s AND user_id = %(u)s AND ts > NOW() - make_interval(days => %(d)s)),
+          (SELECT COUNT(*) FROM ai_mod_logs
+            WHERE chat_id = %(c)s AND user_id = %(u)s AND action NOT IN ('allow', 'shadow', 'error')
+              AND ts > NOW() - make_interval(days => %(d)s));
+    """, {"c": chat_id, "u": user_id, "d": window_days, "cap": msg_cap})
+    joined_at, msgs, strikes, spam, ai_hits = cur.fetchone()
+    return joined_at, int(msgs or 0), int(strikes or 0), int(spam or 0), int(ai_hits or 0)
+
+register_migration(10, "admin_index", ensure_admin_index_schema)
+register_migration(11, "translations_source_hash", translations_source_hash)
+register_migration(12, "moderation_verdicts", ensure_moderation_cache_schema)
+register_migration(13, "moderation_bad_hashes", ensure_bad_hashes_schema)
+register_migration(14, "trust_settings", ensure_trust_schema)
+
 def init_all_schemas():
-    """Initialize all database schemas including ads"""
+    """Initialize all database schemas including ads (über das Migration-Ledger)"""
     logger.info("Initializing all database schemas...")
-    init_db()
-    init_ads_schema()  # Hinzufügen
-    migrate_db()
-    migrate_stats_rollup()
-    ensure_spam_topic_schema()
-    ensure_forum_topics_schema()
-    ensure_ai_moderation_schema()
-    logger.info("✅ All schemas initialized successfully")
+    ran = run_migrations()
+    logger.info(f"✅ All schemas initialized successfully ({ran} neue Migrationen)")
 
 if __name__ == "__main__":
-    init_all_schemas()
+    # als Skript ist dieses Modul __main__: ads/statistic registrieren ihre Migrationen im
+    # importierbaren Modul `database` – also dessen Ledger ausführen, nicht das von __main__
+    import database as _database
+    import statistic, ads  # noqa: F401  (Migrationen 7/8)
+    _database.init_all_schemas()
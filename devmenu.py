@@ -7,7 +7,11 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from ads import register_ads
 from patchnotes import __version__
-from database import get_registered_groups, is_daily_stats_enabled, _db_pool, _with_cursor 
+from database import get_registered_groups, is_daily_stats_enabled, _db_pool, _db_pools, _with_cursor, _with_analytics_cursor, get_pool_stats, get_slow_queries
+import metrics
+import config_cache
+import moderation
+import prefilter
 
 try:
     import psutil
@@ -255,6 +259,7 @@ async def dev_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         kb = [
             [InlineKeyboardButton("🔄 Vacuum", callback_data="dev_db_vacuum")],
             [InlineKeyboardButton("📊 Table Stats", callback_data="dev_db_tables")],
+            [InlineKeyboardButton("⏱ Query-Latenzen", callback_data="dev_db_metrics")],
             [InlineKeyboardButton("🔙 Zurück", callback_data="dev_back_to_menu")]
         ]
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(kb))
@@ -282,13 +287,36 @@ async def dev_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         scope = context.user_data.get('scope', {'type': 'all'})
         chat_id = scope.get('chat_id') if scope.get('type') == 'group' else None
         overview = _get_global_overview(chat_id=chat_id)
+        pstats = get_pool_stats()
+        cstats = config_cache.get_stats()
+        mstats = moderation.get_stats()
+        bstats = moderation.get_batch_stats()
+        fstats = prefilter.get_chat_stats(chat_id)
+        vstats = moderation.get_media_stats()
 
         text = (
             "📊 **System-Statistiken**\n\n"
             f"🔎 Datenquelle: {get_scope_label(context)}\n"
             f"👥 Gruppen gesamt: {len(groups)}\n"
             f"✅ Aktive Gruppen: {active_groups}\n"
-            f"💾 DB-Pool: {_db_pool.closed}/{_db_pool.maxconn}\n"
+            + "".join(
+                f"💾 DB-Pool {name}: {len(p._used)} belegt, {len(p._pool)} frei, max. {p.maxconn}"
+                f" · Warteschlange: {p.queue_depth()}\n"
+                for name, p in _db_pools.items()
+            ) +
+            f"♻️ Verbindungen: {pstats['recycled']} recycelt, {pstats['broken']} defekt, {pstats['replaced']} ersetzt, {pstats['shrunk']} abgebaut\n"
+            f"⏳ Gewartet: {pstats['queued']}× · Timeouts: {pstats['timeouts']}\n"
+            f"🗃 Config-Cache: {cstats['chats']} Chats, {cstats['hits']} Treffer / {cstats['misses']} Misses"
+            f" · extern invalidiert: {cstats['remote_invalidations']} · Resyncs: {cstats['resyncs']}\n"
+            f"🛡 Moderations-Cache: {mstats['entries']} Urteile, {mstats['hits']} Treffer"
+            f" (+{mstats['db_hits']} DB) / {mstats['misses']} Misses · gebündelt: {mstats['coalesced']}\n"
+            f"📦 Moderations-Batches: {bstats['batches']} für {bstats['items']} Texte"
+            f" (zuletzt {bstats['last_size']}, max. {bstats['max_size']}) · Fallbacks: {bstats['fallbacks']}\n"
+            f"🧮 Vorfilter: {fstats['skipped_share']:.0%} ohne API ({fstats['safe']} harmlos, {fstats['bad']} eindeutig,"
+            f" {fstats['uncertain']} an die KI)\n"
+            f"🖼 Medien: {vstats['vision_requests']} Vision-Requests für {vstats['vision_images']} Bilder"
+            f" · Beinahe-Duplikate: {vstats['near_duplicates']} · {vstats['bytes_in'] // 1024} → {vstats['bytes_out'] // 1024} KB"
+            f"{'' if vstats['pillow'] else ' (ohne Pillow)'}\n"
             f"⚡ Handler: {len(context.application.handlers)}\n"
             f"🧠 RAM: {psutil.Process().memory_info().rss / 1024 / 1024:.1f} MB\n\n"
             "🗂 **Datenbank (aggregiert)**\n"
@@ -429,6 +457,33 @@ async def dev_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         kb = [[InlineKeyboardButton("🔙 Zurück", callback_data="dev_db_management")]]
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(kb))
     
+    elif data == "dev_db_metrics":
+        # Query-Latenzen (seit Prozessstart) + letzte langsame Aufrufe
+        top = metrics.snapshot("db_query_seconds", "fn", limit=12)
+        errors = {dict(k).get("fn"): int(v) for k, v in metrics.registry.counters("db_errors_total").items()}
+        wait = metrics.snapshot("db_pool_wait_seconds", "site", limit=50)
+        wait_total = sum(w["total_s"] for w in wait)
+        wait_count = sum(w["count"] for w in wait) or 1
+        text = "⏱ **Query-Latenzen** (Gesamtzeit absteigend)\n\n```\n"
+        text += f"{'Funktion':<28}{'n':>7}{'Ø ms':>8}{'p95':>7}{'err':>5}\n"
+        for r in top:
+            text += f"{r['fn'][:27]:<28}{r['count']:>7}{r['avg_ms']:>8.1f}{r['p95_ms']:>7.0f}{errors.get(r['fn'], 0):>5}\n"
+        text += "```\n"
+        text += f"Pool-Wartezeit Ø: {wait_total / wait_count * 1000:.1f} ms\n"
+        for q in sorted(metrics.snapshot("db_pool_queue_wait_seconds", "priority"), key=lambda r: r["priority"]):
+            text += f"Warteschlange {q['priority']}: {q['count']}× · p50 {q['p50_ms']:.0f} ms · p95 {q['p95_ms']:.0f} ms\n"
+        slow = get_slow_queries(5)
+        if slow:
+            text += "\n🐢 **Langsame Aufrufe**\n```\n"
+            for ts, fn, ms, _args, _kw in slow:
+                text += f"{datetime.datetime.fromtimestamp(ts):%H:%M:%S} {fn[:30]} {ms:.0f} ms\n"
+            text += "```"
+        kb = [
+            [InlineKeyboardButton("🔄 Aktualisieren", callback_data="dev_db_metrics")],
+            [InlineKeyboardButton("🔙 Zurück", callback_data="dev_db_management")]
+        ]
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(kb))
+
     elif data == "dev_ad_stats":
         # Werbeanzeigen-Statistiken
         stats = get_ad_stats()
@@ -465,7 +520,7 @@ def _set_dev_aggregate_scope(context: ContextTypes.DEFAULT_TYPE):
         store['selected_group_title'] = 'Alle Gruppen'
         store['chat_id'] = None  # None signalisiert Aggregat
 
-@_with_cursor
+@_with_analytics_cursor
 def _get_global_overview(cur, chat_id: int | None = None):
     """
     Liefert robuste Kennzahlen aus message_logs & adv_impressions.
@@ -477,7 +532,7 @@ def _get_global_overview(cur, chat_id: int | None = None):
                     (() if chat_id is None else (chat_id,)))
         out['messages_total'] = cur.fetchone()[0]
 
-        cur.execute("SELECT COUNT(*) FROM message_logs WHERE ts >= CURRENT_DATE" +
+        cur.execute("SELECT COUNT(*) FROM message_logs WHERE \"timestamp\" >= CURRENT_DATE" +
                     ("" if chat_id is None else " AND chat_id=%s") + ";",
                     (() if chat_id is None else (chat_id,)))
         out['messages_today'] = cur.fetchone()[0]
@@ -530,7 +585,7 @@ def get_recent_logs(lines=20):
     except Exception as e:
         return f"Fehler beim Lesen der Logs: {e}"
 
-@_with_cursor
+@_with_analytics_cursor
 def get_db_stats(cur):
     """Datenbankstatistiken holen"""
     # Anzahl der Tabellen
@@ -551,7 +606,7 @@ def get_db_stats(cur):
         "connections": connections
     }
 
-@_with_cursor
+@_with_analytics_cursor
 def get_table_stats(cur):
     """Statistiken zu Tabellen holen"""
     cur.execute("""
@@ -573,7 +628,7 @@ def vacuum_database(cur):
     cur.execute("VACUUM ANALYZE;")
     return "VACUUM ANALYZE ausgeführt."
 
-@_with_cursor
+@_with_analytics_cursor
 def get_ad_stats(cur):
     """Werbestatistiken holen"""
     # Anzahl Kampagnen
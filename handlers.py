@@ -5,49 +5,37 @@ import logging
 import random
 import time, telegram
 from collections import deque
-from urllib.parse import urlparse
 from datetime import date, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, MessageEntity, ForceReply, ChatPermissions
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, ChatMemberHandler, CallbackQueryHandler
 from telegram.error import BadRequest, Forbidden
 from telegram.constants import ChatType
-from database import (register_group, get_registered_groups, get_rules, set_welcome, set_rules, set_farewell, add_member, get_link_settings, 
+from database import (with_db_priority, PRIO_REALTIME, register_group, get_registered_groups, get_rules, set_welcome, set_rules, set_farewell, add_member, get_link_settings, 
 remove_member, inc_message_count, assign_topic, remove_topic, has_topic, set_mood_question, get_farewell, get_welcome, get_captcha_settings,
 get_night_mode, set_night_mode, get_group_language, get_link_settings, has_topic, set_spam_policy_topic, get_spam_policy_topic,
 add_topic_router_rule, list_topic_router_rules, delete_topic_router_rule, get_effective_link_policy,
 toggle_topic_router_rule, get_matching_router_rule, upsert_forum_topic, rename_forum_topic, find_faq_answer, log_auto_response, get_ai_settings,
-effective_spam_policy, get_link_settings, has_topic, count_topic_user_messages_today, set_spam_policy_topic, 
-effective_ai_mod_policy, log_ai_mod_action, count_ai_hits_today, set_ai_mod_settings, add_strike_points, get_strike_points, top_strike_users, decay_strikes
+effective_spam_policy, get_effective_spam_policy, get_link_settings, has_topic, count_topic_user_messages_today, set_spam_policy_topic, 
+effective_ai_mod_policy, log_ai_mod_action, count_ai_hits_today, set_ai_mod_settings, add_strike_points, get_strike_points, top_strike_users, decay_strikes,
+get_trust_settings, set_trust_settings, _call_db
 )
 from zoneinfo import ZoneInfo
 from patchnotes import __version__, PATCH_NOTES
-from utils import clean_delete_accounts_for_chat, ai_summarize, ai_available, ai_moderate_text, ai_moderate_image, _extract_domains_from_text, heuristic_link_risk
+from utils import clean_delete_accounts_for_chat, ai_summarize, ai_available, heuristic_link_risk
 from user_manual import help_handler
 from menu import show_group_menu, menu_free_text_handler
 from statistic import log_spam_event, log_night_event
-from access import get_visible_groups, resolve_privileged_flags
-from translator import translate_hybrid
+from access import get_visible_groups, is_privileged
+from message_context import get_message_context
+from translator import translate_hybrid_async
+from moderation import moderate_text, moderate_media, pick_media
+from prefilter import (PREFILTER_ENABLED, SAFE as PREFILTER_SAFE, BAD as PREFILTER_BAD, UNCERTAIN as PREFILTER_UNCERTAIN,
+                       classify as prefilter_classify, record as prefilter_record, remember_bad as prefilter_remember_bad,
+                       refresh_bad_hashes)
+import trust
 
 logger = logging.getLogger(__name__)
 
-_EMOJI_RE = re.compile(r'([\U0001F300-\U0001FAFF\U00002600-\U000027BF])')
-_URL_RE = re.compile(r'(https?://\S+|www\.\S+)', re.IGNORECASE)
-
-def _extract_domains(text:str) -> list[str]:
-    doms = []
-    for m in _URL_RE.findall(text or ""):
-        u = m if m.startswith("http") else f"http://{m}"
-        try:
-            dom = urlparse(u).netloc.lower()
-            if dom.startswith("www."): dom = dom[4:]
-            if dom: doms.append(dom)
-        except Exception:
-            pass
-    return doms
-
-def _count_emojis(text:str) -> int:
-    return len(_EMOJI_RE.findall(text or ""))
-
 def _bump_rate(context, chat_id:int, user_id:int):
     key = ("rl", chat_id, user_id)
     now = time.time()
@@ -57,8 +45,9 @@ def _bump_rate(context, chat_id:int, user_id:int):
     context.chat_data[key] = q
     return len(q)  # messages in last 10s
 
-def tr(text: str, lang: str) -> str:
-    return translate_hybrid(text, target_lang=lang)
+async def tr_async(text: str, lang: str) -> str:
+    # für Handler: ein Cache-Miss blockiert den Event-Loop nicht
+    return await translate_hybrid_async(text, target_lang=lang)
 
 async def _resolve_username_to_user(context, chat_id: int, username: str):
     """
@@ -133,11 +122,10 @@ def _parse_hhmm(txt: str) -> int | None:
         return hh*60 + mm
     return None
 
-def _already_seen(context, chat_id: int, message_id: int) -> bool:
+def _already_seen(context, key: tuple) -> bool:
     dq = context.chat_data.get("mod_seen")
     if dq is None:
         dq = context.chat_data["mod_seen"] = deque(maxlen=1000)
-    key = (chat_id, message_id)
     if key in dq:
         return True
     dq.append(key)
@@ -185,50 +173,49 @@ async def _hard_delete_message(context, chat_id: int, msg) -> bool:
         logger.exception(f"Unexpected delete error in {chat_id}: {e}")
         return False
 
+@with_db_priority(PRIO_REALTIME)
 async def spam_enforcer(update, context):
     msg = update.effective_message
     if not msg: return
-    chat_id = msg.chat.id
-    if _already_seen(context, chat_id, msg.message_id):
+    mc = await get_message_context(update, context)
+    if _already_seen(context, mc.dedupe_key):
         return
-    chat = update.effective_chat
     user = update.effective_user
-    chat_id = chat.id
-    text = msg.text or msg.caption or ""
-    topic_id = getattr(msg, "message_thread_id", None)
+    chat_id = mc.chat_id
+    text = mc.text
+    topic_id = mc.topic_id
+    user_id = mc.user_id
+    is_admin = mc.is_admin
 
     # Ausnahme: Admin / anonymer Admin / Topic-Owner
-
-    is_owner, is_admin, is_anon_admin, is_topic_owner, chat_id, user_id = \
-        await resolve_privileged_flags(msg, context)
-
-    privileged = is_owner or is_admin or is_anon_admin or is_topic_owner
+    privileged = mc.privileged
     if privileged:
         return  # Admins/Owner/Anonyme überspringen
+    trust.note_message(chat_id, user_id)
 
-    policy = get_effective_link_policy(chat_id, topic_id)
-    domains_in_msg = _extract_domains(text)
+    policy = await mc.link_policy()
+    domains_in_msg = mc.domains
     violation = False
     reason = None
 
     if domains_in_msg:
         # 1) Blacklist (Topic)
         for host in domains_in_msg:
-            if any(host.endswith('.'+d) or host == d for d in (policy.get("blacklist") or [])):
+            if policy.is_blacklisted(host):
                  violation = True; reason = "domain_blacklist"
                  break
 
         # 2) Nur-Admin-Links (global), Whitelist erlaubt
-        if not violation and policy.get("admins_only") and not is_admin:
-            def allowed(host):
-                return any(host.endswith('.'+d) or host == d for d in (policy.get("whitelist") or []))
-            if not any(allowed(h) for h in domains_in_msg):
+        if not violation and policy.admins_only and not is_admin:
+            if not any(policy.is_whitelisted(h) for h in domains_in_msg):
                 violation = True
 
     if violation:
+        mc.enforced = True
+        trust.flag(chat_id, user_id)
         deleted = await _safe_delete(msg)
         # Aktion
-        act = policy.get("action") or "delete"
+        act = policy.action
         did = "delete" if deleted else "none"
         if act == "mute" and not is_admin:
             try:
@@ -248,14 +235,14 @@ async def spam_enforcer(update, context):
                 await context.bot.send_message(
                     chat_id=chat_id,
                     message_thread_id=msg.message_thread_id,
-                    text=policy.get("warning_text") or "🚫 Nur Admins dürfen Links posten."
+                    text=policy.warning_text
                 )
             except Exception:
                 pass
 
         # Logging mit reason
         try:
-            log_spam_event(chat_id, user.id if user else None, reason or "link_violation", did,
+            await _call_db(log_spam_event, chat_id, user.id if user else None, reason or "link_violation", did,
                            {"domains": domains_in_msg})
         except Exception:
             pass
@@ -263,22 +250,22 @@ async def spam_enforcer(update, context):
     
     # --- Tageslimit (pro Topic & User) --- 
     # separat die *Spam*-Policy laden (inkl. Topic-Overrides)
-    link_flags = get_link_settings(chat_id)  # 4-Tuple aus DB
-    spam_pol   = effective_spam_policy(chat_id, topic_id, link_flags)
+    spam_pol    = await mc.spam_policy()
 
-    daily_lim   = int(spam_pol.get("per_user_daily_limit") or 0)
-    notify_mode = (spam_pol.get("quota_notify") or "smart").lower()
+    daily_lim   = spam_pol.per_user_daily_limit
+    notify_mode = spam_pol.quota_notify
 
     if topic_id and daily_lim > 0 and user and not privileged:
         # Zähle Nachrichten bis JETZT (vor dieser Nachricht)
-        used_before = count_topic_user_messages_today(chat_id, topic_id, user.id, tz="Europe/Berlin")
+        used_before = await _call_db(count_topic_user_messages_today, chat_id, topic_id, user.id, tz="Europe/Berlin")
 
         # Überschreitet diese Nachricht das Limit?
         if used_before >= daily_lim:
+            mc.enforced = True
             deleted = await _hard_delete_message(context, chat_id, msg)
 
             did_action = "delete" if deleted else "none"
-            primary = (spam_pol.get("action_primary") or "delete").lower()
+            primary = spam_pol.action_primary
 
             # Optional zusätzlich stumm schalten, wenn so konfiguriert
             if primary in ("mute", "stumm"):
@@ -304,8 +291,8 @@ async def spam_enforcer(update, context):
             # Logging (best effort)
             try:
                 from statistic import log_spam_event
-                log_spam_event(
-                    chat_id, user.id, "limit_day", did_action,
+                await _call_db(
+                    log_spam_event, chat_id, user.id, "limit_day", did_action,
                     {"limit": daily_lim, "used_before": used_before, "topic_id": topic_id}
                 )
             except Exception:
@@ -327,7 +314,7 @@ async def spam_enforcer(update, context):
                 pass
     
     # 1) Topic-Router (nur wenn nicht bereits im Ziel-Topic)
-    match = get_matching_router_rule(chat_id, text, domains_in_msg)
+    match = await _call_db(get_matching_router_rule, chat_id, text, domains_in_msg)
     if match and topic_id != match["target_topic_id"]:
         try:
             # Kopieren in Ziel-Topic
@@ -338,6 +325,7 @@ async def spam_enforcer(update, context):
                 message_thread_id=match["target_topic_id"]
             )
             if match["delete_original"] and not privileged:
+                mc.enforced = True
                 await msg.delete()
             if match["warn_user"] and not privileged:
                 await context.bot.send_message(
@@ -352,185 +340,203 @@ async def spam_enforcer(update, context):
 
     # 2) Link-Blocking (nur Policy-basiert)
     if domains_in_msg and not privileged:
-        wl = set(d.lower() for d in (policy.get("whitelist") or []))
-        bl = set(d.lower() for d in (policy.get("blacklist") or []))
-        if any(d in bl for d in domains_in_msg):
+        if any(policy.is_blacklisted(d) for d in domains_in_msg):
+            mc.enforced = True
             try:
                 await msg.delete()
-                log_spam_event(chat_id, user.id if user else None, "link_blacklist", "delete",
+                await _call_db(log_spam_event, chat_id, user.id if user else None, "link_blacklist", "delete",
                                {"domains": domains_in_msg})
             except Exception:
                 pass
             return
-        if policy.get("admins_only") and not is_admin:
-            if not any((d in wl) for d in domains_in_msg):
+        if policy.admins_only and not is_admin:
+            if not any(policy.is_whitelisted(d) for d in domains_in_msg):
+                mc.enforced = True
                 try:
                     await msg.delete()
-                    log_spam_event(chat_id, user.id if user else None, "link_admins_only", "delete",
+                    await _call_db(log_spam_event, chat_id, user.id if user else None, "link_admins_only", "delete",
                                    {"domains": domains_in_msg})
                 except Exception:
                     pass
                 return
 
-    # 3) Emoji- und Flood-Limits (je nach Level/Override)
-    if not privileged:
-        em_lim = policy.get("emoji_max_per_msg") or 0
+    # 3) Emoji- und Flood-Limits (je nach Level/Override) – entfallen für vertraute Mitglieder
+    em_lim = spam_pol.emoji_max_per_msg or 0
+    flood_lim = spam_pol.max_msgs_per_10s or 0
+    # Vertrauensstufe nur nachschlagen, wenn überhaupt ein Limit greift
+    if not privileged and (em_lim > 0 or flood_lim > 0) and await trust.get_tier(chat_id, user_id) != trust.TRUSTED:
         if em_lim > 0:
-            emc = _count_emojis(text)
+            emc = mc.emoji_count
             if emc > em_lim:
+                mc.enforced = True
                 try:
                     await msg.delete()
-                    log_spam_event(chat_id, user.id if user else None, "emoji_per_msg", "delete",
+                    await _call_db(log_spam_event, chat_id, user.id if user else None, "emoji_per_msg", "delete",
                                    {"count": emc, "limit": em_lim})
                 except Exception: pass
+                trust.flag(chat_id, user_id)
                 return
 
-        flood_lim = policy.get("max_msgs_per_10s") or 0
         if flood_lim > 0:
             n = _bump_rate(context, chat_id, user.id if user else 0)
             if n > flood_lim:
+                mc.enforced = True
                 try:
                     await msg.delete()
-                    log_spam_event(chat_id, user.id if user else None, "flood_10s", "delete",
+                    await _call_db(log_spam_event, chat_id, user.id if user else None, "flood_10s", "delete",
                                    {"count_10s": n, "limit": flood_lim})
                 except Exception: pass
+                trust.flag(chat_id, user_id)
                 return
 
+@with_db_priority(PRIO_REALTIME)
 async def ai_moderation_enforcer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg  = update.effective_message
     chat = update.effective_chat
     user = update.effective_user
     if not msg or not chat or chat.type not in ("group","supergroup"): return
-    text = msg.text or msg.caption or ""
-    if not text:  # (optional) Medien/OCR könntest du später ergänzen
+    mc = await get_message_context(update, context)
+    if mc.enforced:
+        return  # schon vom Spamfilter (Gruppe 2) gelöscht oder verschoben
+    text = mc.text
+    # kleinste brauchbare Auflösung bzw. Thumbnail (animierte/Video-Sticker, GIFs, Videos);
+    # Sticker, GIFs und Medien ohne Caption haben keinen Text, laufen aber durch die Bildprüfung
+    media_kind, media = pick_media(msg)
+    if not text and not media:
         return
 
-    topic_id = getattr(msg, "message_thread_id", None)
-    policy = effective_ai_mod_policy(chat.id, topic_id)
+    topic_id = mc.topic_id
+    policy = await mc.ai_policy()
 
-    if not policy.get("enabled"):
+    if not policy.enabled:
         return
 
-    # Privilegien
-    admins = await context.bot.get_chat_administrators(chat.id)
-    is_admin = any(a.user.id == (user.id if user else 0) for a in admins)
-    is_topic_owner = False  # falls du Topic-Owner-Check hast: hier einsetzen
-    if (is_admin and policy.get("exempt_admins", True)) or (is_topic_owner and policy.get("exempt_topic_owner", True)):
+    # Privilegien (aus dem Nachrichtenkontext, ohne eigenen Admin-Check)
+    is_admin = mc.is_owner or mc.is_admin
+    if (is_admin and policy.exempt_admins) or (mc.is_topic_owner and policy.exempt_topic_owner):
         return
 
+    # Vertrauensstufe: vertraute Mitglieder nur stichprobenartig, geflaggte immer voll
+    full_check, tier = await trust.should_moderate(chat.id, user.id if user else None)
+    if not full_check:
+        return
+
+    media_scores = None
+
+    # Domains & Link-Risiko
+    domains = mc.domains
+    link_score = heuristic_link_risk(domains)
+
+    # Lokaler Vorfilter: eindeutig harmlos/schlecht → kein API-Aufruf für den Text
+    verdict = None
+    if PREFILTER_ENABLED and text:
+        await refresh_bad_hashes()
+        verdict = prefilter_classify(text, policy.lang or "de", domains, link_score)
+        prefilter_record(chat.id, verdict.decision)
+        if verdict.decision == PREFILTER_SAFE and not media and tier != trust.FLAGGED:
+            return
+
     # Rate-Limit / Cooldown
-    if not _aimod_acquire(context, chat.id, int(policy.get("max_calls_per_min", 20))):
+    if not _aimod_acquire(context, chat.id, policy.max_calls_per_min):
         return
     # optionale Cooldown pro Chat: einfache Sperre (letzte Aktion)
     cd_key = ("aimod_cooldown", chat.id)
     last_t = context.bot_data.get(cd_key)
-    if last_t and time.time() - last_t < int(policy.get("cooldown_s", 30)):
+    if last_t and time.time() - last_t < policy.cooldown_s:
         return
 
-    # Domains & Link-Risiko
-    domains = _extract_domains_from_text(text)
-    link_score = heuristic_link_risk(domains)
-
     # Moderation (AI)
     scores = {"toxicity":0,"hate":0,"sexual":0,"harassment":0,"selfharm":0,"violence":0}
     flagged = False
-    
-    media_scores = None
-    media_kind = None
-    file_id = None
 
-    if msg.photo:
-        media_kind = "photo"
-        file_id = msg.photo[-1].file_id
-    elif msg.sticker:
-        media_kind = "sticker"
-        file_id = msg.sticker.file_id
-    elif msg.animation:  # GIF
-        if getattr(msg.animation, "thumbnail", None):
-            media_kind = "animation_thumb"
-            file_id = msg.animation.thumbnail.file_id
-    elif msg.video:
-        if getattr(msg.video, "thumbnail", None):
-            media_kind = "video_thumb"
-            file_id = msg.video.thumbnail.file_id
-
-    if file_id and ai_available():
+    # Urteile kommen aus dem Inhalts-Cache (moderation.py), die API nur bei einem Miss
+    if media and ai_available():
         try:
-            f = await context.bot.get_file(file_id)
-            img_url = f.file_path  # Telegram CDN URL
-            media_scores = await ai_moderate_image(img_url) or {}
+            media_scores = await moderate_media(context.bot, media) or {}
         except Exception:
             media_scores = None
-    
-    if ai_available():
-        res = await ai_moderate_text(text, model=policy.get("model","omni-moderation-latest"))
+
+    if verdict is not None and verdict.decision == PREFILTER_BAD:
+        if verdict.category == "link_risk":
+            link_score = max(link_score, verdict.score)
+        else:
+            scores[verdict.category] = max(scores.get(verdict.category, 0), verdict.score)
+        flagged = True
+    elif text and (verdict is None or verdict.decision == PREFILTER_UNCERTAIN or tier == trust.FLAGGED) and ai_available():
+        res = await moderate_text(text, model=policy.model or "omni-moderation-latest")
         if res:
             scores.update(res.get("categories") or {})
             flagged = bool(res.get("flagged"))
+            if flagged and PREFILTER_ENABLED:
+                # vom Modell geflaggt → Wiederholungen erkennt der Vorfilter ohne API
+                top = max(scores, key=lambda k: scores[k])
+                await prefilter_remember_bad(text, top, float(scores[top]))
 
     # Entscheidung
     violations = []
-    if scores["toxicity"]   >= policy["tox_thresh"]:     violations.append(("toxicity", scores["toxicity"]))
-    if scores["hate"]       >= policy["hate_thresh"]:    violations.append(("hate", scores["hate"]))
-    if scores["sexual"]     >= policy["sex_thresh"]:     violations.append(("sexual", scores["sexual"]))
-    if scores["harassment"] >= policy["harass_thresh"]:  violations.append(("harassment", scores["harassment"]))
-    if scores["selfharm"]   >= policy["selfharm_thresh"]:violations.append(("selfharm", scores["selfharm"]))
-    if scores["violence"]   >= policy["violence_thresh"]:violations.append(("violence", scores["violence"]))
-    if link_score           >= policy["link_risk_thresh"]: violations.append(("link_risk", link_score))
+    if scores["toxicity"]   >= policy.tox_thresh:      violations.append(("toxicity", scores["toxicity"]))
+    if scores["hate"]       >= policy.hate_thresh:     violations.append(("hate", scores["hate"]))
+    if scores["sexual"]     >= policy.sex_thresh:      violations.append(("sexual", scores["sexual"]))
+    if scores["harassment"] >= policy.harass_thresh:   violations.append(("harassment", scores["harassment"]))
+    if scores["selfharm"]   >= policy.selfharm_thresh: violations.append(("selfharm", scores["selfharm"]))
+    if scores["violence"]   >= policy.violence_thresh: violations.append(("violence", scores["violence"]))
+    if link_score           >= policy.link_risk_thresh: violations.append(("link_risk", link_score))
     if media_scores:
-        if media_scores.get("nudity",0) >= policy["visual_nudity_thresh"]:
+        if media_scores.get("nudity",0) >= policy.visual_nudity_thresh:
             violations.append(("nudity", float(media_scores["nudity"])))
-        if policy.get("block_sexual_minors", True) and media_scores.get("sexual_minors",0) >= 0.01:
+        if policy.block_sexual_minors and media_scores.get("sexual_minors",0) >= 0.01:
             violations.append(("sexual_minors", float(media_scores["sexual_minors"])))
-        if media_scores.get("violence",0) >= policy["visual_violence_thresh"]:
+        if media_scores.get("violence",0) >= policy.visual_violence_thresh:
             violations.append(("violence_visual", float(media_scores["violence"])))
-        if media_scores.get("weapons",0) >= policy["visual_weapons_thresh"]:
+        if media_scores.get("weapons",0) >= policy.visual_weapons_thresh:
             violations.append(("weapons", float(media_scores["weapons"])))
-        if media_scores.get("gore",0) >= policy["visual_violence_thresh"]:
+        if media_scores.get("gore",0) >= policy.visual_violence_thresh:
             violations.append(("gore", float(media_scores["gore"])))
+    if violations:
+        trust.flag(chat.id, user.id if user else None)
     if not violations:
-        if policy.get("shadow_mode"):
-            log_ai_mod_action(chat.id, topic_id, user.id if user else None, msg.message_id,
+        if policy.shadow_mode:
+            await _call_db(log_ai_mod_action, chat.id, topic_id, user.id if user else None, msg.message_id,
                               "ok", 0.0, "allow",
                               {"text_scores":scores, "media_scores":media_scores, "link_score":link_score})
         return
 
-    if policy.get("shadow_mode"):
-        log_ai_mod_action(chat.id, topic_id, user.id if user else None, msg.message_id,
+    if policy.shadow_mode:
+        await _call_db(log_ai_mod_action, chat.id, topic_id, user.id if user else None, msg.message_id,
                           violations[0][0], float(violations[0][1]), "shadow",
                           {"text_scores":scores, "media_scores":media_scores, "domains":domains, "link_score":link_score})
         return
 
     # Primäraktion + Eskalation (heutige Treffer)
-    action = policy.get("action_primary","delete")
-    hits_today = count_ai_hits_today(chat.id, user.id if user else 0)
-    if hits_today + 1 >= int(policy.get("escalate_after",3)):
-        action = policy.get("escalate_action","mute")
+    action = policy.action_primary
+    hits_today = await _call_db(count_ai_hits_today, chat.id, user.id if user else 0)
+    if hits_today + 1 >= policy.escalate_after:
+        action = policy.escalate_action
 
     # STRIKES: Punkte vergeben (Schwere je Kategorie)
     severity = {
         "toxicity":1,"hate":2,"sexual":2,"harassment":1,"selfharm":2,"violence":2,"link_risk":1,
         "nudity":2,"sexual_minors":5,"violence_visual":2,"weapons":2,"gore":3
     }
-    strike_points = max(1, int(policy.get("strike_points_per_hit",1)))
+    strike_points = max(1, policy.strike_points_per_hit)
     main_cat = violations[0][0]
     multi = severity.get(main_cat, 1)
     total_points = strike_points * multi
     try:
         if user:
-            add_strike_points(chat.id, user.id, total_points, reason=main_cat)
+            await _call_db(add_strike_points, chat.id, user.id, total_points, reason=main_cat)
     except Exception:
         pass
 
     # Strike-Eskalation (persistente Punkte)
-    strikes = get_strike_points(chat.id, user.id if user else 0)
-    if strikes >= int(policy.get("strike_ban_threshold",5)):
+    strikes = await _call_db(get_strike_points, chat.id, user.id if user else 0)
+    if strikes >= policy.strike_ban_threshold:
         action = "ban"
-    elif strikes >= int(policy.get("strike_mute_threshold",3)) and action != "ban":
+    elif strikes >= policy.strike_mute_threshold and action != "ban":
         action = "mute"
 
-    warn_text = policy.get("warn_text") or "⚠️ Inhalt entfernt (KI-Moderation)."
-    appeal_url = policy.get("appeal_url")
+    warn_text = policy.warn_text or "⚠️ Inhalt entfernt (KI-Moderation)."
+    appeal_url = policy.appeal_url
 
     try:
         # Delete (falls sinnvoll für alle Aktionsarten)
@@ -548,18 +554,18 @@ async def ai_moderation_enforcer(update: Update, context: ContextTypes.DEFAULT_T
                 if action == "ban":
                     await context.bot.ban_chat_member(chat.id, user.id)
                 else:
-                    until = datetime.utcnow() + timedelta(minutes=int(policy.get("mute_minutes",60)))
+                    until = datetime.utcnow() + timedelta(minutes=policy.mute_minutes)
                     perms = telegram.ChatPermissions(can_send_messages=False)
                     await context.bot.restrict_chat_member(chat.id, user.id, permissions=perms, until_date=until)
             except Exception:
                 pass
 
         context.bot_data[("aimod_cooldown", chat.id)] = time.time()
-        log_ai_mod_action(chat.id, topic_id, user.id if user else None, msg.message_id,
+        await _call_db(log_ai_mod_action, chat.id, topic_id, user.id if user else None, msg.message_id,
                           main_cat, float(violations[0][1]), action,
                           {"text_scores":scores, "media_scores":media_scores, "domains":domains, "link_score":link_score, "strikes":strikes, "added_points":total_points})
     except Exception as e:
-        log_ai_mod_action(chat.id, topic_id, user.id if user else None, msg.message_id, "error", 0.0, "error", {"err":str(e)})
+        await _call_db(log_ai_mod_action, chat.id, topic_id, user.id if user else None, msg.message_id, "error", 0.0, "error", {"err":str(e)})
 
 async def mystrikes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat; user = update.effective_user
@@ -590,21 +596,21 @@ async def faq_autoresponder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     t0 = time.time()
-    hit = find_faq_answer(chat.id, text)
+    hit = await _call_db(find_faq_answer, chat.id, text)
     if hit:
         trig, ans = hit
         await msg.reply_text(ans, parse_mode="HTML")
         dt = int((time.time()-t0)*1000)
-        log_auto_response(chat.id, trig, 1.0, ans[:200], dt, None)
+        await _call_db(log_auto_response, chat.id, trig, 1.0, ans[:200], dt, None)
         return
 
     # optionaler KI-Fallback
-    ai_faq, _ = get_ai_settings(chat.id)
+    ai_faq, _ = await _call_db(get_ai_settings, chat.id)
     if not ai_faq:
         return
 
     # sehr knapp, mit gruppenspezifischen Infos
-    lang = get_group_language(chat.id) or "de"
+    lang = (await _call_db(get_group_language, chat.id)) or "de"
     context_info = (
         "Nützliche Infos: Website https://greeny187.github.io/GreenyManagementBots/ • "
         "Support: https://t.me/+DkUfIvjyej8zNGVi • "
@@ -621,7 +627,7 @@ async def faq_autoresponder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if answer:
         await msg.reply_text(answer, parse_mode="HTML")
         dt = int((time.time()-t0)*1000)
-        log_auto_response(chat.id, "AI", 0.5, answer[:200], dt, None)
+        await _call_db(log_auto_response, chat.id, "AI", 0.5, answer[:200], dt, None)
 
 async def nightmode_time_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     flag = context.user_data.get('awaiting_nm_time')
@@ -632,13 +638,13 @@ async def nightmode_time_input(update: Update, context: ContextTypes.DEFAULT_TYP
     txt = (update.effective_message.text or "").strip()
     val = _parse_hhmm(txt)
     if val is None:
-        return await update.effective_message.reply_text(tr("⚠️ Bitte im Format HH:MM senden, z. B. 22:00.", lang))
+        return await update.effective_message.reply_text(await tr_async("⚠️ Bitte im Format HH:MM senden, z. B. 22:00.", lang))
     if kind == 'start':
         set_night_mode(cid, start_minute=val)
-        await update.effective_message.reply_text(tr("✅ Startzeit gespeichert:", lang) + f" {txt}")
+        await update.effective_message.reply_text(await tr_async("✅ Startzeit gespeichert:", lang) + f" {txt}")
     else:
         set_night_mode(cid, end_minute=val)
-        await update.effective_message.reply_text(tr("✅ Endzeit gespeichert:", lang) + f" {txt}")
+        await update.effective_message.reply_text(await tr_async("✅ Endzeit gespeichert:", lang) + f" {txt}")
     context.user_data.pop('awaiting_nm_time', None)
 
 def _parse_duration(s: str) -> datetime.timedelta | None:
@@ -656,20 +662,16 @@ async def quietnow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat  # Add this line to define chat
     lang = get_group_language(chat.id) or 'de'
     if chat.type not in ("group","supergroup"):
-        return await update.message.reply_text(tr("Bitte im Gruppenchat verwenden.", lang))
+        return await update.message.reply_text(await tr_async("Bitte im Gruppenchat verwenden.", lang))
 
     # Admin-Gate
-    try:
-        admins = await context.bot.get_chat_administrators(chat.id)
-        if update.effective_user.id not in {a.user.id for a in admins}:
-            return await update.message.reply_text(tr("Nur Admins dürfen die Ruhephase starten.", lang))
-    except Exception:
-        pass
+    if not await is_privileged(chat, update.effective_user):
+        return await update.message.reply_text(await tr_async("Nur Admins dürfen die Ruhephase starten.", lang))
 
     args = context.args or []
     dur = _parse_duration(args[0]) if args else datetime.timedelta(hours=8)
     if not dur:
-        return await update.message.reply_text(tr("Format: /quietnow 30m oder /quietnow 2h", lang))
+        return await update.message.reply_text(await tr_async("Format: /quietnow 30m oder /quietnow 2h", lang))
 
     en, s, e, del_non_admin, warn_once, tz, hard_mode, _ = get_night_mode(chat.id)
     now = datetime.datetime.now(ZoneInfo(tz))
@@ -686,7 +688,39 @@ async def quietnow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.chat_data.setdefault("nm_flags", {})["hard_applied"] = True
 
     human = until.strftime("%H:%M")
-    await update.message.reply_text(tr("🌙 Sofortige Ruhephase aktiv bis", lang) + f" {human} ({tz}).")
+    await update.message.reply_text(await tr_async("🌙 Sofortige Ruhephase aktiv bis", lang) + f" {human} ({tz}).")
+
+async def trust_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/trust [on|off] [days=N] [msgs=N] [sample=0.1] – Vertrauensstufen je Chat einstellen."""
+    chat = update.effective_chat
+    lang = (await _call_db(get_group_language, chat.id)) or 'de'
+    if not await is_privileged(chat, update.effective_user):
+        return await update.message.reply_text(await tr_async("Nur Admins dürfen das einstellen.", lang))
+
+    enabled, min_days, min_msgs, sample = await _call_db(get_trust_settings, chat.id)
+    try:
+        for arg in context.args or []:
+            key, _, val = arg.partition("=")
+            key = key.lower()
+            if key in ("on", "off"):
+                enabled = key == "on"
+            elif key == "days":
+                min_days = max(0, int(val))
+            elif key == "msgs":
+                min_msgs = max(0, int(val))
+            elif key == "sample":
+                sample = min(1.0, max(0.0, float(val)))
+            else:
+                raise ValueError(arg)
+    except ValueError:
+        return await update.message.reply_text(await tr_async("Format: /trust on|off days=30 msgs=50 sample=0.1", lang))
+
+    if context.args:
+        await _call_db(set_trust_settings, chat.id, enabled, min_days, min_msgs, sample)
+    state = await tr_async("an" if enabled else "aus", lang)
+    await update.message.reply_text(
+        await tr_async("🤝 Vertrauensstufen:", lang) + f" {state} · days={min_days} · msgs={min_msgs} · sample={sample:.0%}"
+    )
 
 async def error_handler(update, context):
     """Fängt alle nicht abgefangenen Errors auf, loggt und benachrichtigt Telegram-Dev-Chat."""
@@ -710,8 +744,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "✅ Gruppe registriert! Geh privat auf /menu.")
 
     if chat.type == "private":
-        all_groups = get_registered_groups()
-        visible_groups = await get_visible_groups(user.id, context.bot, all_groups)
+        visible_groups = await get_visible_groups(user.id, context.bot)
 
         if not visible_groups:
             return await update.message.reply_text(
@@ -724,12 +757,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🔧 Wähle eine Gruppe:", reply_markup=markup)
 
 async def menu_command(update, context):
-    from database import get_registered_groups
-    from access import get_visible_groups
-
     user = update.effective_user
-    all_groups = get_registered_groups()
-    visible_groups = await get_visible_groups(user.id, context.bot, all_groups)
+    visible_groups = await get_visible_groups(user.id, context.bot)
 
     if not visible_groups:
         return await update.message.reply_text(
@@ -758,16 +787,16 @@ async def forum_topic_registry_tracker(update: Update, context: ContextTypes.DEF
     tid = getattr(msg, "message_thread_id", None)
     if tid:
         # normaler Beitrag in einem Topic -> last_seen updaten
-        upsert_forum_topic(chat.id, tid, None)
+        await _call_db(upsert_forum_topic, chat.id, tid, None)
 
     # Topic erstellt/editiert? (Service-Messages)
     ftc = getattr(msg, "forum_topic_created", None)
     if ftc and tid:
-        upsert_forum_topic(chat.id, tid, getattr(ftc, "name", None) or None)
+        await _call_db(upsert_forum_topic, chat.id, tid, getattr(ftc, "name", None) or None)
 
     fte = getattr(msg, "forum_topic_edited", None)
     if fte and tid and getattr(fte, "name", None):
-        rename_forum_topic(chat.id, tid, fte.name)
+        await _call_db(rename_forum_topic, chat.id, tid, fte.name)
 
 async def version(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"Version {__version__}\n\nPatchnotes:\n{PATCH_NOTES}")
@@ -776,10 +805,10 @@ async def message_logger(update, context):
     logger.info(f"💬 message_logger aufgerufen in Chat {update.effective_chat.id}")
     msg = update.effective_message
     if msg.chat.type in ("group", "supergroup") and msg.from_user:
-        inc_message_count(msg.chat.id, msg.from_user.id, date.today())
+        await _call_db(inc_message_count, msg.chat.id, msg.from_user.id, date.today())
         # neu: stelle sicher, dass jeder Schreiber in die members-Tabelle kommt
         try:
-            add_member(msg.chat.id, msg.from_user.id)
+            await _call_db(add_member, msg.chat.id, msg.from_user.id)
             logger.info(f"➕ add_member via message_logger: chat={msg.chat.id}, user={msg.from_user.id}")
         except Exception as e:
             logger.info(f"Fehler add_member in message_logger: {e}", exc_info=True)
@@ -890,9 +919,8 @@ async def myquota_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await msg.reply_text("Bitte im gewünschten Topic ausführen (Thread öffnen) oder: /myquota <topic_id>")
 
     # Policy ermitteln (inkl. Topic-Override)
-    link_settings = get_link_settings(chat.id)
-    policy = effective_spam_policy(chat.id, tid, link_settings)
-    daily_lim = int(policy.get("per_user_daily_limit") or 0)
+    policy = get_effective_spam_policy(chat.id, tid)
+    daily_lim = policy.per_user_daily_limit
     if daily_lim <= 0:
         return await msg.reply_text("Für dieses Topic ist kein Tageslimit gesetzt.")
 
@@ -908,17 +936,19 @@ async def mood_question_handler(update: Update, context: ContextTypes.DEFAULT_TY
         new_question = message.text
         set_mood_question(grp, new_question)
         context.user_data.pop('awaiting_mood_question', None)
-        await message.reply_text(tr('✅ Neue Mood-Frage gespeichert.', get_group_language(grp)))
+        await message.reply_text(await tr_async('✅ Neue Mood-Frage gespeichert.', get_group_language(grp)))
 
+@with_db_priority(PRIO_REALTIME)
 async def nightmode_enforcer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.effective_message
     chat = update.effective_chat
-    lang = get_group_language(chat.id) or 'de'
     user = update.effective_user
     if not msg or not chat or chat.type not in ("group","supergroup") or not user:
         return
+    mc = await get_message_context(update, context)
+    lang = await mc.language()
 
-    en, s, e, del_non_admin, warn_once, tz, hard_mode, override_until = get_night_mode(chat.id)
+    en, s, e, del_non_admin, warn_once, tz, hard_mode, override_until = await mc.night_mode()
     now_local = datetime.datetime.now(ZoneInfo(tz))
     now_min = now_local.hour*60 + now_local.minute
 
@@ -927,13 +957,7 @@ async def nightmode_enforcer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     is_quiet = quiet_scheduled or quiet_override
 
     # Admins ausnehmen
-    try:
-        admins = await context.bot.get_chat_administrators(chat.id)
-    except Exception:
-        admins = []
-    is_admin = any(a.user.id == user.id for a in admins)
-    is_anon_admin = bool(getattr(msg, 'sender_chat', None) and msg.sender_chat.id == chat.id)
-    if is_admin or is_anon_admin:
+    if mc.is_owner or mc.is_admin or mc.is_anon_admin:
         # Falls harter Modus aktiv ist, Admins sind eh ausgenommen
         return
 
@@ -957,7 +981,7 @@ async def nightmode_enforcer(update: Update, context: ContextTypes.DEFAULT_TYPE)
                     warned = context.chat_data.setdefault("nm_warned", set())
                     if key not in warned:
                         warned.add(key)
-                        await context.bot.send_message(chat.id, tr("🌙 Ruhezeit aktiv – bitte poste wieder nach Ende der Nachtphase.", lang))
+                        await context.bot.send_message(chat.id, await tr_async("🌙 Ruhezeit aktiv – bitte poste wieder nach Ende der Nachtphase.", lang))
             except Exception as e:
                 logger.warning(f"Nachtmodus (soft) Eingriff fehlgeschlagen: {e}")
             return
@@ -968,7 +992,7 @@ async def nightmode_enforcer(update: Update, context: ContextTypes.DEFAULT_TYPE)
             flags["hard_applied"] = False
         # Abgelaufene Overrides aufräumen (optional)
         if override_until and now_local >= override_until:
-            set_night_mode(chat.id, override_until=None)
+            await _call_db(set_night_mode, chat.id, override_until=None)
 
 async def set_topic_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.effective_message
@@ -1102,7 +1126,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if msg.new_chat_members:
             for user in msg.new_chat_members:
                 # Willkommen wie unten
-                rec = get_welcome(chat_id)
+                rec = await _call_db(get_welcome, chat_id)
                 if rec:
                     photo_id, text = rec
                     text = (text or "").replace(
@@ -1112,10 +1136,10 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         await context.bot.send_photo(chat_id, photo_id, caption=text, parse_mode="HTML")
                     else:
                         await context.bot.send_message(chat_id, text=text, parse_mode="HTML")
-                add_member(chat_id, user.id)
+                await _call_db(add_member, chat_id, user.id)
 
                 # 2) Captcha zusätzlich anzeigen, falls aktiviert
-                enabled, ctype, behavior = get_captcha_settings(chat_id)
+                enabled, ctype, behavior = await _call_db(get_captcha_settings, chat_id)
                 if enabled:
                     if ctype == 'button':
                         kb = InlineKeyboardMarkup([[
@@ -1150,7 +1174,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # b) Verlassene Mitglieder
         if msg.left_chat_member:
             user = msg.left_chat_member
-            rec = get_farewell(chat_id)
+            rec = await _call_db(get_farewell, chat_id)
             if rec:
                 photo_id, text = rec
                 text = (text or "").replace(
@@ -1161,7 +1185,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await context.bot.send_photo(chat_id, photo_id, caption=text, parse_mode="HTML")
                 else:
                     await context.bot.send_message(chat_id, text=text, parse_mode="HTML")
-            remove_member(chat_id, user.id)
+            await _call_db(remove_member, chat_id, user.id)
             return
 
     # 1) Willkommen verschicken
@@ -1412,6 +1436,7 @@ def register_handlers(app):
     app.add_handler(CommandHandler("rules", show_rules_cmd, filters=filters.ChatType.GROUPS))
     app.add_handler(CommandHandler("settopic", set_topic_cmd, filters=filters.ChatType.GROUPS), group=-2)
     app.add_handler(CommandHandler("quietnow", quietnow_cmd, filters=filters.ChatType.GROUPS))
+    app.add_handler(CommandHandler("trust", trust_cmd, filters=filters.ChatType.GROUPS))
     app.add_handler(CommandHandler("removetopic", remove_topic_cmd))
     app.add_handler(CommandHandler("cleandeleteaccounts", cleandelete_command, filters=filters.ChatType.GROUPS))
     app.add_handler(CommandHandler("sync_admins_all", sync_admins_all, filters=filters.ChatType.PRIVATE))
@@ -1437,8 +1462,12 @@ def register_handlers(app):
     # Spam-Filter (Gruppe 2) - NUR IN GRUPPEN (nach Menü-Replies)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS,
                                    spam_enforcer), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS,
-                                   ai_moderation_enforcer), group=2)
+    # KI-Moderation (eigene Gruppe 4, sonst sähe sie neben dem Spamfilter nie reinen Text):
+    # Text plus Bilder/Sticker/GIFs/Videos – auch ohne Caption; was der Spamfilter schon
+    # gelöscht/verschoben hat, überspringt sie (MessageContext.enforced)
+    app.add_handler(MessageHandler((filters.TEXT | filters.PHOTO | filters.Sticker.ALL | filters.ANIMATION | filters.VIDEO)
+                                   & ~filters.COMMAND & filters.ChatType.GROUPS,
+                                   ai_moderation_enforcer), group=4)
     # Text-Handler (Gruppe 3) - nur Privat & Gruppen (nicht in Kanälen)
     app.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND & (filters.ChatType.PRIVATE | filters.ChatType.GROUPS),
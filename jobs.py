@@ -6,8 +6,9 @@ from zoneinfo import ZoneInfo
 from telegram.ext import ContextTypes, Application
 from telethon_client import telethon_client, start_telethon
 from telethon.tl.functions.channels import GetFullChannelRequest, GetForumTopicsRequest
-from database import (_db_pool, get_registered_groups, is_daily_stats_enabled, prune_pending_inputs_older_than, 
-                    purge_deleted_members, get_group_stats, get_night_mode) # <-- HIER HINZUGEFÜGT
+from database import (_db_pool, _call_analytics, borrow_connection, with_db_priority, PRIO_BACKGROUND, use_pool, get_registered_groups, is_daily_stats_enabled, prune_pending_inputs_older_than, 
+                    purge_deleted_members, get_group_stats, get_night_mode, # <-- HIER HINZUGEFÜGT
+                    ensure_message_log_partitions, apply_message_log_retention)
 from statistic import (
     DEVELOPER_IDS, get_all_group_ids, get_group_meta, fetch_message_stats,
     compute_response_times, fetch_media_and_poll_stats, get_member_stats, 
@@ -15,12 +16,15 @@ from statistic import (
     migrate_stats_rollup, compute_agg_group_day, upsert_agg_group_day, get_group_language
 )
 from telegram.constants import ParseMode
-from translator import translate_hybrid as tr
+import archive
+from access import refresh_admin_index
+from translator import translate_hybrid_async
 
 logger = logging.getLogger(__name__)
 CHANNEL_USERNAMES = [u.strip() for u in os.getenv("STATS_CHANNELS", "").split(",") if u.strip()]
 TIMEZONE = os.getenv("TZ", "Europe/Berlin")
 
+@with_db_priority(PRIO_BACKGROUND)
 async def daily_report(context: ContextTypes.DEFAULT_TYPE):
     today = date.today()
     bot = context.bot
@@ -60,6 +64,7 @@ async def daily_report(context: ContextTypes.DEFAULT_TYPE):
         except Exception as e:
             logger.error(f"Tagesstatistik-Fehler für {chat_id}: {e}")
 
+@with_db_priority(PRIO_BACKGROUND)
 async def telethon_stats_job(context: ContextTypes.DEFAULT_TYPE):
     if not telethon_client.is_connected():
         await start_telethon()
@@ -97,9 +102,7 @@ async def telethon_stats_job(context: ContextTypes.DEFAULT_TYPE):
 
             logger.info(f"[telethon_stats_job] Gruppe {chat_id}: topics={topics}")
 
-            conn = _db_pool.getconn()
-            conn.autocommit = True
-            with conn.cursor() as cur:
+            with borrow_connection("telethon_stats_job", autocommit=True) as conn, conn.cursor() as cur:
                 # 1) group_settings updaten (inkl. last_active)
                 cur.execute(
                     """
@@ -115,10 +118,10 @@ async def telethon_stats_job(context: ContextTypes.DEFAULT_TYPE):
                     """,
                     (title, description, members, admins, topics, bots, chat_id)
                 )
-            _db_pool.putconn(conn)
         except Exception as e:
             logger.error(f"Fehler beim Abfragen von {chat_id}: {e}")
 
+@with_db_priority(PRIO_BACKGROUND)
 async def purge_members_job(context: ContextTypes.DEFAULT_TYPE):
     try:
         purge_deleted_members()
@@ -126,6 +129,42 @@ async def purge_members_job(context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Fehler beim Purgen von Mitgliedern: {e}")
 
+@with_db_priority(PRIO_BACKGROUND)
+async def message_log_partitions_job(context: ContextTypes.DEFAULT_TYPE):
+    """Legt künftige message_logs-Partitionen an und setzt die Aufbewahrung durch."""
+    def _run():
+        with use_pool("maintenance"):
+            return ensure_message_log_partitions(), apply_message_log_retention()
+
+    try:
+        # DELETEs und DETACH/DROP im eigenen Thread – nie im Event-Loop
+        created, result = await asyncio.to_thread(_run)
+        logger.info(f"message_logs: {created} Partition(en) angelegt, "
+                    f"{len(result['dropped'])} entfernt, {result['deleted']} Zeilen gelöscht")
+    except Exception as e:
+        logger.error(f"Fehler bei der message_logs-Partitionspflege: {e}")
+
+@with_db_priority(PRIO_BACKGROUND)
+async def archive_events_job(context: ContextTypes.DEFAULT_TYPE):
+    """Verschiebt alte Ereignis-Zeilen ins Cold-Storage-Archiv (eigener Thread, blockiert den Loop nicht)."""
+    try:
+        moved = await asyncio.to_thread(archive.run_archiver)
+        if moved:
+            logger.info(f"Archivierung abgeschlossen: {moved}")
+    except Exception as e:
+        logger.error(f"Fehler bei der Archivierung: {e}")
+
+@with_db_priority(PRIO_BACKGROUND)
+async def admin_index_refresh_job(context: ContextTypes.DEFAULT_TYPE):
+    """Fragt nur Gruppen mit veraltetem Admin-Index neu ab (begrenzte Parallelität)."""
+    try:
+        n = await refresh_admin_index(context.bot)
+        if n:
+            logger.info(f"Admin-Index: {n} Gruppen aktualisiert")
+    except Exception as e:
+        logger.error(f"Fehler beim Admin-Index-Refresh: {e}")
+
+@with_db_priority(PRIO_BACKGROUND)
 async def dev_stats_nightly_job(context: ContextTypes.DEFAULT_TYPE):
     """Sendet das Dev-Dashboard täglich automatisch an alle Developer."""
     end   = datetime.utcnow()
@@ -158,10 +197,10 @@ async def dev_stats_nightly_job(context: ContextTypes.DEFAULT_TYPE):
             logger.warning(f"Telethon-Stats für {chat_id} fehlgeschlagen: {e}")
             telethon_text = "📡 *Live-Statistiken (Telethon)*: _nicht verfügbar_\n"
 
-        mflow    = get_member_stats(chat_id, start)
-        insights = get_message_insights(chat_id, start, end)
-        engage   = get_engagement_metrics(chat_id, start, end)
-        trends   = get_trend_analysis(chat_id, periods=4)
+        mflow    = await _call_analytics(get_member_stats, chat_id, start)
+        insights = await _call_analytics(get_message_insights, chat_id, start, end)
+        engage   = await _call_analytics(get_engagement_metrics, chat_id, start, end)
+        trends   = await _call_analytics(get_trend_analysis, chat_id, 4)
 
         messages_last_week = insights['total']
         new_members = mflow['new']
@@ -222,8 +261,8 @@ async def dev_stats_nightly_job(context: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 pass
 
+@with_db_priority(PRIO_BACKGROUND)
 async def rollup_yesterday(context):
-    migrate_stats_rollup()
     tz = ZoneInfo("Europe/Berlin")
     today = datetime.now(tz).date()
     target_day = today - timedelta(days=1)
@@ -293,13 +332,13 @@ async def night_mode_job(context: ContextTypes.DEFAULT_TYPE):
                 # über Mitternacht -> Ende am nächsten Tag
                 end_local += dt.timedelta(days=1)
             human = end_local.strftime("%H:%M")
-            await bot.send_message(chat_id, tr("🌙 Nachtmodus aktiv bis", lang) + f" {human} ({group_tz.key}).")
+            await bot.send_message(chat_id, await translate_hybrid_async("🌙 Nachtmodus aktiv bis", target_lang=lang) + f" {human} ({group_tz.key}).")
             context.bot_data[nm_key] = True
             
         elif not is_active and last_status:
             # Nachtmodus wurde gerade DEAKTIVIERT
             lang = get_group_language(chat_id) or 'de'
-            await bot.send_message(chat_id, tr("☀️ Der Nachtmodus ist beendet. Alle können wieder schreiben.", lang))
+            await bot.send_message(chat_id, await translate_hybrid_async("☀️ Der Nachtmodus ist beendet. Alle können wieder schreiben.", target_lang=lang))
             # KORREKTUR: In bot_data speichern statt chat_data
             context.bot_data[nm_key] = False
 
@@ -344,6 +383,19 @@ def register_jobs(app):
         time(hour=3, minute=0, tzinfo=ZoneInfo(TIMEZONE)),
         name="purge_members"
     )
+    jq.run_daily(
+        message_log_partitions_job,
+        time(hour=3, minute=30, tzinfo=ZoneInfo(TIMEZONE)),
+        name="message_log_partitions"
+    )
+    if archive.ARCHIVE_AFTER_DAYS > 0 and archive.archive_dir_problem():
+        logger.error(f"ARCHIVE_AFTER_DAYS gesetzt, Archivierung aber aus: {archive.archive_dir_problem()}")
+    elif archive.ARCHIVE_AFTER_DAYS > 0:
+        jq.run_daily(
+            archive_events_job,
+            time(hour=4, minute=30, tzinfo=ZoneInfo(TIMEZONE)),
+            name="archive_events"
+        )
     jq.run_daily(
         dev_stats_nightly_job,
         time(hour=4, minute=0, tzinfo=ZoneInfo(TIMEZONE)),
@@ -358,6 +410,8 @@ def register_jobs(app):
     
     # NEU: night_mode_job registrieren, damit er jede Minute läuft
     jq.run_repeating(night_mode_job, interval=60, first=10, name="night_mode_job")
+    # Admin-Index für /menu nachziehen (nur veraltete Gruppen)
+    jq.run_repeating(admin_index_refresh_job, interval=1800, first=120, name="admin_index_refresh")
     # Pending-Inputs aufräumen (alle 24h)
     from database import prune_pending_inputs_older_than
     async def _prune(_):
@@ -366,4 +420,12 @@ def register_jobs(app):
         except Exception as e:
             logger.warning(f"pending_inputs prune failed: {e}")
     jq.run_repeating(_prune, interval=86400, first=300, name="pending_inputs_prune")
-    logger.info("Jobs registriert: daily_report, telethon_stats, purge_members, dev_stats_nightly, rollup_yesterday, night_mode_job")
\ No newline at end of file
+    # abgelaufene Moderations-Urteile (persistente Cache-Stufe) entfernen
+    from database import prune_moderation_verdicts
+    async def _prune_verdicts(_):
+        try:
+            prune_moderation_verdicts()
+        except Exception as e:
+            logger.warning(f"moderation_verdicts prune failed: {e}")
+    jq.run_repeating(_prune_verdicts, interval=86400, first=600, name="moderation_verdicts_prune")
+    logger.info("Jobs registriert: daily_report, telethon_stats, purge_members, message_log_partitions, dev_stats_nightly, rollup_yesterday, night_mode_job, admin_index_refresh")
\ No newline at end of file
@@ -1,7 +1,7 @@
 import asyncio
 from telethon_client import telethon_client
 from telethon.tl.functions.channels import GetFullChannelRequest
-from database import get_all_group_ids, _db_pool
+from database import get_all_group_ids, borrow_connection
 
 async def update_group_metadata():
     if not telethon_client.is_connected():
@@ -18,8 +18,7 @@ async def update_group_metadata():
             topics = getattr(full.full_chat, "forum_info", {}).get("total_count", None)
             # Beispiel: weitere Felder wie bots kannst du hier ergänzen
 
-            conn = _db_pool.getconn()
-            try:
+            with borrow_connection("update_group_metadata") as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         UPDATE group_settings
@@ -27,8 +26,6 @@ async def update_group_metadata():
                         WHERE chat_id=%s
                     """, (title, description, members, admins, topics, chat_id))
                     conn.commit()
-            finally:
-                _db_pool.putconn(conn)
             print(f"Gruppe {chat_id}: aktualisiert.")
         except Exception as e:
             print(f"Fehler bei {chat_id}: {e}")
@@ -37,10 +37,10 @@ from database import (
 )
 from access import get_visible_groups
 from statistic import stats_command, export_stats_csv_command, log_feature_interaction
-from utils import clean_delete_accounts_for_chat, tr
-from translator import translate_hybrid
+from utils import clean_delete_accounts_for_chat, tr_async
+from translator import translate_hybrid_async
 from patchnotes import PATCH_NOTES, __version__
-from user_manual import HELP_TEXT
+from user_manual import send_manual_document
 
 logger = logging.getLogger(__name__)
 
@@ -103,37 +103,37 @@ def _topics_keyboard(cid: int, page: int, cb_prefix: str):
     kb.append([InlineKeyboardButton("↩️ Zurück", callback_data=f"group_{cid}")])
     return InlineKeyboardMarkup(kb)
 
-def build_group_menu(cid: int):
+async def build_group_menu(cid: int):
     lang = get_group_language(cid) or 'de'
-    status = tr('Aktiv', lang) if is_daily_stats_enabled(cid) else tr('Inaktiv', lang)
+    status = await tr_async('Aktiv', lang) if is_daily_stats_enabled(cid) else await tr_async('Inaktiv', lang)
     ai_faq, ai_rss = get_ai_settings(cid)
     ai_status = "✅" if (ai_faq or ai_rss) else "❌"
 
     buttons = [
-        [InlineKeyboardButton(tr('Begrüßung', lang), callback_data=f"{cid}_welcome"),
-         InlineKeyboardButton(tr('🔐 Captcha', lang), callback_data=f"{cid}_captcha")],
-        [InlineKeyboardButton(tr('Regeln', lang), callback_data=f"{cid}_rules"),
-         InlineKeyboardButton(tr('Abschied', lang), callback_data=f"{cid}_farewell")],
-        [InlineKeyboardButton(tr('🧹 Spamfilter', lang), callback_data=f"{cid}_spam")],
-        [InlineKeyboardButton(tr('🌙 Nachtmodus', lang), callback_data=f"{cid}_night"),
-         InlineKeyboardButton(tr('🧭 Topic-Router', lang), callback_data=f"{cid}_router")],
-        [InlineKeyboardButton(tr('📰 RSS', lang), callback_data=f"{cid}_rss"),
+        [InlineKeyboardButton(await tr_async('Begrüßung', lang), callback_data=f"{cid}_welcome"),
+         InlineKeyboardButton(await tr_async('🔐 Captcha', lang), callback_data=f"{cid}_captcha")],
+        [InlineKeyboardButton(await tr_async('Regeln', lang), callback_data=f"{cid}_rules"),
+         InlineKeyboardButton(await tr_async('Abschied', lang), callback_data=f"{cid}_farewell")],
+        [InlineKeyboardButton(await tr_async('🧹 Spamfilter', lang), callback_data=f"{cid}_spam")],
+        [InlineKeyboardButton(await tr_async('🌙 Nachtmodus', lang), callback_data=f"{cid}_night"),
+         InlineKeyboardButton(await tr_async('🧭 Topic-Router', lang), callback_data=f"{cid}_router")],
+        [InlineKeyboardButton(await tr_async('📰 RSS', lang), callback_data=f"{cid}_rss"),
          InlineKeyboardButton(f"🤖 KI {ai_status}", callback_data=f"{cid}_ai")],
-        [InlineKeyboardButton(tr('📊 Statistiken', lang), callback_data=f"{cid}_stats"),
-         InlineKeyboardButton(tr('❓ FAQ', lang), callback_data=f"{cid}_faq")],
+        [InlineKeyboardButton(await tr_async('📊 Statistiken', lang), callback_data=f"{cid}_stats"),
+         InlineKeyboardButton(await tr_async('❓ FAQ', lang), callback_data=f"{cid}_faq")],
         [InlineKeyboardButton(f"📊 Tagesreport {status}", callback_data=f"{cid}_toggle_stats"),
-         InlineKeyboardButton(tr('🧠 Mood', lang), callback_data=f"{cid}_mood")],
-        [InlineKeyboardButton(tr('🌐 Sprache', lang), callback_data=f"{cid}_language"),
-         InlineKeyboardButton(tr('🗑️ Bereinigen', lang), callback_data=f"{cid}_clean_delete")],
-        [InlineKeyboardButton(tr('📖 Handbuch', lang), callback_data=f"{cid}_help"),
-         InlineKeyboardButton(tr('📝 Patchnotes', lang), callback_data=f"{cid}_patchnotes")]
+         InlineKeyboardButton(await tr_async('🧠 Mood', lang), callback_data=f"{cid}_mood")],
+        [InlineKeyboardButton(await tr_async('🌐 Sprache', lang), callback_data=f"{cid}_language"),
+         InlineKeyboardButton(await tr_async('🗑️ Bereinigen', lang), callback_data=f"{cid}_clean_delete")],
+        [InlineKeyboardButton(await tr_async('📖 Handbuch', lang), callback_data=f"{cid}_help"),
+         InlineKeyboardButton(await tr_async('📝 Patchnotes', lang), callback_data=f"{cid}_patchnotes")]
     ]
     return InlineKeyboardMarkup(buttons)
 
 async def show_group_menu(query=None, cid=None, context=None, dest_chat_id=None):
     lang = get_group_language(cid) or 'de'
-    title = tr("📋 Gruppenmenü", lang)
-    markup = build_group_menu(cid)
+    title = await tr_async("📋 Gruppenmenü", lang)
+    markup = await build_group_menu(cid)
     if query:
         await _edit_or_send(query, title, markup)
         return
@@ -157,15 +157,15 @@ async def _render_faq_menu(cid, query, context):
         [InlineKeyboardButton("➕ FAQ hinzufügen", callback_data=f"{cid}_faq_add"),
          InlineKeyboardButton("🗑 FAQ löschen", callback_data=f"{cid}_faq_del")],
         [InlineKeyboardButton(f"{'✅' if ai_faq else '☐'} KI-Fallback", callback_data=f"{cid}_faq_ai_toggle")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
 async def _render_mood_menu(cid, query, context):
     lang = get_group_language(cid) or "de"
-    q = get_mood_question(cid) or tr('Wie fühlst du dich heute?', lang)
+    q = get_mood_question(cid) or await tr_async('Wie fühlst du dich heute?', lang)
     topic_id = get_mood_topic(cid)
-    topic_txt = str(topic_id) if topic_id else tr('kein Topic gesetzt', lang)
+    topic_txt = str(topic_id) if topic_id else await tr_async('kein Topic gesetzt', lang)
     text = (
         "🧠 <b>Mood</b>\n"
         f"• Topic: <code>{topic_txt}</code>\n"
@@ -173,9 +173,9 @@ async def _render_mood_menu(cid, query, context):
         "Aktion wählen:"
     )
     kb = [
-        [InlineKeyboardButton(tr('Jetzt senden', lang), callback_data=f"{cid}_mood_send")],
-        [InlineKeyboardButton(tr('Frage ändern', lang), callback_data=f"{cid}_mood_edit_q")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('Jetzt senden', lang), callback_data=f"{cid}_mood_send")],
+        [InlineKeyboardButton(await tr_async('Frage ändern', lang), callback_data=f"{cid}_mood_edit_q")],
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -186,7 +186,7 @@ async def _render_ai_menu(cid, query, context):
     kb = [
         [InlineKeyboardButton(f"{'✅' if ai_faq else '☐'} KI-FAQ", callback_data=f"{cid}_ai_faq_toggle"),
          InlineKeyboardButton(f"{'✅' if ai_rss else '☐'} KI-RSS", callback_data=f"{cid}_ai_rss_toggle")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -197,7 +197,7 @@ async def _render_aimod_menu(cid, query, context):
     text = "🛡️ <b>KI-Moderation</b>\nStelle Schwellwerte & Aktionen ein."
     kb = [
         [InlineKeyboardButton(f"{'✅' if pol.get('enabled') else '☐'} Aktiv", callback_data=f"{cid}_aimod_toggle")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -209,7 +209,7 @@ async def _render_rss_root(query, cid, lang):
          InlineKeyboardButton("📃 Feeds anzeigen", callback_data=f"{cid}_rss_list")],
         [InlineKeyboardButton(f"{'✅' if ai_rss else '☐'} KI-Zusammenfassung", callback_data=f"{cid}_rss_ai_toggle")],
         [InlineKeyboardButton("🧵 Topic setzen", callback_data=f"{cid}_rss_topic_set")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     try:
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
@@ -281,7 +281,7 @@ async def _render_spam_root(query, cid, lang=None):
         [InlineKeyboardButton("✏️ Warntext (Gruppe)", callback_data=f"{cid}_spam_link_warn_global")],
         [InlineKeyboardButton("🎯 Topic-Regeln", callback_data=f"{cid}_spam_tsel")],
         [InlineKeyboardButton("❓ Hilfe", callback_data=f"{cid}_spam_help")],
-        [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+        [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
     ]
     try:
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
@@ -289,7 +289,7 @@ async def _render_spam_root(query, cid, lang=None):
         if "Message is not modified" in str(e):
             # einfach kurz bestätigen, ohne zu crashen
             try:
-                await query.answer(tr('Keine Änderung.', lang), show_alert=False)
+                await query.answer(await tr_async('Keine Änderung.', lang), show_alert=False)
             except Exception:
                 pass
             return
@@ -403,7 +403,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # A) GRUPPENAUSWAHL (muss vor Regex passieren)
     if data == "group_select":
-        groups = await get_visible_groups(update.effective_user.id)
+        groups = await get_visible_groups(update.effective_user.id, context.bot)
         if not groups:
             return await query.edit_message_text("⚠️ Keine Gruppen verfügbar.")
         kb = [[InlineKeyboardButton(title, callback_data=f"group_{cid}")] for cid, title in groups]
@@ -444,7 +444,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     func = m.group(2)
     sub  = m.group(3) if m.group(3) is not None else None
     lang = get_group_language(cid) or "de"
-    back = InlineKeyboardMarkup([[InlineKeyboardButton(tr("↩️ Zurück", lang), callback_data=f"group_{cid}")]])
+    back = InlineKeyboardMarkup([[InlineKeyboardButton(await tr_async("↩️ Zurück", lang), callback_data=f"group_{cid}")]])
 
     # =========================
     # 2) Sub-Menüs (Einstiege)
@@ -453,12 +453,12 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if func in ('welcome', 'rules', 'farewell') and sub is None:
         kb = [
-            [InlineKeyboardButton(tr('Bearbeiten', lang), callback_data=f"{cid}_{func}_edit"),
-             InlineKeyboardButton(tr('Anzeigen', lang), callback_data=f"{cid}_{func}_show")],
-            [InlineKeyboardButton(tr('Löschen', lang), callback_data=f"{cid}_{func}_delete")],
-            [InlineKeyboardButton(tr('⬅ Hauptmenü', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('Bearbeiten', lang), callback_data=f"{cid}_{func}_edit"),
+             InlineKeyboardButton(await tr_async('Anzeigen', lang), callback_data=f"{cid}_{func}_show")],
+            [InlineKeyboardButton(await tr_async('Löschen', lang), callback_data=f"{cid}_{func}_delete")],
+            [InlineKeyboardButton(await tr_async('⬅ Hauptmenü', lang), callback_data=f"group_{cid}")]
         ]
-        text = tr(f"⚙️ {func.capitalize()} verwalten:", lang)
+        text = await tr_async(f"⚙️ {func.capitalize()} verwalten:", lang)
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
 
     if func == 'rss' and sub is None:
@@ -467,19 +467,19 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if func == 'captcha' and sub is None:
         en, ctype, behavior = get_captcha_settings(cid)
         kb = [
-            [InlineKeyboardButton(f"{'✅ ' if en else ''}{tr('Aktiviert', lang) if en else tr('Deaktiviert', lang)}",
+            [InlineKeyboardButton(f"{'✅ ' if en else ''}{await tr_async('Aktiviert', lang) if en else await tr_async('Deaktiviert', lang)}",
                                   callback_data=f"{cid}_captcha_toggle")],
-            [InlineKeyboardButton(f"{'✅' if ctype=='button' else '☐'} {tr('Button', lang)}",
+            [InlineKeyboardButton(f"{'✅' if ctype=='button' else '☐'} {await tr_async('Button', lang)}",
                                   callback_data=f"{cid}_captcha_type_button"),
-             InlineKeyboardButton(f"{'✅' if ctype=='math' else '☐'} {tr('Rechenaufgabe', lang)}",
+             InlineKeyboardButton(f"{'✅' if ctype=='math' else '☐'} {await tr_async('Rechenaufgabe', lang)}",
                                   callback_data=f"{cid}_captcha_type_math")],
-            [InlineKeyboardButton(f"{'✅' if behavior=='kick' else '☐'} {tr('Kick', lang)}",
+            [InlineKeyboardButton(f"{'✅' if behavior=='kick' else '☐'} {await tr_async('Kick', lang)}",
                                   callback_data=f"{cid}_captcha_behavior_kick"),
-             InlineKeyboardButton(f"{'✅' if behavior=='timeout' else '☐'} {tr('Timeout', lang)}",
+             InlineKeyboardButton(f"{'✅' if behavior=='timeout' else '☐'} {await tr_async('Timeout', lang)}",
                                   callback_data=f"{cid}_captcha_behavior_timeout")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
-        return await query.edit_message_text(tr('🔐 Captcha-Einstellungen', lang), reply_markup=InlineKeyboardMarkup(kb))
+        return await query.edit_message_text(await tr_async('🔐 Captcha-Einstellungen', lang), reply_markup=InlineKeyboardMarkup(kb))
 
     if func == 'faq' and sub is None:
         faqs = list_faqs(cid) or []
@@ -498,7 +498,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
              InlineKeyboardButton("🗑 FAQ löschen", callback_data=f"{cid}_faq_del")],
             [InlineKeyboardButton(f"{'✅' if ai_faq else '☐'} KI-Fallback", callback_data=f"{cid}_faq_ai_toggle")],
             [InlineKeyboardButton("❓ Hilfe", callback_data=f"{cid}_faq_help")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
         return await query.edit_message_text(help_text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -508,7 +508,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if sub == 'ai_toggle':
             ai_faq, _ = get_ai_settings(cid)
             set_ai_settings(cid, faq=not ai_faq)
-            await query.answer(tr('Einstellung gespeichert.', lang), show_alert=True)
+            await query.answer(await tr_async('Einstellung gespeichert.', lang), show_alert=True)
             return await _render_faq_menu(cid, query, context)
 
         # Hinzufügen
@@ -528,36 +528,36 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         kb = [[InlineKeyboardButton(f"{'✅ ' if c == cur else ''}{n}", callback_data=f"{cid}_setlang_{c}")]
               for c, n in LANGUAGES.items()]
         kb.append([InlineKeyboardButton('↩️ Zurück', callback_data=f'group_{cid}')])
-        return await query.edit_message_text(tr('🌐 Wähle Sprache:', cur), reply_markup=InlineKeyboardMarkup(kb))
+        return await query.edit_message_text(await tr_async('🌐 Wähle Sprache:', cur), reply_markup=InlineKeyboardMarkup(kb))
 
     if func == 'night' and sub is None:
         en, s, e, del_non_admin, warn_once, tz, hard_mode, override_until = get_night_mode(cid)
         def mm_to_str(m): return f"{m//60:02d}:{m%60:02d}"
         ov_txt = override_until.strftime("%d.%m. %H:%M") if override_until else "–"
         text = (
-            f"🌙 <b>{tr('Nachtmodus', lang)}</b>\n\n"
-            f"{tr('Status', lang)}: {'✅ ' + tr('Aktiv', lang) if en else '❌ ' + tr('Inaktiv', lang)}\n"
-            f"{tr('Start', lang)}: {mm_to_str(s)}  •  {tr('Ende', lang)}: {mm_to_str(e)}  •  TZ: {tz}\n"
-            f"{tr('Harter Modus', lang)}: {'✅' if hard_mode else '❌'}\n"
-            f"{tr('Nicht-Admin-Nachrichten löschen', lang)}: {'✅' if del_non_admin else '❌'}\n"
-            f"{tr('Nur einmal pro Nacht warnen', lang)}: {'✅' if warn_once else '❌'}\n"
-            f"{tr('Sofortige Ruhephase (Override) bis', lang)}: {ov_txt}"
+            f"🌙 <b>{await tr_async('Nachtmodus', lang)}</b>\n\n"
+            f"{await tr_async('Status', lang)}: {'✅ ' + await tr_async('Aktiv', lang) if en else '❌ ' + await tr_async('Inaktiv', lang)}\n"
+            f"{await tr_async('Start', lang)}: {mm_to_str(s)}  •  {await tr_async('Ende', lang)}: {mm_to_str(e)}  •  TZ: {tz}\n"
+            f"{await tr_async('Harter Modus', lang)}: {'✅' if hard_mode else '❌'}\n"
+            f"{await tr_async('Nicht-Admin-Nachrichten löschen', lang)}: {'✅' if del_non_admin else '❌'}\n"
+            f"{await tr_async('Nur einmal pro Nacht warnen', lang)}: {'✅' if warn_once else '❌'}\n"
+            f"{await tr_async('Sofortige Ruhephase (Override) bis', lang)}: {ov_txt}"
         )
         kb = [
-            [InlineKeyboardButton(f"{'✅' if en else '☐'} {tr('Aktivieren/Deaktivieren', lang)}",
+            [InlineKeyboardButton(f"{'✅' if en else '☐'} {await tr_async('Aktivieren/Deaktivieren', lang)}",
                                   callback_data=f"{cid}_night_toggle")],
-            [InlineKeyboardButton(tr('Startzeit ändern', lang), callback_data=f"{cid}_night_set_start"),
-             InlineKeyboardButton(tr('Endzeit ändern', lang), callback_data=f"{cid}_night_set_end")],
-            [InlineKeyboardButton(f"{'✅' if hard_mode else '☐'} {tr('Harter Modus', lang)}",
+            [InlineKeyboardButton(await tr_async('Startzeit ändern', lang), callback_data=f"{cid}_night_set_start"),
+             InlineKeyboardButton(await tr_async('Endzeit ändern', lang), callback_data=f"{cid}_night_set_end")],
+            [InlineKeyboardButton(f"{'✅' if hard_mode else '☐'} {await tr_async('Harter Modus', lang)}",
                                   callback_data=f"{cid}_night_hard_toggle")],
-            [InlineKeyboardButton(f"{'✅' if del_non_admin else '☐'} {tr('Nicht-Admin löschen', lang)}",
+            [InlineKeyboardButton(f"{'✅' if del_non_admin else '☐'} {await tr_async('Nicht-Admin löschen', lang)}",
                                   callback_data=f"{cid}_night_del_toggle")],
-            [InlineKeyboardButton(f"{'✅' if warn_once else '☐'} {tr('Einmal warnen', lang)}",
+            [InlineKeyboardButton(f"{'✅' if warn_once else '☐'} {await tr_async('Einmal warnen', lang)}",
                                   callback_data=f"{cid}_night_warnonce_toggle")],
-            [InlineKeyboardButton(f"⚡ {tr('Sofort', lang)} 15m", callback_data=f"{cid}_night_quiet_15m"),
-             InlineKeyboardButton(f"⚡ {tr('Sofort', lang)} 1h",  callback_data=f"{cid}_night_quiet_1h"),
-             InlineKeyboardButton(f"⚡ {tr('Sofort', lang)} 8h",  callback_data=f"{cid}_night_quiet_8h")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(f"⚡ {await tr_async('Sofort', lang)} 15m", callback_data=f"{cid}_night_quiet_15m"),
+             InlineKeyboardButton(f"⚡ {await tr_async('Sofort', lang)} 1h",  callback_data=f"{cid}_night_quiet_1h"),
+             InlineKeyboardButton(f"⚡ {await tr_async('Sofort', lang)} 8h",  callback_data=f"{cid}_night_quiet_8h")],
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -595,20 +595,20 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await menu_callback(update, context)
 
     if func == 'mood' and sub is None:
-        q = get_mood_question(cid) or tr('Wie fühlst du dich heute?', get_group_language(cid) or 'de')
+        q = get_mood_question(cid) or await tr_async('Wie fühlst du dich heute?', get_group_language(cid) or 'de')
         topic_id = get_mood_topic(cid)
-        topic_txt = str(topic_id) if topic_id else tr('Nicht gesetzt', lang)
+        topic_txt = str(topic_id) if topic_id else await tr_async('Nicht gesetzt', lang)
         text = (
-            f"🧠 <b>{tr('Mood-Einstellungen', lang)}</b>\n\n"
-            f"• {tr('Aktuelle Frage', lang)}:\n{q}\n\n"
-            f"• {tr('Topic-ID', lang)}: {topic_txt}"
+            f"🧠 <b>{await tr_async('Mood-Einstellungen', lang)}</b>\n\n"
+            f"• {await tr_async('Aktuelle Frage', lang)}:\n{q}\n\n"
+            f"• {await tr_async('Topic-ID', lang)}: {topic_txt}"
         )
         kb = [
-            [InlineKeyboardButton(tr('Frage anzeigen', lang), callback_data=f"{cid}_mood_show"),
-             InlineKeyboardButton(tr('Frage ändern', lang), callback_data=f"{cid}_edit_mood_q")],
-            [InlineKeyboardButton(tr('Jetzt senden (Topic)', lang), callback_data=f"{cid}_mood_send")],
-            [InlineKeyboardButton(tr('Topic setzen (Hilfe)', lang), callback_data=f"{cid}_mood_topic_help")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('Frage anzeigen', lang), callback_data=f"{cid}_mood_show"),
+             InlineKeyboardButton(await tr_async('Frage ändern', lang), callback_data=f"{cid}_edit_mood_q")],
+            [InlineKeyboardButton(await tr_async('Jetzt senden (Topic)', lang), callback_data=f"{cid}_mood_send")],
+            [InlineKeyboardButton(await tr_async('Topic setzen (Hilfe)', lang), callback_data=f"{cid}_mood_topic_help")],
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -625,7 +625,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton(f"{'✅' if ai_faq else '☐'} FAQ-Fallback", callback_data=f"{cid}_ai_faq_toggle")],
             [InlineKeyboardButton(f"{'✅' if ai_rss else '☐'} RSS-Zusammenfassung", callback_data=f"{cid}_ai_rss_toggle")],
             [InlineKeyboardButton("🛡️ Moderation", callback_data=f"{cid}_aimod")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -636,13 +636,13 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if sub == 'faq_toggle':
                 ai_faq, ai_rss = get_ai_settings(cid)
                 set_ai_settings(cid, faq=not ai_faq)
-                await query.answer(tr('Einstellung gespeichert.', lang), show_alert=True)
+                await query.answer(await tr_async('Einstellung gespeichert.', lang), show_alert=True)
                 return await _render_ai_menu(cid, query, context)
 
             if sub == 'rss_toggle':
                 ai_faq, ai_rss = get_ai_settings(cid)
                 set_ai_settings(cid, rss=not ai_rss)
-                await query.answer(tr('Einstellung gespeichert.', lang), show_alert=True)
+                await query.answer(await tr_async('Einstellung gespeichert.', lang), show_alert=True)
                 return await _render_ai_menu(cid, query, context)
         
         # KI-Moderation – Aktionen
@@ -650,7 +650,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if sub == 'toggle':
                 pol = effective_ai_mod_policy(cid, 0)
                 set_ai_mod_settings(cid, 0, enabled=not pol.get('enabled', False))
-                await query.answer(tr('Einstellung gespeichert.', lang), show_alert=True)
+                await query.answer(await tr_async('Einstellung gespeichert.', lang), show_alert=True)
                 return await _render_aimod_menu(cid, query, context)    
             
     # =========================
@@ -684,8 +684,8 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if sub == 'delete':
             del_map[func](cid)
-            await query.answer(tr(f"✅ {func.capitalize()} gelöscht.", lang), show_alert=True)
-            return await query.edit_message_text(tr(f"{func.capitalize()} entfernt.", lang), reply_markup=back)
+            await query.answer(await tr_async(f"✅ {func.capitalize()} gelöscht.", lang), show_alert=True)
+            return await query.edit_message_text(await tr_async(f"{func.capitalize()} entfernt.", lang), reply_markup=back)
 
         if sub == 'edit':
             context.user_data['last_edit'] = (cid, func)
@@ -699,15 +699,15 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         en, ctype, behavior = get_captcha_settings(cid)
         if sub == 'toggle':
             set_captcha_settings(cid, not en, ctype, behavior)
-            await query.answer(tr(f"Captcha {'aktiviert' if not en else 'deaktiviert'}", lang), show_alert=True)
+            await query.answer(await tr_async(f"Captcha {'aktiviert' if not en else 'deaktiviert'}", lang), show_alert=True)
         elif sub in ('type_button', 'type_math'):
             new_type = sub.split('_', 1)[1]
             set_captcha_settings(cid, en, new_type, behavior)
-            await query.answer(tr("Captcha-Typ geändert", lang), show_alert=True)
+            await query.answer(await tr_async("Captcha-Typ geändert", lang), show_alert=True)
         elif sub in ('behavior_kick', 'behavior_timeout'):
             new_behavior = sub.split('_', 1)[1]
             set_captcha_settings(cid, en, ctype, new_behavior)
-            await query.answer(tr("Captcha-Verhalten geändert", lang), show_alert=True)
+            await query.answer(await tr_async("Captcha-Verhalten geändert", lang), show_alert=True)
         return await show_group_menu(query=query, cid=cid, context=context)
 
     # --- RSS ---
@@ -754,7 +754,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ai_faq, ai_rss = get_ai_settings(cid)
             set_ai_settings(cid, rss=not ai_rss)
             log_feature_interaction(cid, update.effective_user.id, "menu:rss", {"action": "ai_toggle", "from": ai_rss, "to": (not ai_rss)})
-            await query.answer(tr('Einstellung gespeichert.', lang), show_alert=True)
+            await query.answer(await tr_async('Einstellung gespeichert.', lang), show_alert=True)
             return await _render_rss_root(query, cid, lang)
 
         if sub == 'topic_set':
@@ -923,7 +923,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
              InlineKeyboardButton("➕ Domains-Regel (Topic wählen)",  callback_data=f"{cid}_router_tsel_dom")],
             [InlineKeyboardButton("🗑 Regel löschen",   callback_data=f"{cid}_router_del"),
              InlineKeyboardButton("🔁 Regel togglen",  callback_data=f"{cid}_router_toggle")],
-            [InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"group_{cid}")]
+            [InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"group_{cid}")]
         ]
         return await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode="HTML")
 
@@ -1103,7 +1103,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if func == 'toggle' and sub == 'stats':
         cur = is_daily_stats_enabled(cid)
         set_daily_stats(cid, not cur)
-        await query.answer(tr(f"Tagesstatistik {'aktiviert' if not cur else 'deaktiviert'}", lang), show_alert=True)
+        await query.answer(await tr_async(f"Tagesstatistik {'aktiviert' if not cur else 'deaktiviert'}", lang), show_alert=True)
         return await show_group_menu(query=query, cid=cid, context=context)
 
     if func == 'clean' and sub == 'delete':
@@ -1126,25 +1126,25 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- Mood ---
     if func == 'mood' and sub:
         if sub == 'show':
-            q = get_mood_question(cid) or tr('Wie fühlst du dich heute?', get_group_language(cid) or 'de')
+            q = get_mood_question(cid) or await tr_async('Wie fühlst du dich heute?', get_group_language(cid) or 'de')
             return await query.edit_message_text(
-                f"📖 {tr('Aktuelle Mood-Frage', lang)}:\n\n{q}",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"{cid}_mood")]])
+                f"📖 {await tr_async('Aktuelle Mood-Frage', lang)}:\n\n{q}",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"{cid}_mood")]])
             )
         if sub == 'send':
             topic_id = get_mood_topic(cid)
             if not topic_id:
-                await query.answer(tr('❗ Kein Mood-Topic gesetzt. Sende /setmoodtopic im gewünschten Thema.', lang), show_alert=True)
+                await query.answer(await tr_async('❗ Kein Mood-Topic gesetzt. Sende /setmoodtopic im gewünschten Thema.', lang), show_alert=True)
                 return await _render_mood_menu(cid, query, context)
 
-            q = get_mood_question(cid) or tr('Wie fühlst du dich heute?', lang)
+            q = get_mood_question(cid) or await tr_async('Wie fühlst du dich heute?', lang)
             kb = InlineKeyboardMarkup([
                 [InlineKeyboardButton("👍", callback_data="mood_like"),
                 InlineKeyboardButton("👎", callback_data="mood_dislike"),
                 InlineKeyboardButton("🤔", callback_data="mood_think")]
             ])
             await context.bot.send_message(chat_id=cid, text=q, reply_markup=kb, message_thread_id=topic_id)
-            await query.answer(tr('✅ Mood-Frage gesendet.', lang), show_alert=True)
+            await query.answer(await tr_async('✅ Mood-Frage gesendet.', lang), show_alert=True)
             return await _render_mood_menu(cid, query, context)
         
         if sub == 'topic_help':
@@ -1152,28 +1152,28 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "🧵 <b>Topic setzen</b>\n\n"
                 "1) Öffne das gewünschte Forum-Thema.\n"
                 "2) Sende dort <code>/setmoodtopic</code>\n"
-                f"   {tr('(oder antworte in dem Thema auf eine Nachricht und sende den Befehl)', lang)}.\n"
+                f"   {await tr_async('(oder antworte in dem Thema auf eine Nachricht und sende den Befehl)', lang)}.\n"
                 "3) Fertig – zukünftige Mood-Fragen landen in diesem Thema."
             )
             return await query.edit_message_text(
                 help_txt, parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(tr('↩️ Zurück', lang), callback_data=f"{cid}_mood")]])
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(await tr_async('↩️ Zurück', lang), callback_data=f"{cid}_mood")]])
             )
 
         if sub == 'set_start':
             context.user_data['awaiting_nm_time'] = ('start', cid)
-            await query.message.reply_text(tr('Bitte Startzeit im Format HH:MM senden (z. B. 22:00).', lang), reply_markup=ForceReply(selective=True))
+            await query.message.reply_text(await tr_async('Bitte Startzeit im Format HH:MM senden (z. B. 22:00).', lang), reply_markup=ForceReply(selective=True))
             return
         if sub == 'set_end':
             context.user_data['awaiting_nm_time'] = ('end', cid)
-            await query.message.reply_text(tr('Bitte Endzeit im Format HH:MM senden (z. B. 06:00).', lang), reply_markup=ForceReply(selective=True))
+            await query.message.reply_text(await tr_async('Bitte Endzeit im Format HH:MM senden (z. B. 06:00).', lang), reply_markup=ForceReply(selective=True))
             return
 
     if func == 'setlang' and sub:
         lang_code = sub
         set_group_language(cid, lang_code)   # <-- Import wird hier bewusst genutzt
         await query.answer(
-            tr(f"Gruppensprache gesetzt: {LANGUAGES.get(lang_code, lang_code)}", lang_code),
+            await tr_async(f"Gruppensprache gesetzt: {LANGUAGES.get(lang_code, lang_code)}", lang_code),
             show_alert=True
         )
         # Menü neu zeichnen in neuer Sprache
@@ -1186,24 +1186,13 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if m_help:
         cid = int(m_help.group(1))
         lang = get_group_language(cid) or "de"
-        translated = translate_hybrid(HELP_TEXT, target_lang=lang)
-        path = f'/tmp/user_manual_{lang}.md'
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(translated)
-            await query.message.reply_document(document=open(path, 'rb'),
-                                            filename=f'Handbuch_{lang}.md')
-        finally:
-            try:
-                import os; os.remove(path)
-            except Exception:
-                pass
+        await send_manual_document(query.message, context, lang, filename=f'Handbuch_{lang}.md')
         return
 
     if m_notes:
         cid = int(m_notes.group(1))
         lang = get_group_language(cid) or "de"
-        notes_text = PATCH_NOTES if lang == 'de' else translate_hybrid(PATCH_NOTES, target_lang=lang)
+        notes_text = PATCH_NOTES if lang == 'de' else await translate_hybrid_async(PATCH_NOTES, target_lang=lang)
         text = f"📝 <b>Patchnotes v{__version__}</b>\n\n{notes_text}"
         await query.message.reply_text(text, parse_mode="HTML")
         return
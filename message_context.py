@@ -0,0 +1,130 @@
+"""
+Gemeinsamer Nachrichtenkontext je Update.
+
+Bisher hat jede Handler-Gruppe dieselbe Nachricht selbst zerlegt (Domains, Emojis), die
+Privilegien eigens geprüft und die Policies getrennt geladen. Ein Handler in Gruppe -3 baut
+stattdessen einmal pro Update einen MessageContext und hängt ihn an den CallbackContext
+(PTB nutzt denselben Context für alle Handler eines Updates). Spam-, KI- und Nachtmodus-
+Enforcer lesen nur noch daraus (get_message_context); fehlt er – etwa weil der Filter der
+Gruppe -3 nicht gegriffen hat –, wird er dort nachgebaut.
+
+Policies (Link, Spam, KI), Gruppensprache und Nachtmodus werden erst beim ersten Zugriff
+geladen und dann für das Update gemerkt.
+"""
+import re
+import logging
+from telegram import MessageEntity
+from telegram.ext import MessageHandler, filters
+import metrics
+from access import resolve_privileged_flags
+from database import (_call_db, get_effective_link_policy, get_effective_spam_policy, effective_ai_mod_policy,
+                      get_group_language, get_night_mode)
+from utils import _extract_domains_from_text
+
+logger = logging.getLogger(__name__)
+
+_EMOJI_RE = re.compile(r'([\U0001F300-\U0001FAFF\U00002600-\U000027BF])')
+_MENTION_TYPES = (MessageEntity.MENTION, MessageEntity.TEXT_MENTION)
+
+_ATTR = "message_context"
+_stats = {"built": 0, "late": 0, "reused": 0}
+
+metrics.gauge("message_context", lambda: dict(_stats))
+
+
+def _entities(msg, types) -> list[str]:
+    """Entity-Texte aus Text oder Caption (Erwähnungen, Hashtags)."""
+    try:
+        parsed = msg.parse_entities(types) if msg.text else msg.parse_caption_entities(types)
+    except Exception:
+        return []
+    out = []
+    for ent, value in parsed.items():
+        if ent.type == MessageEntity.TEXT_MENTION and ent.user:
+            out.append(str(ent.user.id))
+        else:
+            out.append(value)
+    return out
+
+
+class MessageContext:
+    __slots__ = ("update_id", "chat_id", "chat_type", "user_id", "message_id", "topic_id", "text",
+                 "domains", "emoji_count", "mentions", "hashtags",
+                 "is_owner", "is_admin", "is_anon_admin", "is_topic_owner", "dedupe_key", "enforced", "_memo")
+
+    def __init__(self, update, msg):
+        chat = msg.chat
+        self.update_id = update.update_id
+        self.chat_id = chat.id
+        self.chat_type = chat.type
+        self.user_id = msg.from_user.id if msg.from_user else None
+        self.message_id = msg.message_id
+        self.topic_id = getattr(msg, "message_thread_id", None)
+        self.text = msg.text or msg.caption or ""
+        self.domains = _extract_domains_from_text(self.text)
+        self.emoji_count = len(_EMOJI_RE.findall(self.text))
+        self.mentions = _entities(msg, _MENTION_TYPES) if self.text else []
+        self.hashtags = _entities(msg, [MessageEntity.HASHTAG]) if self.text else []
+        self.is_owner = self.is_admin = self.is_anon_admin = self.is_topic_owner = False
+        self.dedupe_key = (chat.id, msg.message_id)
+        # vom Spamfilter gelöscht/verschoben → spätere Enforcer (KI, Gruppe 4) greifen nicht noch einmal ein
+        self.enforced = False
+        self._memo = {}
+
+    @property
+    def privileged(self) -> bool:
+        """Admin, Inhaber, anonymer Admin oder Topic-Owner."""
+        return self.is_owner or self.is_admin or self.is_anon_admin or self.is_topic_owner
+
+    async def _load(self, name, fn, *args):
+        if name not in self._memo:
+            self._memo[name] = await _call_db(fn, *args)
+        return self._memo[name]
+
+    async def link_policy(self):
+        return await self._load("link", get_effective_link_policy, self.chat_id, self.topic_id)
+
+    async def spam_policy(self):
+        return await self._load("spam", get_effective_spam_policy, self.chat_id, self.topic_id)
+
+    async def ai_policy(self):
+        return await self._load("ai", effective_ai_mod_policy, self.chat_id, self.topic_id)
+
+    async def language(self) -> str:
+        return (await self._load("lang", get_group_language, self.chat_id)) or "de"
+
+    async def night_mode(self):
+        return await self._load("night", get_night_mode, self.chat_id)
+
+
+async def _build(update, context) -> MessageContext | None:
+    msg = update.effective_message
+    if not msg or not msg.chat:
+        return None
+    mc = MessageContext(update, msg)
+    if mc.chat_type in ("group", "supergroup"):
+        (mc.is_owner, mc.is_admin, mc.is_anon_admin, mc.is_topic_owner, _, _) = \
+            await resolve_privileged_flags(msg, context)
+    setattr(context, _ATTR, mc)
+    return mc
+
+
+async def get_message_context(update, context) -> MessageContext | None:
+    """Kontext dieses Updates; wird gebaut, falls Gruppe -3 ihn (noch) nicht angelegt hat."""
+    mc = getattr(context, _ATTR, None)
+    if mc is not None and mc.update_id == update.update_id:
+        _stats["reused"] += 1
+        return mc
+    _stats["late"] += 1
+    return await _build(update, context)
+
+
+async def message_context_builder(update, context):
+    if await _build(update, context) is not None:
+        _stats["built"] += 1
+
+
+def register_message_context(app):
+    # vor Nachtmodus (-1) und den Enforcern (2 Spam, 4 KI), nach dem Admin-Cache (-4)
+    app.add_handler(MessageHandler(filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL, message_context_builder),
+                    group=-3)
@@ -0,0 +1,206 @@
+"""
+In-Process-Metriken (Histogramme, Zähler, Gauges) für DB-Latenzen & Co.
+
+database.py misst jeden @_with_cursor-Aufruf und jede Pool-Ausleihe; das Dev-Menü liest
+snapshot(), ein optionaler HTTP-Endpunkt (METRICS_PORT) liefert /metrics im Prometheus-Textformat.
+"""
+import os
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = kein HTTP-Endpunkt
+METRICS_BIND = os.getenv("METRICS_BIND", "127.0.0.1")
+
+# Bucket-Grenzen in Sekunden (1 ms … 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # letzter Eintrag = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Näherung über die Bucket-Obergrenze (für Übersichten genügt das)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: dict[str, dict[tuple, Histogram]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, object] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._hist.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = Histogram()
+            h.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name: str, fn) -> None:
+        """fn() liefert den aktuellen Wert (Zahl) oder ein dict {label_wert: zahl}."""
+        self._gauges[name] = fn
+
+    # --- Auslesen ---
+    def histograms(self, name: str) -> dict[tuple, Histogram]:
+        with self._lock:
+            return dict(self._hist.get(name, {}))
+
+    def counters(self, name: str) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            hists = {n: dict(s) for n, s in self._hist.items()}
+            counters = {n: dict(s) for n, s in self._counters.items()}
+        for name, series in sorted(hists.items()):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(series.items()):
+                acc = 0
+                for le, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    acc += n
+                    lines.append(f"{name}_bucket{_labels(key, le=le)} {acc}")
+                lines.append(f"{name}_sum{_labels(key)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_labels(key)} {h.count}")
+        for name, series in sorted(counters.items()):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, v in sorted(series.items()):
+                lines.append(f"{name}{_labels(key)} {v:g}")
+        for name, fn in sorted(self._gauges.items()):
+            try:
+                val = fn()
+            except Exception:
+                logger.exception(f"Gauge {name} fehlgeschlagen")
+                continue
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(val, dict):
+                for k, v in sorted(val.items()):
+                    lines.append(f"{name}{_labels((('key', k),))} {v:g}")
+            else:
+                lines.append(f"{name} {val:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: tuple, **extra) -> str:
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+registry = Registry()
+
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, **labels)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    registry.inc(name, amount, **labels)
+
+
+def gauge(name: str, fn) -> None:
+    registry.gauge(name, fn)
+
+
+def describe(name: str, text: str) -> None:
+    registry.describe(name, text)
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
+
+
+def snapshot(name: str, label: str, limit: int = 10) -> list[dict]:
+    """Top-Serien eines Histogramms nach Gesamtzeit – für das Dev-Menü."""
+    out = []
+    for key, h in registry.histograms(name).items():
+        lbl = dict(key).get(label, "?")
+        out.append({
+            label: lbl, "count": h.count, "total_s": h.sum,
+            "avg_ms": (h.sum / h.count * 1000) if h.count else 0.0,
+            "p50_ms": h.quantile(0.5) * 1000, "p95_ms": h.quantile(0.95) * 1000, "max_ms": h.max * 1000,
+        })
+    out.sort(key=lambda r: r["total_s"], reverse=True)
+    return out[:limit]
+
+
+# --- /metrics-Endpunkt ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):  # kein Access-Log auf stderr
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+
+
+def start_metrics_server(port: int | None = None) -> bool:
+    """Startet den /metrics-Endpunkt in einem Daemon-Thread (METRICS_PORT=0 → aus)."""
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port or _server is not None:
+        return False
+    try:
+        _server = ThreadingHTTPServer((METRICS_BIND, port), _Handler)
+    except OSError as e:
+        logger.warning(f"Metrics-Endpunkt auf Port {port} nicht verfügbar: {e}")
+        return False
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Metrics-Endpunkt: http://{METRICS_BIND}:{port}/metrics")
+    return True
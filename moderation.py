@@ -0,0 +1,437 @@
+"""
+KI-Moderation: Urteils-Cache vor ai_moderate_text / ai_moderate_image.
+
+Spam-Wellen schicken denselben Text und dieselben Bilder in viele Chats. Urteile werden daher
+nach Inhalt gemerkt: Texte über sha256(Modell + normalisierter Text), Medien über Telegrams
+file_unique_id (gleich für dieselbe Datei in allen Chats). Stufe 1 ist ein LRU im Speicher
+(MODCACHE_MAX Einträge, MODCACHE_TTL_S), Stufe 2 optional die Tabelle moderation_verdicts
+(MODCACHE_PERSIST) – dadurch teilen sich mehrere Prozesse und Neustarts die Urteile.
+Gleichzeitige Anfragen für denselben Inhalt teilen sich einen API-Aufruf. Fehler (None)
+werden nicht gemerkt. Gespeichert wird nur der Hash, nie der Text.
+
+Cache-Misses bei Texten gehen nicht einzeln an die API: der Batcher sammelt sie chatübergreifend
+MODBATCH_WINDOW_MS lang (oder bis MODBATCH_MAX_ITEMS) und schickt sie als eine Liste an den
+Moderations-Endpoint; jeder Wartende bekommt sein Ergebnis über ein eigenes Future.
+
+Medien (Thumbnail-first): pick_media wählt die kleinste brauchbare PhotoSize bzw. das Thumbnail,
+geladen wird über den HTTP-Pool des Bots. Mit Pillow wird lokal auf MEDIA_MAX_SIDE verkleinert
+(JPEG, detail=low) und ein 64-Bit-dHash berechnet; Bilder mit Hamming-Abstand ≤ MEDIA_PHASH_DISTANCE
+zu einem schon bewerteten Bild übernehmen dessen Urteil. Der Rest geht gebündelt (MEDIA_BATCH_MAX
+Bilder je Request) an das Vision-Modell. Ohne Pillow: CDN-URL wie bisher, einzeln.
+"""
+import os
+import re
+import time
+import asyncio
+import base64
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+import metrics
+from database import _call_db, get_moderation_verdict, put_moderation_verdict
+import ai_client
+from utils import ai_moderate_text, ai_moderate_image, ai_moderate_images, moderation_result
+
+try:
+    from PIL import Image
+except ImportError:  # ohne Pillow: kein lokales Verkleinern/Hashing
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MODCACHE_TTL_S = float(os.getenv("MODCACHE_TTL_S", "86400"))
+MODCACHE_MAX = int(os.getenv("MODCACHE_MAX", "20000"))
+MODCACHE_PERSIST = (os.getenv("MODCACHE_PERSIST", "1").strip().lower() not in ("0", "false", "no", "off"))
+
+MODBATCH_ENABLED = (os.getenv("MODBATCH", "1").strip().lower() not in ("0", "false", "no", "off"))
+MODBATCH_WINDOW_MS = float(os.getenv("MODBATCH_WINDOW_MS", "150"))
+MODBATCH_MAX_ITEMS = int(os.getenv("MODBATCH_MAX_ITEMS", "32"))
+# Latenzbudget je Nachricht (Warten + Request); danach wird ohne KI-Urteil weitergemacht
+MODBATCH_BUDGET_S = float(os.getenv("MODBATCH_BUDGET_S", "10"))
+
+# Medien: kleinste Variante mit mindestens MEDIA_MIN_SIDE px an der kurzen Seite
+MEDIA_MIN_SIDE = int(os.getenv("MEDIA_MIN_SIDE", "256"))
+MEDIA_MAX_SIDE = int(os.getenv("MEDIA_MAX_SIDE", "512"))
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(5 * 1024 * 1024)))
+MEDIA_PHASH_DISTANCE = int(os.getenv("MEDIA_PHASH_DISTANCE", "6"))
+MEDIA_PHASH_MAX = int(os.getenv("MEDIA_PHASH_MAX", "5000"))
+MEDIA_BATCH_WINDOW_MS = float(os.getenv("MEDIA_BATCH_WINDOW_MS", "250"))
+MEDIA_BATCH_MAX = int(os.getenv("MEDIA_BATCH_MAX", "4"))
+
+KIND_TEXT = "text"
+KIND_MEDIA = "media"
+
+_ZERO_WIDTH = re.compile(r"[\u00ad\u200b-\u200f\u2060-\u2064\ufeff]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC, casefold, unsichtbare Zeichen raus, Whitespace zusammenfassen."""
+    t = unicodedata.normalize("NFKC", text or "")
+    t = _ZERO_WIDTH.sub("", t).casefold()
+    return _SPACES.sub(" ", t).strip()
+
+
+def text_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """LRU mit TTL für Moderationsurteile (dicts)."""
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl = ttl_s
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple[str, str], tuple[float, dict]]" = OrderedDict()
+        self.stats = {"hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "coalesced": 0}
+
+    def get(self, kind: str, key: str):
+        with self._lock:
+            item = self._items.get((kind, key))
+            if item is None:
+                return None
+            expires, verdict = item
+            if expires < time.monotonic():
+                del self._items[(kind, key)]
+                return None
+            self._items.move_to_end((kind, key))
+            self.stats["hits"] += 1
+            return verdict
+
+    def put(self, kind: str, key: str, verdict: dict, ttl_s: float | None = None) -> None:
+        with self._lock:
+            self._items[(kind, key)] = (time.monotonic() + (self.ttl if ttl_s is None else ttl_s), verdict)
+            self._items.move_to_end((kind, key))
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def size(self) -> int:
+        return len(self._items)
+
+
+_cache = VerdictCache(MODCACHE_TTL_S, MODCACHE_MAX)
+_inflight: dict[tuple[str, str], asyncio.Future] = {}
+_RETRY = object()   # None ist ein gültiges Ergebnis (KI nicht verfügbar)
+
+
+def get_stats() -> dict:
+    return dict(_cache.stats, entries=_cache.size())
+
+
+metrics.gauge("moderation_cache", get_stats)
+
+
+async def _cached(kind: str, key: str, compute):
+    verdict = _cache.get(kind, key)
+    if verdict is not None:
+        return verdict
+    fut = _inflight.get((kind, key))
+    if fut is not None:
+        _cache.stats["coalesced"] += 1
+        verdict = await asyncio.shield(fut)
+        if verdict is _RETRY:   # erster Aufrufer abgebrochen → selbst prüfen
+            return await _cached(kind, key, compute)
+        return verdict
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[(kind, key)] = fut
+    try:
+        verdict = await _lookup(kind, key, compute)
+        fut.set_result(verdict)
+        return verdict
+    except asyncio.CancelledError:
+        # nicht den gemeinsamen Future abbrechen: die übrigen Wartenden wurden nicht gecancelt
+        fut.set_result(_RETRY)
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # als abgerufen markieren, falls niemand wartet
+        raise
+    finally:
+        _inflight.pop((kind, key), None)
+
+
+async def _lookup(kind: str, key: str, compute):
+    if MODCACHE_PERSIST:
+        try:
+            row = await _call_db(get_moderation_verdict, kind, key)
+        except Exception as e:
+            logger.debug(f"moderation_verdicts nicht lesbar: {e}")
+            row = None
+        if row is not None:
+            verdict, remaining_s = row
+            _cache.stats["db_hits"] += 1
+            _cache.put(kind, key, verdict, min(MODCACHE_TTL_S, remaining_s))
+            return verdict
+
+    _cache.stats["misses"] += 1
+    verdict = await compute()
+    if verdict is None:   # KI nicht verfügbar / Fehler → nicht merken
+        return None
+    _cache.put(kind, key, verdict)
+    _cache.stats["stores"] += 1
+    if MODCACHE_PERSIST:
+        try:
+            await _call_db(put_moderation_verdict, kind, key, verdict, MODCACHE_TTL_S)
+        except Exception as e:
+            logger.debug(f"moderation_verdicts nicht schreibbar: {e}")
+    return verdict
+
+
+# --- Micro-Batching für den Moderations-Endpoint ---
+metrics.describe("moderation_batch_wait_seconds", "Wartezeit einer Nachricht im Moderations-Batcher bis zum Request")
+metrics.describe("moderation_batch_seconds", "Dauer eines gebündelten Moderations-Requests")
+
+
+class _Batch:
+    __slots__ = ("items", "timer")
+
+    def __init__(self):
+        self.items: list[tuple[str, asyncio.Future, float]] = []
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class ModerationBatcher:
+    """Sammelt Texte je Modell und schickt sie als ein moderations.create(input=[...])."""
+
+    def __init__(self, window_s: float, max_items: int):
+        self.window_s = window_s
+        self.max_items = max(1, max_items)
+        self._open: dict[str, _Batch] = {}
+        self.stats = {"batches": 0, "items": 0, "max_size": 0, "last_size": 0, "fallbacks": 0, "budget_exceeded": 0}
+
+    def submit(self, text: str, model: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        batch = self._open.get(model)
+        if batch is None:
+            batch = self._open[model] = _Batch()
+            batch.timer = loop.call_later(self.window_s, self._flush, model)
+        fut = loop.create_future()
+        batch.items.append((text, fut, time.perf_counter()))
+        if len(batch.items) >= self.max_items:
+            self._flush(model)
+        return fut
+
+    def _flush(self, model: str) -> None:
+        batch = self._open.pop(model, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        asyncio.get_running_loop().create_task(self._send(model, batch.items))
+
+    async def _send(self, model: str, items) -> None:
+        n = len(items)
+        self.stats["batches"] += 1
+        self.stats["items"] += n
+        self.stats["last_size"] = n
+        self.stats["max_size"] = max(self.stats["max_size"], n)
+        t0 = time.perf_counter()
+        for _, _, enqueued in items:
+            metrics.observe("moderation_batch_wait_seconds", t0 - enqueued, model=model)
+        try:
+            res = await ai_client.moderate(model=model, input=[text for text, _, _ in items])
+            results = [moderation_result(out) for out in res.results]
+            if len(results) != n:
+                raise ValueError(f"{len(results)} Ergebnisse für {n} Eingaben")
+        except Exception as e:
+            # Batch gescheitert → einzeln (inkl. Chat-Classifier-Fallback von ai_moderate_text)
+            logger.info(f"Moderations-Batch ({n}) fehlgeschlagen, einzeln weiter: {e}")
+            self.stats["fallbacks"] += 1
+            results = await asyncio.gather(*(ai_moderate_text(text, model=model) for text, _, _ in items),
+                                           return_exceptions=True)
+        metrics.observe("moderation_batch_seconds", time.perf_counter() - t0, model=model)
+        for (_, fut, _), result in zip(items, results):
+            if fut.done():
+                continue
+            fut.set_result(None if isinstance(result, BaseException) else result)
+
+    async def moderate(self, text: str, model: str) -> dict | None:
+        fut = self.submit(text, model)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), MODBATCH_BUDGET_S)
+        except asyncio.TimeoutError:
+            self.stats["budget_exceeded"] += 1
+            logger.debug(f"Moderation über Latenzbudget ({MODBATCH_BUDGET_S}s) – ohne KI-Urteil weiter")
+            return None
+
+
+_batcher = ModerationBatcher(MODBATCH_WINDOW_MS / 1000.0, MODBATCH_MAX_ITEMS)
+metrics.gauge("moderation_batcher", lambda: dict(_batcher.stats))
+
+
+def get_batch_stats() -> dict:
+    return dict(_batcher.stats)
+
+
+async def moderate_text(text: str, model: str) -> dict | None:
+    """ai_moderate_text mit Urteils-Cache (Schlüssel: Modell + normalisierter Text) und Batching."""
+    if not text:
+        return None
+    if MODBATCH_ENABLED:
+        compute = lambda: _batcher.moderate(text, model)
+    else:
+        compute = lambda: ai_moderate_text(text, model=model)
+    return await _cached(KIND_TEXT, text_key(text, model), compute)
+
+
+# --- Medien: Thumbnail-first, lokales Verkleinern, dHash, gebündelte Vision-Requests ---
+def pick_media(msg):
+    """(art, Datei-Objekt) mit der kleinsten brauchbaren Auflösung – oder (None, None)."""
+    if msg.photo:
+        sizes = sorted(msg.photo, key=lambda p: p.width * p.height)
+        usable = [p for p in sizes if min(p.width, p.height) >= MEDIA_MIN_SIDE]
+        return "photo", (usable[0] if usable else sizes[-1])
+    if msg.sticker:
+        st = msg.sticker
+        # animierte (tgs) / Video-Sticker (webm) sind keine Bilder → Thumbnail
+        if getattr(st, "is_animated", False) or getattr(st, "is_video", False):
+            thumb = getattr(st, "thumbnail", None)
+            return ("sticker_thumb", thumb) if thumb else (None, None)
+        return "sticker", st
+    if msg.animation and getattr(msg.animation, "thumbnail", None):  # GIF
+        return "animation_thumb", msg.animation.thumbnail
+    if msg.video and getattr(msg.video, "thumbnail", None):
+        return "video_thumb", msg.video.thumbnail
+    return None, None
+
+
+def _prepare_image(data: bytes) -> tuple[bytes, int]:
+    """Verkleinertes JPEG + 64-Bit-dHash (läuft im Thread, CPU)."""
+    import io
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        # dHash: 9x8 Graustufen, Vergleich benachbarter Pixel je Zeile
+        px = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+        phash = 0
+        for row in range(8):
+            for col in range(8):
+                phash = (phash << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+        img.thumbnail((MEDIA_MAX_SIDE, MEDIA_MAX_SIDE))
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=80)
+        return out.getvalue(), phash
+
+
+class _PhashIndex:
+    """Zuletzt bewertete Bilder (dHash → Urteil); Suche per Hamming-Abstand."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._items: "OrderedDict[int, dict]" = OrderedDict()
+
+    def find(self, phash: int, max_distance: int):
+        best, best_d = None, max_distance + 1
+        for h, verdict in self._items.items():
+            d = (h ^ phash).bit_count()
+            if d < best_d:
+                best, best_d = h, d
+                if d == 0:
+                    break
+        if best is None:
+            return None
+        self._items.move_to_end(best)
+        return self._items[best]
+
+    def add(self, phash: int, verdict: dict) -> None:
+        self._items[phash] = verdict
+        self._items.move_to_end(phash)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+_phashes = _PhashIndex(MEDIA_PHASH_MAX)
+_media_stats = {"downloads": 0, "bytes_in": 0, "bytes_out": 0, "near_duplicates": 0,
+                "vision_requests": 0, "vision_images": 0, "vision_fallbacks": 0, "url_fallbacks": 0}
+
+
+class VisionBatcher:
+    """Sammelt verkleinerte Bilder und bewertet bis zu max_items in einem Vision-Request."""
+
+    def __init__(self, window_s: float, max_items: int):
+        self.window_s = window_s
+        self.max_items = max(1, max_items)
+        self._items: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+    def submit(self, image_url: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._items.append((image_url, fut))
+        if self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+        if len(self._items) >= self.max_items:
+            self._flush()
+        return fut
+
+    def _flush(self) -> None:
+        items, self._items = self._items, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if items:
+            asyncio.get_running_loop().create_task(self._send(items))
+
+    async def _send(self, items) -> None:
+        _media_stats["vision_requests"] += 1
+        _media_stats["vision_images"] += len(items)
+        try:
+            results = await ai_moderate_images([url for url, _ in items], detail="low")
+        except Exception as e:
+            if len(items) == 1:   # war schon der Einzelaufruf
+                results = [None]
+            else:
+                logger.info(f"Vision-Batch ({len(items)}) fehlgeschlagen, einzeln weiter: {e}")
+                _media_stats["vision_fallbacks"] += 1
+                results = await asyncio.gather(*(ai_moderate_image(url, detail="low") for url, _ in items),
+                                               return_exceptions=True)
+        for (_, fut), result in zip(items, results):
+            if not fut.done():
+                fut.set_result(None if isinstance(result, BaseException) else result)
+
+
+_vision = VisionBatcher(MEDIA_BATCH_WINDOW_MS / 1000.0, MEDIA_BATCH_MAX)
+
+
+def get_media_stats() -> dict:
+    return dict(_media_stats, phashes=len(_phashes._items), pillow=Image is not None)
+
+
+metrics.gauge("moderation_media", lambda: {k: v for k, v in get_media_stats().items() if k != "pillow"})
+
+
+async def _judge_media(bot, media) -> dict | None:
+    f = await bot.get_file(media.file_id)
+    size = getattr(f, "file_size", None) or getattr(media, "file_size", None) or 0
+    if Image is None or size > MEDIA_MAX_BYTES:
+        _media_stats["url_fallbacks"] += 1
+        return await ai_moderate_image(f.file_path)   # Telegram CDN URL
+    data = bytes(await f.download_as_bytearray())     # über den HTTP-Pool des Bots
+    _media_stats["downloads"] += 1
+    _media_stats["bytes_in"] += len(data)
+    try:
+        small, phash = await asyncio.to_thread(_prepare_image, data)
+    except Exception as e:
+        logger.debug(f"Bild nicht lesbar ({media.file_unique_id}): {e}")
+        _media_stats["url_fallbacks"] += 1
+        return await ai_moderate_image(f.file_path)
+    near = _phashes.find(phash, MEDIA_PHASH_DISTANCE)
+    if near is not None:
+        _media_stats["near_duplicates"] += 1
+        return near
+    _media_stats["bytes_out"] += len(small)
+    verdict = await _vision.submit("data:image/jpeg;base64," + base64.b64encode(small).decode("ascii"))
+    if verdict is not None:
+        _phashes.add(phash, verdict)
+    return verdict
+
+
+async def moderate_media(bot, media) -> dict | None:
+    """Vision-Urteil für ein Foto/Sticker/Thumbnail: erst file_unique_id-Cache, dann Pipeline."""
+    file_unique_id = getattr(media, "file_unique_id", None)
+    if not file_unique_id:
+        return await _judge_media(bot, media)
+    return await _cached(KIND_MEDIA, file_unique_id, lambda: _judge_media(bot, media))
@@ -5,7 +5,7 @@ import re
 from telegram.constants import ChatType
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler, filters
-from database import save_mood, get_mood_counts, get_mood_question, set_mood_topic, get_mood_topic
+from database import save_mood, get_mood_counts, get_mood_question, set_mood_topic, get_mood_topic, _run_in_db_executor
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +14,8 @@ async def _call_db(fn, *args, **kwargs):
     try:
         if inspect.iscoroutinefunction(fn):
             return await fn(*args, **kwargs)
-        return await asyncio.to_thread(fn, *args, **kwargs)
+        # gemeinsamer DB-Executor (begrenzt auf Poolgröße) statt Default-Threadpool
+        return await _run_in_db_executor(fn, *args, **kwargs)
     except Exception:
         logger.exception("DB-Aufruf fehlgeschlagen: %s", getattr(fn, "__name__", fn))
         raise
@@ -0,0 +1,173 @@
+"""
+Kompilierte, unveränderliche Policy-Objekte für Link-, Spam- und KI-Moderation.
+
+database.py baut sie einmal je (chat_id, topic_id) aus den Settings-Zeilen und legt sie im
+ChatConfig-Cache ab; neu gebaut wird erst, wenn ein Setter den Chat invalidiert. Domainlisten
+sind vorab normalisiert (frozenset), Schwellen/Limits als float/int geparst – der Hot-Path
+liest nur noch Attribute. .get()/[] bleiben für bestehende Aufrufer (Menü, Befehle) erhalten.
+"""
+import itertools
+from urllib.parse import urlparse
+
+_versions = itertools.count(1)
+
+
+def normalize_domain(value) -> str:
+    """'https://WWW.Example.com/x' / '*.example.com' / '.example.com' → 'example.com'."""
+    d = str(value or "").strip().lower()
+    if not d:
+        return ""
+    if "://" in d:
+        d = urlparse(d).netloc
+    d = d.split("/", 1)[0].split(":", 1)[0]
+    if d.startswith("*."):
+        d = d[2:]
+    d = d.strip(".")
+    if d.startswith("www."):
+        d = d[4:]
+    return d
+
+
+def domain_set(values) -> frozenset:
+    return frozenset(d for d in (normalize_domain(v) for v in (values or ())) if d)
+
+
+def domain_in(host: str, domains: frozenset) -> bool:
+    """host oder eine seiner Elterndomains steht in domains (a.b.example.com → example.com)."""
+    if not domains or not host:
+        return False
+    while True:
+        if host in domains:
+            return True
+        i = host.find(".")
+        if i < 0:
+            return False
+        host = host[i + 1:]
+
+
+def _int(v, default: int = 0) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(v, default: float) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Policy:
+    """Basis: eingefrorene Slots + dict-kompatibler Lesezugriff."""
+    __slots__ = ("version",)
+    _fields: tuple = ()
+
+    def __init__(self, **values):
+        for name in self._fields:
+            object.__setattr__(self, name, values[name])
+        object.__setattr__(self, "version", next(_versions))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} ist unveränderlich")
+
+    __delattr__ = __setattr__
+
+    def get(self, key: str, default=None):
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key: str):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(v{self.version}, {self.as_dict()!r})"
+
+
+class LinkPolicy(_Policy):
+    _fields = ("admins_only", "warning_text", "whitelist", "blacklist", "action")
+    __slots__ = _fields
+
+    def is_blacklisted(self, host: str) -> bool:
+        return domain_in(host, self.blacklist)
+
+    def is_whitelisted(self, host: str) -> bool:
+        return domain_in(host, self.whitelist)
+
+
+class SpamPolicy(_Policy):
+    _fields = ("level", "link_whitelist", "domain_blacklist",
+               "emoji_max_per_msg", "emoji_max_per_min", "max_msgs_per_10s",
+               "per_user_daily_limit", "quota_notify", "only_admin_links",
+               "action_primary", "action_secondary", "escalation_threshold")
+    __slots__ = _fields
+
+
+class AiModPolicy(_Policy):
+    _fields = ("enabled", "shadow_mode", "model", "lang",
+               "tox_thresh", "hate_thresh", "sex_thresh", "harass_thresh", "selfharm_thresh", "violence_thresh",
+               "link_risk_thresh", "action_primary", "action_secondary",
+               "escalate_after", "escalate_action", "mute_minutes",
+               "exempt_admins", "exempt_topic_owner", "max_calls_per_min", "cooldown_s",
+               "warn_text", "appeal_url",
+               "visual_nudity_thresh", "visual_violence_thresh", "visual_weapons_thresh", "block_sexual_minors",
+               "strike_points_per_hit", "strike_mute_threshold", "strike_ban_threshold", "strike_decay_days")
+    __slots__ = _fields
+
+
+_AI_THRESHOLDS = ("tox_thresh", "hate_thresh", "sex_thresh", "harass_thresh", "selfharm_thresh",
+                  "violence_thresh", "link_risk_thresh", "visual_nudity_thresh",
+                  "visual_violence_thresh", "visual_weapons_thresh")
+_AI_INTS = ("escalate_after", "mute_minutes", "max_calls_per_min", "cooldown_s",
+            "strike_points_per_hit", "strike_mute_threshold", "strike_ban_threshold", "strike_decay_days")
+
+
+def compile_link_policy(admins_only: bool, warning_text: str, whitelist, blacklist, action) -> LinkPolicy:
+    return LinkPolicy(
+        admins_only=bool(admins_only),
+        warning_text=warning_text,
+        whitelist=domain_set(whitelist),
+        blacklist=domain_set(blacklist),
+        action=str(action or "delete").lower(),
+    )
+
+
+def compile_spam_policy(merged: dict) -> SpamPolicy:
+    return SpamPolicy(
+        level=str(merged.get("level") or "off"),
+        link_whitelist=domain_set(merged.get("link_whitelist")),
+        domain_blacklist=domain_set(merged.get("domain_blacklist")),
+        emoji_max_per_msg=_int(merged.get("emoji_max_per_msg")),
+        emoji_max_per_min=_int(merged.get("emoji_max_per_min")),
+        max_msgs_per_10s=_int(merged.get("max_msgs_per_10s")),
+        per_user_daily_limit=_int(merged.get("per_user_daily_limit")),
+        quota_notify=str(merged.get("quota_notify") or "smart").lower(),
+        only_admin_links=bool(merged.get("only_admin_links")),
+        action_primary=str(merged.get("action_primary") or "delete").lower(),
+        action_secondary=str(merged.get("action_secondary") or "none").lower(),
+        escalation_threshold=_int(merged.get("escalation_threshold"), 3),
+    )
+
+
+def compile_ai_mod_policy(merged: dict, defaults: dict) -> AiModPolicy:
+    values = {name: merged.get(name, defaults.get(name)) for name in AiModPolicy._fields}
+    for name in _AI_THRESHOLDS:
+        values[name] = _float(values[name], float(defaults[name]))
+    for name in _AI_INTS:
+        values[name] = _int(values[name], int(defaults[name]))
+    for name in ("enabled", "shadow_mode", "exempt_admins", "exempt_topic_owner", "block_sexual_minors"):
+        values[name] = bool(values[name])
+    for name in ("action_primary", "action_secondary", "escalate_action"):
+        values[name] = str(values[name] or defaults[name]).lower()
+    return AiModPolicy(**values)
@@ -0,0 +1,225 @@
+"""
+Lokaler Vorfilter vor der KI-Moderation (nur CPU, kein Netzwerk).
+
+ai_moderation_enforcer fragt ihn vor jedem API-Aufruf. Ergebnis:
+  SAFE      – eindeutig harmlos (kurz, nur Emoji/Zahlen/bekannte Floskeln wie „ok“, „danke“,
+              oder Zeichenwiederholung wie „hahaha“; keine Links/Erwähnungen) → keine API
+  BAD       – eindeutig schlecht (bekannter Hash oder schwerer Lexikon-Treffer) → keine API,
+              Kategorie/Score gehen in dieselbe Schwellenprüfung wie KI-Scores
+  UNCERTAIN – alles andere → Moderations-API (über Cache/Batcher in moderation.py)
+
+Merkmale: Lexika je Sprache (PREFILTER_LEXICON_FILE ergänzt sie per JSON:
+{"rules": {sprache: [[muster, kategorie, score, schwer], …]}, "benign": {sprache: [wort, …]}}), heuristic_link_risk,
+Länge/Entropie und eine Liste bekannter schlechter Text-Hashes (Tabelle moderation_bad_hashes,
+befüllt mit Texten, die die Moderations-API als flagged meldet). Die Tabelle ist maßgeblich:
+jeder Refresh ersetzt die Liste, in der DB gelöschte Hashes greifen danach nicht mehr; nur noch
+nicht gespeicherte lokale Einträge bleiben erhalten. Zähler je Chat zeigen, welcher
+Anteil die API übersprungen hat.
+"""
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import logging
+from collections import Counter
+import metrics
+from database import _call_db, load_bad_hashes, add_bad_hash
+from utils import heuristic_link_risk
+from moderation import normalize_text as normalize
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_ENABLED = (os.getenv("PREFILTER", "1").strip().lower() not in ("0", "false", "no", "off"))
+# bis zu dieser Länge (normalisiert) gilt eine unauffällige Nachricht als eindeutig harmlos
+PREFILTER_SAFE_MAX_LEN = int(os.getenv("PREFILTER_SAFE_MAX_LEN", "40"))
+# Zeichenwiederholungen („hahaha“, „!!!!“) unter dieser Entropie (Bit/Zeichen) gelten als harmlos
+PREFILTER_REPEAT_ENTROPY = float(os.getenv("PREFILTER_REPEAT_ENTROPY", "1.6"))
+PREFILTER_LEXICON_FILE = os.getenv("PREFILTER_LEXICON_FILE")
+PREFILTER_HASH_REFRESH_S = float(os.getenv("PREFILTER_HASH_REFRESH_S", "600"))
+
+SAFE = "safe"
+BAD = "bad"
+UNCERTAIN = "uncertain"
+
+# (Muster, Kategorie, Score, schwer?) – schwer: allein schon BAD, sonst nur UNCERTAIN
+_LEXICON_SOURCE = {
+    "*": [
+        (r"\b(free|gratis)\s+(btc|bitcoin|eth|usdt|crypto)\b", "link_risk", 0.95, True),
+        (r"\b(double|verdopple)\s+(your|deine?n?)\s+(btc|bitcoin|eth|crypto|krypto|investment)", "link_risk", 0.95, True),
+        (r"\bonlyfans\b|\bnudes?\b", "sexual", 0.6, False),
+        (r"\bt\.me/\+|\bjoinchat/", "link_risk", 0.5, False),
+    ],
+    "de": [
+        (r"\b(verdiene?|verdienen)\s+\d+\s*(€|euro)\s+(am|pro)\s+tag\b", "link_risk", 0.95, True),
+        (r"\bich\s+bring\s+dich\s+um\b|\bich\s+töte\s+dich\b", "violence", 0.95, True),
+        (r"\bbring\s+dich\s+um\b", "selfharm", 0.9, True),
+        (r"\b(hurensohn|wichser|fotze)\b", "toxicity", 0.8, False),
+    ],
+    "en": [
+        (r"\bearn\s+\$?\d+\s*(\$|usd|dollars?)?\s+(a|per)\s+day\b", "link_risk", 0.95, True),
+        (r"\bi\s+(will|'ll)\s+kill\s+you\b", "violence", 0.95, True),
+        (r"\bkill\s+yourself\b|\bkys\b", "selfharm", 0.9, True),
+        (r"\b(motherfucker|cunt)\b", "toxicity", 0.8, False),
+    ],
+}
+
+# Wörter, aus denen eine eindeutig harmlose Kurznachricht bestehen darf
+_BENIGN_SOURCE = {
+    "*": ["ok", "okay", "k", "lol", "xd", "haha", "hahaha", "hi", "hey", "yes", "no", "gg", "top", "nice", "cool", "super"],
+    "de": ["ja", "nein", "danke", "dankeschön", "bitte", "hallo", "moin", "servus", "gut", "genau", "stimmt",
+           "klar", "gerne", "guten", "morgen", "abend", "tag", "nacht", "gute", "alles", "dir", "auch", "mir", "sehr"],
+    "en": ["thanks", "thank", "you", "thx", "hello", "good", "morning", "night", "great", "sure", "yeah", "yep",
+           "nope", "right", "agreed", "me", "too", "welcome"],
+}
+
+_MENTION_RE = re.compile(r"@\w{4,}")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _compile(source: dict) -> dict:
+    out = {}
+    for lang, rules in source.items():
+        out[lang] = [(re.compile(p, re.I), cat, float(score), bool(severe)) for p, cat, score, severe in rules]
+    return out
+
+
+def _load_lexicon() -> tuple[dict, dict]:
+    source = {lang: list(rules) for lang, rules in _LEXICON_SOURCE.items()}
+    benign = {lang: set(words) for lang, words in _BENIGN_SOURCE.items()}
+    if PREFILTER_LEXICON_FILE:
+        try:
+            with open(PREFILTER_LEXICON_FILE, encoding="utf-8") as f:
+                extra = json.load(f)
+            for lang, rules in (extra.get("rules") or {}).items():
+                source.setdefault(lang, []).extend(tuple(r) for r in rules)
+            for lang, words in (extra.get("benign") or {}).items():
+                benign.setdefault(lang, set()).update(w.casefold() for w in words)
+        except Exception as e:
+            logger.error(f"Vorfilter-Lexikon {PREFILTER_LEXICON_FILE} nicht lesbar: {e}")
+    return _compile(source), {lang: frozenset(words) for lang, words in benign.items()}
+
+
+_LEXICON, _BENIGN = _load_lexicon()
+
+# Hash → (Kategorie, Score) der ursprünglichen Modell-Meldung
+_bad_hashes: dict[str, tuple[str, float]] = {}
+_bad_hashes_loaded_at = 0.0
+# lokal gemerkt, aber (noch) nicht in moderation_bad_hashes – überlebt den Refresh
+_unsaved: dict[str, tuple[str, float]] = {}
+_chat_counters: dict[int, Counter] = {}
+_totals = Counter()
+
+metrics.gauge("moderation_prefilter", lambda: dict(_totals, bad_hashes=len(_bad_hashes), unsaved_hashes=len(_unsaved)))
+
+
+def content_hash(text: str) -> str:
+    """Modellunabhängiger Hash des normalisierten Texts (Liste bekannter schlechter Inhalte)."""
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+def entropy(text: str) -> float:
+    """Shannon-Entropie in Bit pro Zeichen."""
+    if not text:
+        return 0.0
+    n = len(text)
+    return -sum(c / n * math.log2(c / n) for c in Counter(text).values())
+
+
+class Verdict:
+    __slots__ = ("decision", "category", "score", "reason")
+
+    def __init__(self, decision: str, category: str | None = None, score: float = 0.0, reason: str = ""):
+        self.decision = decision
+        self.category = category
+        self.score = score
+        self.reason = reason
+
+
+def classify(text: str, lang: str = "de", domains=None, link_score: float | None = None) -> Verdict:
+    """SAFE / BAD / UNCERTAIN für einen Text (rein lokal)."""
+    norm = normalize(text)
+    if not norm:
+        return Verdict(SAFE, reason="leer")
+    known = _bad_hashes.get(content_hash(text))
+    if known is not None:
+        # Score des Modells übernehmen → die Schwellen des Chats entscheiden wie beim API-Ergebnis
+        return Verdict(BAD, known[0], known[1], "bekannter Hash")
+
+    weak = None
+    for rule_lang in ("*", lang):
+        for pattern, cat, score, severe in _LEXICON.get(rule_lang, ()):
+            if pattern.search(norm):
+                if severe:
+                    return Verdict(BAD, cat, score, f"Lexikon {rule_lang}: {pattern.pattern}")
+                weak = weak or Verdict(UNCERTAIN, cat, score, f"Lexikon {rule_lang}")
+    if weak is not None:
+        return weak
+
+    if link_score is None:
+        link_score = heuristic_link_risk(domains or [])
+    if domains or link_score > 0:
+        return Verdict(UNCERTAIN, reason="Links")
+    if _MENTION_RE.search(norm):
+        return Verdict(UNCERTAIN, reason="Erwähnung")
+    if len(norm) > PREFILTER_SAFE_MAX_LEN:
+        return Verdict(UNCERTAIN, reason="lang")
+    compact = norm.replace(" ", "")
+    if len(compact) >= 4 and entropy(compact) < PREFILTER_REPEAT_ENTROPY:
+        return Verdict(SAFE, reason="Wiederholung")
+    benign = _BENIGN.get("*", frozenset()) | _BENIGN.get(lang, frozenset())
+    if all(w.isdigit() or w in benign for w in _WORD_RE.findall(norm)):
+        return Verdict(SAFE, reason="Floskel/Emoji")
+    return Verdict(UNCERTAIN, reason="Freitext")
+
+
+def record(chat_id: int, decision: str) -> None:
+    _chat_counters.setdefault(chat_id, Counter())[decision] += 1
+    _totals[decision] += 1
+
+
+def get_chat_stats(chat_id: int | None = None) -> dict:
+    """Zähler (safe/bad/uncertain) und Anteil ohne API – für einen Chat oder gesamt."""
+    c = _totals if chat_id is None else _chat_counters.get(chat_id, Counter())
+    total = sum(c[k] for k in (SAFE, BAD, UNCERTAIN))
+    skipped = c[SAFE] + c[BAD]
+    return {SAFE: c[SAFE], BAD: c[BAD], UNCERTAIN: c[UNCERTAIN], "total": total,
+            "skipped_share": (skipped / total) if total else 0.0}
+
+
+async def refresh_bad_hashes(force: bool = False) -> None:
+    """Liste bekannter schlechter Hashes aus der DB nachladen (höchstens alle PREFILTER_HASH_REFRESH_S)."""
+    global _bad_hashes, _bad_hashes_loaded_at
+    now = time.monotonic()
+    if not force and _bad_hashes_loaded_at and now - _bad_hashes_loaded_at < PREFILTER_HASH_REFRESH_S:
+        return
+    _bad_hashes_loaded_at = now
+    for h, (category, score) in list(_unsaved.items()):
+        await _save(h, category, score)
+    try:
+        loaded = await _call_db(load_bad_hashes)
+    except Exception as e:
+        logger.warning(f"moderation_bad_hashes nicht lesbar: {e}")
+        return
+    # ersetzen statt mischen: in der DB gelöschte Hashes fallen heraus
+    _bad_hashes = {**loaded, **_unsaved}
+
+
+async def _save(h: str, category: str, score: float) -> None:
+    _unsaved[h] = (category, score)
+    try:
+        await _call_db(add_bad_hash, h, category, score)
+    except Exception as e:
+        logger.debug(f"moderation_bad_hashes nicht schreibbar: {e}")
+        return
+    _unsaved.pop(h, None)
+
+
+async def remember_bad(text: str, category: str, score: float) -> None:
+    """Text als bekannt schlecht merken (nur der Hash, nie der Text)."""
+    h = content_hash(text)
+    if h in _bad_hashes:
+        return
+    _bad_hashes[h] = (category, score)
+    await _save(h, category, score)
@@ -4,7 +4,6 @@ import logging
 import csv
 import json
 from psycopg2.extras import Json
-from openai import OpenAI
 from collections import Counter
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
@@ -13,36 +12,27 @@ from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters,
 from telethon_client import telethon_client
 from telethon.tl.functions.channels import GetFullChannelRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from database import (_with_cursor, _db_pool, record_reply_time, get_group_language, migrate_stats_rollup, compute_agg_group_day, 
-upsert_agg_group_day, get_agg_summary, get_heatmap, get_agg_rows, get_group_stats, get_top_responders
+from database import (_with_cursor, _with_analytics_cursor, _db_pool, _call_db, _call_analytics, borrow_connection, with_db_priority, PRIO_BACKGROUND, _write_behind, _utcnow, register_migration, register_backfill, record_reply_time, get_group_language, migrate_stats_rollup, compute_agg_group_day, 
+upsert_agg_group_day, get_agg_summary, get_heatmap, get_agg_rows, get_group_stats, get_top_responders,
+create_message_logs
 )
 from translator import translate_hybrid
+import ai_client
+import write_buffer
+import archive
 
 
 logger = logging.getLogger(__name__)
 
-# OpenAI-Client initialisieren (oder None, wenn kein Key gesetzt)
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-if OPENAI_KEY:
-    openai_client = OpenAI(api_key=OPENAI_KEY)
-else:
-    openai_client = None
+# KI-Aufrufe laufen über den gemeinsamen Client in ai_client.py
+if not ai_client.available():
     print("[Warnung] OPENAI_API_KEY nicht gesetzt – Sentiment/Summary deaktiviert.")
 
-# Hilfsfunktion für rohe DB-Verbindung
-def get_db_connection():
-    conn = _db_pool.getconn()
-    conn.autocommit = True
-    return conn
-
+# Hilfsfunktion für rohe DB-Verbindung (gemessen, autocommit wird bei Rückgabe zurückgesetzt)
 def get_cursor():
-    conn = _db_pool.getconn()
-    conn.autocommit = True
-    try:
+    with borrow_connection("get_cursor", autocommit=True) as conn:
         with conn.cursor() as cur:
             yield cur
-    finally:
-        _db_pool.putconn(conn)
 
 # Deine Developer-IDs für globale Metriken
 raw = os.getenv("DEVELOPER_CHAT_IDS", "")
@@ -59,8 +49,7 @@ if not DEVELOPER_IDS:
 async def fetch_and_store_stats(chat_username: str):
     """Fragt via Telethon ab und speichert Mitglieder+Admins in daily_stats."""
     full = await telethon_client(GetFullChannelRequest(chat_username))
-    conn = get_db_connection()
-    with conn.cursor() as cur:
+    with borrow_connection("fetch_and_store_stats", autocommit=True) as conn, conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO daily_stats (chat_id, stat_date, members, admins)
@@ -75,7 +64,6 @@ async def fetch_and_store_stats(chat_username: str):
                 len(full.full_chat.admin_rights or [])
             )
         )
-    _db_pool.putconn(conn)
 
 # Scheduler für nächtliche Abfragen
 def schedule_telethon_jobs(chat_usernames: list[str]):
@@ -136,23 +124,8 @@ def init_stats_db(cur):
     
     # 3) Message-Logging für Dev-Dashboard
     # Erstelle oder passe message_logs an, damit sowohl chat_id als auch group_id unterstützt werden.
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS message_logs (
-            chat_id     BIGINT,
-            message_id  BIGINT,
-            user_id     BIGINT,
-            content     TEXT,
-            is_photo    BOOLEAN DEFAULT FALSE,
-            is_video    BOOLEAN DEFAULT FALSE,
-            is_sticker  BOOLEAN DEFAULT FALSE,
-            is_voice    BOOLEAN DEFAULT FALSE,
-            is_location BOOLEAN DEFAULT FALSE,
-            is_reply    BOOLEAN DEFAULT FALSE,
-            timestamp   TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-    )
+    # Neu wird sie gleich partitioniert angelegt (create_message_logs), Alt-Tabellen nur ergänzt.
+    create_message_logs(cur)
     # Stelle sicher, dass die Spalte timestamp existiert (für alte Tabellen ohne timestamp)
     cur.execute(
         "ALTER TABLE message_logs ADD COLUMN IF NOT EXISTS timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP;"
@@ -164,18 +137,12 @@ def init_stats_db(cur):
     # Flags hinzufügen, falls nicht vorhanden
     for col in ['is_photo', 'is_video', 'is_sticker', 'is_voice', 'is_location', 'is_reply']:
         cur.execute(f"ALTER TABLE message_logs ADD COLUMN IF NOT EXISTS {col} BOOLEAN DEFAULT FALSE;")
-    # Vorhandene chat_id-Werte in group_id kopieren
-    cur.execute(
-        "UPDATE message_logs SET group_id = chat_id WHERE group_id IS NULL;"
-    )
+    # Vorhandene chat_id-Werte in group_id kopieren → Backfill „message_logs_group_id“
     # Spalte last_message_time ergänzen, sofern nötig (für Dev-Dashboard-Inaktive Benutzer)
     cur.execute(
         "ALTER TABLE message_logs ADD COLUMN IF NOT EXISTS last_message_time TIMESTAMPTZ;"
     )
-    # Werte initialisieren: last_message_time = timestamp
-    cur.execute(
-        "UPDATE message_logs SET last_message_time = timestamp WHERE last_message_time IS NULL;"
-    )
+    # Werte initialisieren: last_message_time = timestamp → Backfill „message_logs_last_message_time“
     # Index auf group_id anlegen
     cur.execute(
         "CREATE INDEX IF NOT EXISTS idx_message_logs_group ON message_logs(group_id);"
@@ -234,6 +201,12 @@ def init_stats_db(cur):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_auto_responses_chat_ts ON auto_responses(chat_id, ts DESC);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_auto_responses_trigger ON auto_responses(chat_id, trigger);")
 
+register_migration(8, "stats_schema", init_stats_db)
+register_backfill("message_logs_group_id", "message_logs",
+                  "group_id = chat_id", "group_id IS NULL")
+register_backfill("message_logs_last_message_time", "message_logs",
+                  "last_message_time = timestamp", "last_message_time IS NULL")
+
 # --- Befehls-Logging ---
 @_with_cursor
 def log_command(cur, chat_id: int, user_id: int, command: str):
@@ -253,7 +226,7 @@ def get_all_group_ids(cur):
     cur.execute("SELECT chat_id FROM group_settings")
     return [row[0] for row in cur.fetchall()]
 
-@_with_cursor
+@_with_analytics_cursor
 def get_active_users_count(cur, chat_id: int, start_date: datetime, end_date: datetime) -> int:
     cur.execute(
         "SELECT COUNT(DISTINCT user_id) FROM daily_stats WHERE chat_id = %s AND stat_date BETWEEN %s AND %s;",
@@ -262,7 +235,7 @@ def get_active_users_count(cur, chat_id: int, start_date: datetime, end_date: da
     result = cur.fetchone()[0]
     return result or 0
 
-@_with_cursor
+@_with_analytics_cursor
 def get_command_usage(cur, chat_id: int, start_date: datetime, end_date: datetime):
     cur.execute(
         "SELECT command, COUNT(*) AS count FROM command_logs "
@@ -270,9 +243,17 @@ def get_command_usage(cur, chat_id: int, start_date: datetime, end_date: datetim
         "GROUP BY command ORDER BY count DESC;",
         (chat_id, start_date.date(), end_date.date())
     )
-    return cur.fetchall()
+    rows = cur.fetchall()
+    # archivierte Befehle (Cold Storage) mitzählen
+    extra = archive.count_archived(
+        "command_logs", chat_id, start_date.date(), end_date.date() + timedelta(days=1), "command",
+    )
+    if extra:
+        extra.update(dict(rows))
+        rows = extra.most_common()
+    return rows
 
-@_with_cursor
+@_with_analytics_cursor
 def get_command_logs(cur, chat_id: int, start_date: datetime, end_date: datetime):
     cur.execute(
         "SELECT user_id, command, used_at FROM command_logs "
@@ -283,7 +264,7 @@ def get_command_logs(cur, chat_id: int, start_date: datetime, end_date: datetime
     return [{"user_id": u, "command": c, "timestamp": t.isoformat()} 
             for u, c, t in cur.fetchall()]
 
-@_with_cursor
+@_with_analytics_cursor
 def get_activity_by_weekday(cur, chat_id: int, start_date: datetime, end_date: datetime):
     cur.execute(
         "SELECT EXTRACT(DOW FROM stat_date) AS weekday, SUM(messages) AS total "
@@ -294,7 +275,7 @@ def get_activity_by_weekday(cur, chat_id: int, start_date: datetime, end_date: d
     )
     return cur.fetchall()
 
-@_with_cursor
+@_with_analytics_cursor
 def get_top_groups(cur, start_date: datetime, end_date: datetime, limit: int = 5):
     cur.execute(
         "SELECT chat_id, SUM(messages) AS total_msgs FROM daily_stats "
@@ -304,6 +285,34 @@ def get_top_groups(cur, start_date: datetime, end_date: datetime, limit: int = 5
     )
     return cur.fetchall()
 
+# --- Write-behind: message_logs / spam_events ---
+write_buffer.register_table(
+    "message_logs",
+    """
+    INSERT INTO message_logs
+      (chat_id, group_id, topic_id, message_id, user_id, content,
+       is_photo, is_video, is_sticker, is_voice,
+       is_location, is_reply, timestamp, last_message_time)
+    VALUES %s
+    ON CONFLICT DO NOTHING;
+    """,
+)
+write_buffer.register_table(
+    "spam_events",
+    "INSERT INTO spam_events (chat_id, user_id, rule, action, details, ts) VALUES %s;",
+)
+
+def _message_log_row(chat_id: int, msg) -> tuple:
+    # Werte sofort aus dem Message-Objekt ziehen (der Puffer hält keine Telegram-Objekte)
+    ts = _utcnow()
+    return (
+        msg.chat.id, msg.chat.id, getattr(msg, "message_thread_id", None), msg.message_id,
+        (msg.from_user.id if msg.from_user else None), msg.text or msg.caption or None,
+        bool(msg.photo), bool(msg.video), bool(msg.sticker), bool(msg.voice),
+        bool(getattr(msg, "location", None)), bool(msg.reply_to_message), ts, ts,
+    )
+
+@_write_behind("message_logs", _message_log_row)
 @_with_cursor
 def log_message(cur, chat_id: int, msg):
     text = msg.text or msg.caption or None
@@ -359,6 +368,8 @@ def log_poll_response(cur, chat_id: int, user_id: int, poll_id: int):
         (chat_id, user_id, poll_id)
     )
 
+@_write_behind("spam_events", lambda chat_id, user_id, rule, action, details=None: (
+    chat_id, user_id, rule, action, Json(details, dumps=json.dumps) if details is not None else None, _utcnow()))
 @_with_cursor
 def log_spam_event(cur, chat_id: int, user_id: int, rule: str, action: str, details: dict | None = None):
     cur.execute("""
@@ -380,7 +391,7 @@ def log_feature_interaction(cur, chat_id: int, user_id: int, feature: str, meta:
         VALUES (%s, %s, %s, %s);
     """, (chat_id, user_id, feature, Json(meta, dumps=json.dumps) if meta is not None else None))
 
-@_with_cursor
+@_with_analytics_cursor
 def get_ai_mod_logs_range(cur, chat_id:int, d0, d1):
     cur.execute("""
       SELECT ts, user_id, topic_id, category, score, action
@@ -388,13 +399,27 @@ def get_ai_mod_logs_range(cur, chat_id:int, d0, d1):
        WHERE chat_id=%s AND DATE(ts) BETWEEN %s AND %s
        ORDER BY ts ASC;
     """, (chat_id, d0, d1))
-    return cur.fetchall() or []
+    rows = cur.fetchall() or []
+    archived = archive.read_archived(
+        "ai_mod_logs", chat_id, d0, d1 + timedelta(days=1),
+    )
+    if archived:
+        rows = sorted(
+            [(r["ts"], r.get("user_id"), r.get("topic_id"), r.get("category"), r.get("score"), r.get("action"))
+             for r in archived] + list(rows),
+            key=lambda r: r[0]
+        )
+    return rows
 
 @_with_cursor
 def get_user_strikes_snapshot(cur, chat_id:int):
     cur.execute("SELECT user_id, points, updated FROM user_strikes WHERE chat_id=%s ORDER BY points DESC;", (chat_id,))
     return cur.fetchall() or []
 
+def _utc(ts: datetime) -> datetime:
+    # TIMESTAMP-Spalten speichern UTC ohne Zone; archive.* verlangt die Zone ausdrücklich
+    return ts.replace(tzinfo=ZoneInfo("UTC")) if ts.tzinfo is None else ts
+
 def _safe_user_id(m) -> int | None:
     u = getattr(m, "from_user", None)
     return u.id if u else None
@@ -472,7 +497,7 @@ async def reply_time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         chat_id = msg.chat.id
         orig = msg.reply_to_message
         # erste Antwort? – Optional: per Cache/Redis prüfen. Minimal: wir loggen jeden Reply.
-        log_reply_time(chat_id, orig, msg)
+        await _call_db(log_reply_time, chat_id, orig, msg)
     except Exception as e:
         logger.warning(f"reply_time_handler Fehler: {e}")
 
@@ -524,7 +549,7 @@ async def on_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TY
 async def universal_logger(update, context):
     msg = update.effective_message
     if msg:
-        log_message(msg.chat.id, msg)
+        await _call_db(log_message, msg.chat.id, msg)
         
 async def fetch_message_stats(chat_id: int, days: int = 7):
     if telethon_client is None:
@@ -682,14 +707,14 @@ async def analyze_sentiment(texts: list[str]):
     """
     Rückgabe: {'positive': x, 'neutral': y, 'negative': z}
     """
-    if not openai_client:
+    if not ai_client.available():
         return "⚠️ Sentiment nicht verfügbar"
     
     prompt = (
         "Analysiere die folgenden Texte und gib pro Text ‚positiv‘, ‚neutral‘ "
         "oder ‚negativ‘ aus:\n\n" + "\n\n".join(texts)
     )
-    resp = openai_client.chat.completions.create(
+    resp = await ai_client.chat(
         model="gpt-4o-mini",
         messages=[{"role":"user","content":prompt}],
         temperature=0
@@ -702,7 +727,7 @@ async def summarize_conversation(chat_id: int, days: int = 1):
     Holt die letzten Chat-Nachrichten und fasst sie in bis zu 5 Sätzen zusammen.
     """
     # Guard: OpenAI-Client prüfen
-    if not openai_client:
+    if not ai_client.available():
         return "⚠️ Zusammenfassung nicht verfügbar (kein API-Key)."
 
     # 1) Nachrichten sammeln
@@ -719,7 +744,7 @@ async def summarize_conversation(chat_id: int, days: int = 1):
     )
 
     # 3) OpenAI-Request mit neuer API
-    resp = await openai_client.chat.completions.create(
+    resp = await ai_client.chat(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3
@@ -727,40 +752,28 @@ async def summarize_conversation(chat_id: int, days: int = 1):
     # Je nach Response-Shape:
     return resp.choices[0].message.content
 
-async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat = update.effective_chat
-    bot  = context.bot
-    args = context.args or []
-
-    # range= today | yesterday | 7d | 30d  (Default: 7d)
-    params = {k: v for a in args if "=" in a for k, v in [a.split("=", 1)]}
-    key = params.get("range", "7d")
-    tz  = "Europe/Berlin"
-    d0, d1 = _range_for_key(key, tz)
-    ts_start = datetime.combine(d0, datetime.min.time())
-    ts_end   = datetime.combine(d1 + timedelta(days=1), datetime.min.time())
-
+def _build_stats_csv(chat_id: int, key: str, d0, d1, ts_start: datetime, ts_end: datetime) -> str:
+    """Sammelt alle Export-Daten (DB + Cold Storage) und schreibt die CSV; läuft auf dem Analytics-Executor."""
     # --- 1) Tages-Rollups & Top-Responder
-    rows = get_agg_rows(chat.id, d0, d1)
-    top  = get_top_responders(chat.id, d0, d1, limit=10)
+    rows = get_agg_rows(chat_id, d0, d1)
+    top  = get_top_responders(chat_id, d0, d1, limit=10)
 
     # --- 2) Command-Usage
-    cmd_usage = get_command_usage(chat.id, ts_start, ts_end)
+    cmd_usage = get_command_usage(chat_id, ts_start, ts_end)
 
     # --- 3) Engagement (Reply-Rate & Ø-Delay)
-    engage = get_engagement_metrics(chat.id, ts_start, ts_end)
+    engage = get_engagement_metrics(chat_id, ts_start, ts_end)
 
     # --- 4) Message-Insights (Medientypen/Polls)
-    insights = get_message_insights(chat.id, ts_start, ts_end)
+    insights = get_message_insights(chat_id, ts_start, ts_end)
 
     # --- 5) Aktivität nach Wochentag
-    by_weekday = get_activity_by_weekday(chat.id, ts_start, ts_end)  # [(dow, total), ...]
+    by_weekday = get_activity_by_weekday(chat_id, ts_start, ts_end)  # [(dow, total), ...]
 
     # --- 6) Stundenverteilung (0..23) + weitere DB-Queries
     #    Spam-Events (rule/action), Night-Events (kind), Member-Events (event), Top-Poster
     from psycopg2.extras import DictCursor
-    conn = get_db_connection()
-    try:
+    with borrow_connection("export_stats_csv_command", autocommit=True, pool_name="analytics") as conn:
         cur = conn.cursor(cursor_factory=DictCursor)
 
         cur.execute("""
@@ -768,7 +781,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             FROM message_logs
             WHERE group_id=%s AND timestamp BETWEEN %s AND %s
             GROUP BY 1 ORDER BY 1
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         by_hour = cur.fetchall() or []
 
         # NEU: Wochentag×Stunde
@@ -780,7 +793,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             WHERE group_id=%s AND timestamp BETWEEN %s AND %s
             GROUP BY 1,2
             ORDER BY 1,2
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         by_wd_hour = cur.fetchall() or []
 
         cur.execute("""
@@ -788,7 +801,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             FROM spam_events
             WHERE chat_id=%s AND ts BETWEEN %s AND %s
             GROUP BY rule ORDER BY cnt DESC
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         spam_by_rule = cur.fetchall() or []
 
         cur.execute("""
@@ -796,7 +809,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             FROM spam_events
             WHERE chat_id=%s AND ts BETWEEN %s AND %s
             GROUP BY action ORDER BY cnt DESC
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         spam_by_action = cur.fetchall() or []
 
         cur.execute("""
@@ -804,7 +817,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             FROM night_events
             WHERE chat_id=%s AND ts BETWEEN %s AND %s
             GROUP BY kind ORDER BY cnt DESC
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         night_by_kind = cur.fetchall() or []
 
         cur.execute("""
@@ -812,7 +825,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             FROM member_events
             WHERE group_id=%s AND event_time BETWEEN %s AND %s
             GROUP BY event ORDER BY cnt DESC
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         member_by_event = cur.fetchall() or []
 
         cur.execute("""
@@ -822,7 +835,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             GROUP BY user_id
             ORDER BY msgs DESC
             LIMIT 20
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         top_posters = cur.fetchall() or []
 
         cur.execute("""
@@ -833,7 +846,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             GROUP BY trigger
             ORDER BY hits DESC
             LIMIT 20
-        """, (chat.id, ts_start, ts_end))
+        """, (chat_id, ts_start, ts_end))
         autoresp_by_trigger = cur.fetchall() or []
 
         # --- NEU: Inaktive Nutzer (14d / 30d) ---
@@ -845,7 +858,7 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             HAVING MAX(last_message_time) < NOW() - INTERVAL '14 days'
             ORDER BY last_seen ASC
             LIMIT 200
-        """, (chat.id,))
+        """, (chat_id,))
         inactive_14d = cur.fetchall() or []
 
         cur.execute("""
@@ -856,20 +869,37 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             HAVING MAX(last_message_time) < NOW() - INTERVAL '30 days'
             ORDER BY last_seen ASC
             LIMIT 200
-        """, (chat.id,))
+        """, (chat_id,))
         inactive_30d = cur.fetchall() or []
 
-    finally:
-        _db_pool.putconn(conn)
+
+    # --- Archivierte Zeiträume (Cold Storage) transparent ergänzen
+    spam_by_rule   = archive.merge_counts(spam_by_rule,
+                        archive.count_archived("spam_events", chat_id, _utc(ts_start), _utc(ts_end), "rule"), "rule")
+    spam_by_action = archive.merge_counts(spam_by_action,
+                        archive.count_archived("spam_events", chat_id, _utc(ts_start), _utc(ts_end), "action"), "action")
+    night_by_kind  = archive.merge_counts(night_by_kind,
+                        archive.count_archived("night_events", chat_id, _utc(ts_start), _utc(ts_end), "kind", weight="count"), "kind")
+    archived_ar = archive.read_archived("auto_responses", chat_id, _utc(ts_start), _utc(ts_end))
+    if archived_ar:
+        acc = {row["trigger"]: [int(row["hits"]), int(row["helpful"] or 0)] for row in autoresp_by_trigger}
+        for r in archived_ar:
+            hit = acc.setdefault(r.get("trigger"), [0, 0])
+            hit[0] += 1
+            hit[1] += 1 if r.get("was_helpful") is True else 0
+        autoresp_by_trigger = [
+            {"trigger": t, "hits": h, "helpful": hp}
+            for t, (h, hp) in sorted(acc.items(), key=lambda kv: kv[1][0], reverse=True)[:20]
+        ]
 
     # --- CSV schreiben
-    fname = f"/tmp/stats_{chat.id}_{d0.isoformat()}_{d1.isoformat()}.csv"
+    fname = f"/tmp/stats_{chat_id}_{d0.isoformat()}_{d1.isoformat()}.csv"
     with open(fname, "w", encoding="utf-8", newline="") as f:
         wr = csv.writer(f, delimiter=";")
 
         # Kopf: Metadaten
         wr.writerow(["chat_id", "range", "from", "to"])
-        wr.writerow([chat.id, key, d0.isoformat(), d1.isoformat()])
+        wr.writerow([chat_id, key, d0.isoformat(), d1.isoformat()])
 
         # 1) Tages-Rollups
         wr.writerow([])
@@ -985,34 +1015,57 @@ async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT
             wr.writerow([uid, getattr(last_seen, "isoformat", lambda: str(last_seen))()])
 
             # AI Moderation Logs
-        rows = get_ai_mod_logs_range(chat.id, d0, d1)
+        rows = get_ai_mod_logs_range(chat_id, d0, d1)
         wr.writerow(["ts","user_id","topic_id","category","score","action"])
         for ts, uid, tid, cat, sc, act in rows:
             wr.writerow([ts, uid, tid, cat, sc, act])
 
         # User Strikes Snapshot
-        rows = get_user_strikes_snapshot(chat.id)
+        rows = get_user_strikes_snapshot(chat_id)
         wr.writerow(["user_id","points","updated"])
         for uid, pts, upd in rows:
             wr.writerow([uid, pts, upd])
-        
+    return fname
+
+@with_db_priority(PRIO_BACKGROUND)
+async def export_stats_csv_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    bot  = context.bot
+    args = context.args or []
+
+    # range= today | yesterday | 7d | 30d  (Default: 7d)
+    params = {k: v for a in args if "=" in a for k, v in [a.split("=", 1)]}
+    key = params.get("range", "7d")
+    tz  = "Europe/Berlin"
+    d0, d1 = _range_for_key(key, tz)
+    ts_start = datetime.combine(d0, datetime.min.time())
+    ts_end   = datetime.combine(d1 + timedelta(days=1), datetime.min.time())
+
+    fname = await _call_analytics(_build_stats_csv, chat.id, key, d0, d1, ts_start, ts_end)
     await update.effective_message.reply_document(
         open(fname, "rb"),
         filename=f"stats_{chat.id}_{d0}_{d1}.csv"
     )
 
+def _load_stats_view(chat_id: int, d0, d1):
+    """Kacheln, Heatmap und Top-Responder für /stats in einer Runde auf dem Analytics-Executor."""
+    summary = get_agg_summary(chat_id, d0, d1)
+    heat = get_heatmap(chat_id, datetime.combine(d0, datetime.min.time()), datetime.combine(d1+timedelta(days=1), datetime.min.time()))
+    top = get_top_responders(chat_id, d0, d1, limit=5)
+    return summary, heat, top
+
 # --- Stats-Command ---
+@with_db_priority(PRIO_BACKGROUND)
 async def stats_command(update, context):
     chat = update.effective_chat
-    lang = get_group_language(chat.id) or 'de'
+    lang = await _call_db(get_group_language, chat.id) or 'de'
     # Standard: 7 Tage
     sel = "7d"
     tz = "Europe/Berlin"  # optional aus Gruppensettings
     d0, d1 = _range_for_key(sel, tz)
 
     # Summen/Kacheln laden
-    summary = get_agg_summary(chat.id, d0, d1)
-    heat = get_heatmap(chat.id, datetime.combine(d0, datetime.min.time()), datetime.combine(d1+timedelta(days=1), datetime.min.time()))
+    summary, heat, top = await _call_analytics(_load_stats_view, chat.id, d0, d1)
 
     text = (
         f"📊 <b>Statistiken</b> ({d0.strftime('%d.%m.%Y')}–{d1.strftime('%d.%m.%Y')})\n"
@@ -1033,7 +1086,6 @@ async def stats_command(update, context):
         f"{_render_heatmap_ascii(heat)}"
     )
     # Top-Responder separat anhängen
-    top = get_top_responders(chat.id, d0, d1, limit=5)
     top_lines = []
     for uid, answers, avg_ms in top:
         name = await _resolve_user_name(context.bot, chat.id, uid)
@@ -1065,6 +1117,7 @@ async def stats_command(update, context):
             parse_mode="HTML",
         )
 
+@with_db_priority(PRIO_BACKGROUND)
 async def stats_callback(update, context):
     query = update.callback_query
     data = query.data  # z.B. "123456_stats_range_7d"
@@ -1073,11 +1126,10 @@ async def stats_callback(update, context):
         cid = int(cid)
     except Exception:
         return
-    lang = get_group_language(cid) or 'de'
+    lang = await _call_db(get_group_language, cid) or 'de'
     tz = "Europe/Berlin"
     d0, d1 = _range_for_key(key, tz)
-    summary = get_agg_summary(cid, d0, d1)
-    heat = get_heatmap(cid, datetime.combine(d0, datetime.min.time()), datetime.combine(d1+timedelta(days=1), datetime.min.time()))
+    summary, heat, top = await _call_analytics(_load_stats_view, cid, d0, d1)
     text = (
         f"📊 <b>Statistiken</b> ({d0.strftime('%d.%m.%Y')}–{d1.strftime('%d.%m.%Y')})\n"
         f"\n<b>Engagement</b>"
@@ -1097,7 +1149,6 @@ async def stats_callback(update, context):
         f"{_render_heatmap_ascii(heat)}"
     )
     # Top-Responder separat + korrektes cid
-    top = get_top_responders(cid, d0, d1, limit=5)
     top_lines = []
     for uid, answers, avg_ms in top:
         name = await _resolve_user_name(context.bot, cid, uid)
@@ -1146,8 +1197,7 @@ async def get_group_meta(chat_id: int) -> dict:
     # 2) Fallback: aus DB, wenn Telethon nicht erfolgreich oder Felder fehlen
     if not telethon_ok or meta["title"] == "–" or meta["description"] == "–":
         try:
-            conn = get_db_connection()
-            try:
+            with borrow_connection("get_group_meta", autocommit=True) as conn:
                 cur = conn.cursor()
                 cur.execute("""
                     SELECT title, description, topic_count AS topics, bot_count AS bots
@@ -1162,8 +1212,6 @@ async def get_group_meta(chat_id: int) -> dict:
                         "topics":      row[2] if meta["topics"] is None else meta["topics"],
                         "bots":        row[3] if meta["bots"] is None else meta["bots"]
                     })
-            finally:
-                _db_pool.putconn(conn)
         except Exception:
             pass
 
@@ -1171,8 +1219,7 @@ async def get_group_meta(chat_id: int) -> dict:
 
 # 2) Neue/Verlassene Mitglieder & Inaktive
 def get_member_stats(chat_id: int, since: datetime) -> dict:
-    conn = get_db_connection()
-    try:
+    with borrow_connection("get_member_stats", autocommit=True, pool_name="analytics") as conn:
         cur = conn.cursor()
         # Neue Member
         cur.execute("""
@@ -1200,13 +1247,10 @@ def get_member_stats(chat_id: int, since: datetime) -> dict:
             "left":     left_count,
             "inactive": inactive,
         }
-    finally:
-        _db_pool.putconn(conn)
 
 # 3) Nachrichten-Insights (Medien-, Poll-, Forward-Statistiken)
 def get_message_insights(chat_id: int, start: datetime, end: datetime) -> dict:
-    conn = get_db_connection()
-    try:
+    with borrow_connection("get_message_insights", autocommit=True, pool_name="analytics") as conn:
         cur = conn.cursor()
         # Gesamt-Nachrichten
         cur.execute("""
@@ -1241,14 +1285,11 @@ def get_message_insights(chat_id: int, start: datetime, end: datetime) -> dict:
             "location": location,
             "polls":    polls,
         }
-    finally:
-        _db_pool.putconn(conn)
 
 # 4) Engagement (Antwort-Rate & Reaktionszeiten)
 def get_engagement_metrics(chat_id: int, start: datetime, end: datetime) -> dict:
     from statistics import mean
-    conn = get_db_connection()
-    try:
+    with borrow_connection("get_engagement_metrics", autocommit=True, pool_name="analytics") as conn:
         cur = conn.cursor()
         # Antwort-Rate: replies / total_messages
         cur.execute("""
@@ -1268,51 +1309,45 @@ def get_engagement_metrics(chat_id: int, start: datetime, end: datetime) -> dict
              WHERE chat_id=%s AND ts BETWEEN %s AND %s
         """, (chat_id, start, end))
         delays_ms = [r[0] for r in cur.fetchall()]
+        delays_ms += [r["delta_ms"] for r in archive.read_archived("reply_times", chat_id, _utc(start), _utc(end))
+                      if r.get("delta_ms") is not None]
         return {
             "reply_rate_pct": rate,
             "avg_delay_s":    round(mean([d/1000 for d in delays_ms]), 1) if delays_ms else None,
         }
-    finally:
-        _db_pool.putconn(conn)
 
 # 5) Trend-Analyse (Verlauf über Wochen/Monate)
 def get_trend_analysis(chat_id: int, periods: int = 4) -> dict:
     today = datetime.utcnow().date()
     results = []
-    conn = get_db_connection()
-    try:
+    with borrow_connection("get_trend_analysis", autocommit=True, pool_name="analytics") as conn:
         cur = conn.cursor()
         for w in range(periods):
             end = today - timedelta(weeks=w)
             start = end - timedelta(weeks=1)
+            # Bereichsprädikat auf "timestamp" statt ::date → Partition-Pruning + Index
             cur.execute("""
                 SELECT COUNT(*) FROM message_logs
-                 WHERE group_id=%s AND timestamp::date BETWEEN %s AND %s
-            """, (chat_id, start, end))
+                 WHERE group_id=%s AND timestamp >= %s AND timestamp < %s
+            """, (chat_id, start, end + timedelta(days=1)))
             results.append((str(start), cur.fetchone()[0]))
         return dict(results)
-    finally:
-        _db_pool.putconn(conn)
 
 def update_group_activity_score(chat_id: int, score: float):
-    conn = get_db_connection()
-    try:
+    with borrow_connection("update_group_activity_score", autocommit=True) as conn:
         cur = conn.cursor()
         cur.execute(
             "UPDATE group_settings SET group_activity_score=%s WHERE chat_id=%s;",
             (score, chat_id)
         )
         conn.commit()
-    finally:
-        _db_pool.putconn(conn)
 
 # --- Handler-Registrierung ---
 def register_statistics_handlers(app):
-    init_stats_db()
     app.add_handler(CommandHandler(['stats', 'statistik'], stats_command), group=10)
     async def command_logger(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cmd = update.effective_message.text.split()[0].lstrip('/')
-        log_command(update.effective_chat.id, update.effective_user.id, cmd)
+        await _call_db(log_command, update.effective_chat.id, update.effective_user.id, cmd)
     app.add_handler(MessageHandler(filters.COMMAND & ~filters.Regex(r'^/stats'), command_logger), group=9)
     app.add_handler(MessageHandler(filters.ALL, universal_logger), group=5)
     app.add_handler(ChatMemberHandler(on_chat_member_update, ChatMemberHandler.CHAT_MEMBER), group=0)
@@ -0,0 +1,75 @@
+import pytest
+from psycopg2 import OperationalError
+
+import database
+
+
+@pytest.fixture
+def session(monkeypatch, fake_pool):
+    """Update-Session, deren Verbindung aus fake_pool kommt."""
+    monkeypatch.setattr(database, "_db_pool", fake_pool)
+    monkeypatch.setitem(database._db_pools, "realtime", fake_pool)
+    sess = database._DbSession()
+    sess.has_slot = True
+    sess.conn = fake_pool.getconn()
+    return sess
+
+
+def _insert(cur, value):
+    cur.execute("INSERT INTO t VALUES (%s);", (value,))
+    return value
+
+
+def _failing(cur):
+    cur.execute("INSERT INTO t VALUES ('kaputt');")
+    raise ValueError("constraint")
+
+
+def test_each_call_commits(session, fake_pool):
+    assert database._run_in_session(session, _insert, (1,), {}) == (True, 1)
+    assert database._run_in_session(session, _insert, (2,), {}) == (True, 2)
+    assert fake_pool.conn.commits == 2
+    assert fake_pool.conn.rollbacks == 0
+
+
+def test_failure_rolls_back_only_its_own_call(session, fake_pool):
+    database._run_in_session(session, _insert, (1,), {})
+    with pytest.raises(ValueError):
+        database._run_in_session(session, _failing, (), {})
+
+    conn = fake_pool.conn
+    # der erste Aufruf war schon committet, verworfen wird nur der fehlerhafte
+    assert (conn.commits, conn.rollbacks) == (1, 1)
+    # die Session bleibt nutzbar
+    assert session.conn is conn
+    assert database._run_in_session(session, _insert, (3,), {}) == (True, 3)
+    assert conn.commits == 2
+
+
+def test_broken_connection_falls_back_to_pool(session, fake_pool):
+    def _dead(cur):
+        raise OperationalError("server closed the connection unexpectedly")
+
+    assert database._run_in_session(session, _dead, (), {}) == (False, None)
+    assert session.conn is None
+    assert fake_pool.returned == [(fake_pool.conn, True)]
+
+
+def test_busy_or_closed_session_is_not_used(session):
+    session.lock.acquire()
+    try:
+        assert database._run_in_session(session, _insert, (1,), {}) == (False, None)
+    finally:
+        session.lock.release()
+    session.closed = True
+    assert database._run_in_session(session, _insert, (1,), {}) == (False, None)
+
+
+def test_release_returns_connection_and_slot(session, fake_pool, monkeypatch):
+    released = []
+    monkeypatch.setattr(database._session_slots, "release", lambda: released.append(True))
+    database._release_session(session)
+
+    assert session.closed and session.conn is None
+    assert fake_pool.returned == [(fake_pool.conn, False)]
+    assert released == [True]
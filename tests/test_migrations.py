@@ -0,0 +1,88 @@
+import pytest
+
+import database
+
+
+@pytest.fixture
+def ledger(monkeypatch, fake_pool):
+    """Migrationsregister und schema_migrations im Speicher; Advisory-Lock über fake_pool."""
+    applied = {}
+    monkeypatch.setattr(database, "_MIGRATIONS", {})
+    monkeypatch.setattr(database, "_ensure_migration_ledger", lambda: None)
+    monkeypatch.setattr(database, "_applied_migrations", lambda: set(applied))
+    monkeypatch.setattr(database, "_record_migration", lambda version, name: applied.__setitem__(version, name))
+    monkeypatch.setitem(database._db_pools, "maintenance", fake_pool)
+    return applied
+
+
+def _lock_statements(pool):
+    return [sql for sql, _ in pool.conn.executed]
+
+
+def test_runs_pending_in_version_order(ledger, fake_pool):
+    ran = []
+    for version in (3, 1, 2):
+        database.register_migration(version, f"m{version}", lambda v=version: ran.append(v))
+
+    assert database._run_migrations_locked() == 3
+    assert ran == [1, 2, 3]
+    assert ledger == {1: "m1", 2: "m2", 3: "m3"}
+
+
+def test_skips_applied_versions(ledger):
+    ran = []
+    ledger[1] = "m1"
+    database.register_migration(1, "m1", lambda: ran.append(1))
+    database.register_migration(2, "m2", lambda: ran.append(2))
+
+    assert database._run_migrations_locked() == 1
+    assert ran == [2]
+
+
+def test_gap_refuses_to_run(ledger, fake_pool):
+    ran = []
+    database.register_migration(1, "m1", lambda: ran.append(1))
+    database.register_migration(3, "m3", lambda: ran.append(3))
+
+    with pytest.raises(RuntimeError, match=r"\[2\]"):
+        database._run_migrations_locked()
+    assert ran == []
+    # Lock wieder freigegeben, Verbindung zurück im Pool
+    assert "pg_advisory_unlock" in _lock_statements(fake_pool)[-1]
+    assert fake_pool.returned == [(fake_pool.conn, False)]
+
+
+def test_applied_but_unregistered_version_is_no_gap(ledger):
+    ledger[2] = "aus einem anderen Modul"
+    ran = []
+    database.register_migration(1, "m1", lambda: ran.append(1))
+    database.register_migration(3, "m3", lambda: ran.append(3))
+
+    assert database._run_migrations_locked() == 2
+    assert ran == [1, 3]
+
+
+def test_failure_stops_later_migrations_and_releases_lock(ledger, fake_pool):
+    ran = []
+
+    def broken():
+        raise ValueError("kaputt")
+
+    database.register_migration(1, "m1", lambda: ran.append(1))
+    database.register_migration(2, "m2", broken)
+    database.register_migration(3, "m3", lambda: ran.append(3))
+
+    with pytest.raises(ValueError):
+        database._run_migrations_locked()
+    assert ran == [1]
+    assert ledger == {1: "m1"}
+    statements = _lock_statements(fake_pool)
+    assert "pg_advisory_lock" in statements[0] and "pg_advisory_unlock" in statements[-1]
+    assert fake_pool.conn.autocommit is False
+
+
+def test_register_migration_rejects_reused_version(ledger):
+    database.register_migration(1, "m1", lambda: None)
+    database.register_migration(1, "m1", lambda: None)   # erneuter Import: gleicher Name ist ok
+    with pytest.raises(ValueError):
+        database.register_migration(1, "anders", lambda: None)
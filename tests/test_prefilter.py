@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import prefilter
+from prefilter import BAD, SAFE, UNCERTAIN, classify
+
+
+@pytest.fixture(autouse=True)
+def clean_hashes(monkeypatch):
+    monkeypatch.setattr(prefilter, "_bad_hashes", {})
+    monkeypatch.setattr(prefilter, "_unsaved", {})
+    monkeypatch.setattr(prefilter, "_bad_hashes_loaded_at", 0.0)
+
+
+@pytest.mark.parametrize("text", ["", "ok", "Danke!", "guten morgen", "👍👍", "12", "hahahaha"])
+def test_safe(text):
+    assert classify(text, "de").decision == SAFE
+
+
+@pytest.mark.parametrize("text, lang, category", [
+    ("FREE BTC for everyone", "en", "link_risk"),
+    ("verdiene 500 € am Tag", "de", "link_risk"),
+    ("ich bring dich um", "de", "violence"),
+    ("kill yourself", "en", "selfharm"),
+])
+def test_severe_lexicon_is_bad(text, lang, category):
+    v = classify(text, lang)
+    assert v.decision == BAD
+    assert v.category == category
+    assert v.score >= 0.9
+
+
+def test_lexicon_is_per_language():
+    # deutsche Regel greift im englischen Chat nicht
+    assert classify("ich bring dich um", "en").decision == UNCERTAIN
+
+
+def test_weak_lexicon_hit_is_uncertain_with_category():
+    v = classify("du wichser", "de")
+    assert v.decision == UNCERTAIN
+    assert v.category == "toxicity"
+
+
+@pytest.mark.parametrize("text, kwargs", [
+    ("ok", {"domains": ["example.com"]}),
+    ("ok", {"link_score": 0.4}),
+    ("hallo @someone", {}),
+    ("danke " * 10, {}),
+    ("wann ist das treffen", {}),
+])
+def test_uncertain(text, kwargs):
+    assert classify(text, "de", **kwargs).decision == UNCERTAIN
+
+
+def test_known_hash_keeps_model_category_and_score():
+    prefilter._bad_hashes[prefilter.content_hash("Some  SPAM text")] = ("harassment", 0.87)
+    # Hash über den normalisierten Text: Groß-/Kleinschreibung und Leerraum egal
+    v = classify("some spam text", "de")
+    assert (v.decision, v.category, v.score) == (BAD, "harassment", 0.87)
+
+
+def test_refresh_replaces_with_db_and_keeps_unsaved(monkeypatch):
+    stale = prefilter.content_hash("gelöscht")
+    pending = prefilter.content_hash("noch nicht gespeichert")
+    prefilter._bad_hashes.update({stale: ("toxicity", 0.9), pending: ("hate", 0.8)})
+    prefilter._unsaved[pending] = ("hate", 0.8)
+    monkeypatch.setattr(prefilter, "add_bad_hash", lambda *a: (_ for _ in ()).throw(RuntimeError("db down")))
+    monkeypatch.setattr(prefilter, "load_bad_hashes", lambda: {"abc": ("sexual", 0.7)})
+
+    asyncio.run(prefilter.refresh_bad_hashes(force=True))
+
+    assert prefilter._bad_hashes == {"abc": ("sexual", 0.7), pending: ("hate", 0.8)}
+    assert classify("gelöscht", "de").decision != BAD
+
+
+def test_remember_bad_clears_unsaved_after_write(monkeypatch):
+    saved = []
+    monkeypatch.setattr(prefilter, "add_bad_hash", lambda *a: saved.append(a))
+    asyncio.run(prefilter.remember_bad("buy followers now", "link_risk", 0.9))
+
+    assert len(saved) == 1
+    assert prefilter._unsaved == {}
+    assert classify("Buy followers now", "de").decision == BAD
@@ -0,0 +1,51 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+import translator
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(translator, "_lru", OrderedDict())
+    monkeypatch.setattr(translator, "_pending_async", {})
+    monkeypatch.setattr(translator, "_catalog", {})
+
+
+@pytest.fixture
+def slow_api(monkeypatch):
+    """Langsame Übersetzung, die jeden Aufruf mitzählt."""
+    calls = []
+
+    async def translate(key, text, target_lang, source_lang):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return f"{text} ({target_lang})"
+
+    monkeypatch.setattr(translator, "_translate_uncached_async", translate)
+    return calls
+
+
+def test_concurrent_callers_share_one_request(slow_api):
+    async def scenario():
+        return await asyncio.gather(*(translator.translate_hybrid_async("Hallo", "en") for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["Hallo (en)"] * 3
+    assert slow_api == ["Hallo"]
+
+
+def test_cancelled_first_caller_does_not_cancel_waiters(slow_api):
+    async def scenario():
+        first = asyncio.create_task(translator.translate_hybrid_async("Hallo", "en"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(translator.translate_hybrid_async("Hallo", "en")) for _ in range(2)]
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == ["Hallo (en)"] * 2
+    # ein Wartender übernimmt, der andere hängt sich an ihn an
+    assert slow_api == ["Hallo", "Hallo"]
@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+from collections import OrderedDict
+
+import pytest
+
+import trust
+
+_NOW = datetime.datetime.now(datetime.timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(trust, "_entries", OrderedDict())
+    monkeypatch.setattr(trust, "_inflight", {})
+    monkeypatch.setattr(trust, "_load_sem", None)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Trust-Einstellungen und -Historie je Nutzer aus dicts statt aus Postgres."""
+    state = {"settings": (True, 30, 50, 0.1), "history": {}, "calls": 0}
+
+    def history(chat_id, user_id, window_days):
+        state["calls"] += 1
+        return state["history"].get(user_id, (None, 0, 0, 0, 0))
+
+    monkeypatch.setattr(trust, "get_trust_settings", lambda chat_id: state["settings"])
+    monkeypatch.setattr(trust, "get_trust_history", history)
+    return state
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _tier_after_load(chat_id, user_id):
+    first = await trust.get_tier(chat_id, user_id)
+    await asyncio.gather(*trust._inflight.values())
+    return first, await trust.get_tier(chat_id, user_id)
+
+
+def test_no_user_or_disabled_is_new(db):
+    assert _run(trust.get_tier(1, None)) == trust.NEW
+    db["settings"] = (False, 30, 50, 0.1)
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 500, 0, 0, 0)
+    assert _run(_tier_after_load(1, 7)) == (trust.NEW, trust.NEW)
+    assert db["calls"] == 0
+
+
+def test_unknown_user_is_new_until_history_loaded(db):
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 500, 0, 0, 0)
+    # erste Nachricht: sofort NEW, die Historie kommt im Hintergrund
+    assert _run(_tier_after_load(1, 7)) == (trust.NEW, trust.TRUSTED)
+    assert db["calls"] == 1
+
+
+@pytest.mark.parametrize("history, tier", [
+    ((_NOW - datetime.timedelta(days=400), 500, 0, 0, 0), trust.TRUSTED),
+    ((_NOW - datetime.timedelta(days=5), 500, 0, 0, 0), trust.NEW),       # zu kurz dabei
+    ((_NOW - datetime.timedelta(days=400), 10, 0, 0, 0), trust.NEW),      # zu wenig Nachrichten
+    ((None, 500, 0, 0, 0), trust.NEW),                                    # Beitritt unbekannt
+    ((_NOW - datetime.timedelta(days=400), 500, 3, 0, 0), trust.FLAGGED), # Strikes
+    ((_NOW - datetime.timedelta(days=400), 500, 0, 1, 0), trust.FLAGGED), # Spam-Event
+    ((_NOW - datetime.timedelta(days=400), 500, 0, 0, 2), trust.FLAGGED), # KI-Treffer
+])
+def test_tiers(db, history, tier):
+    db["history"][7] = history
+    assert _run(_tier_after_load(1, 7))[1] == tier
+
+
+def test_flag_downgrades_immediately(db):
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 500, 0, 0, 0)
+    assert _run(_tier_after_load(1, 7))[1] == trust.TRUSTED
+    trust.flag(1, 7)
+    assert _run(trust.get_tier(1, 7)) == trust.FLAGGED
+
+
+def test_flag_during_load_is_kept(db):
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 500, 0, 0, 0)
+
+    async def scenario():
+        await trust.get_tier(1, 7)      # Laden angestoßen
+        trust.flag(1, 7)                # Verstoß, bevor die Historie da ist
+        await asyncio.gather(*trust._inflight.values())
+        return await trust.get_tier(1, 7)
+
+    assert _run(scenario()) == trust.FLAGGED
+
+
+def test_note_message_promotes_after_min_msgs(db):
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 49, 0, 0, 0)
+    assert _run(_tier_after_load(1, 7))[1] == trust.NEW
+    trust.note_message(1, 7)
+    assert _run(trust.get_tier(1, 7)) == trust.TRUSTED
+
+
+def test_trusted_users_are_sampled(db, monkeypatch):
+    db["settings"] = (True, 30, 50, 0.25)
+    db["history"][7] = (_NOW - datetime.timedelta(days=400), 500, 0, 0, 0)
+    _run(_tier_after_load(1, 7))
+
+    monkeypatch.setattr(trust.random, "random", lambda: 0.5)
+    assert _run(trust.should_moderate(1, 7)) == (False, trust.TRUSTED)
+    monkeypatch.setattr(trust.random, "random", lambda: 0.1)
+    assert _run(trust.should_moderate(1, 7)) == (True, trust.TRUSTED)
+    # neue Nutzer immer voll prüfen
+    assert _run(trust.should_moderate(1, 8))[0] is True
+
+
+def test_failed_history_load_stays_new(db, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("statement timeout")
+
+    monkeypatch.setattr(trust, "get_trust_history", broken)
+    assert _run(_tier_after_load(1, 7)) == (trust.NEW, trust.NEW)
@@ -0,0 +1,163 @@
+import pytest
+
+import write_buffer
+from write_buffer import WriteBehindBuffer
+
+
+class DataError(Exception):
+    pass
+
+
+class ConnectionLost(Exception):
+    pass
+
+
+class Writer:
+    """Schreibt in eine Liste; Zeilen in `bad` scheitern, `down` simuliert eine tote DB."""
+
+    def __init__(self, bad=(), down=False):
+        self.bad = set(bad)
+        self.down = down
+        self.calls = []
+        self.written = []
+
+    def __call__(self, spec, rows):
+        self.calls.append((spec.name, list(rows)))
+        if self.down:
+            raise ConnectionLost("server closed the connection")
+        if any(r in self.bad for r in rows):
+            raise DataError("violates foreign key constraint")
+        self.written.extend((spec.name, r) for r in rows)
+
+
+@pytest.fixture(autouse=True)
+def specs(monkeypatch):
+    monkeypatch.setattr(write_buffer, "_specs", {})
+    write_buffer.register_table("a", "INSERT INTO a VALUES %s")
+    write_buffer.register_table("b", "INSERT INTO b VALUES %s")
+    write_buffer.register_table("counts", "INSERT INTO counts VALUES %s", merge=write_buffer.merge_sum(1))
+
+
+def _buffer(writer, max_attempts=3):
+    buf = WriteBehindBuffer(flush_interval_ms=10_000, max_rows=1000, max_pending=1000, max_attempts=max_attempts)
+    buf.configure(writer, lambda exc: isinstance(exc, ConnectionLost))
+    # kein Hintergrund-Thread: die Tests rufen flush() selbst
+    buf._ensure_thread = lambda: None
+    return buf
+
+
+def test_flush_without_writer_keeps_rows():
+    buf = WriteBehindBuffer(10_000, 1000, 1000)
+    buf._ensure_thread = lambda: None
+    buf.offer("a", (1,))
+    assert buf.flush() is False
+    assert buf.pending() == 1
+
+
+def test_one_batch_per_table_with_merge():
+    writer = Writer()
+    buf = _buffer(writer)
+    for row in [(1,), (2,)]:
+        buf.offer("a", row)
+    for row in [("x", 1), ("x", 2), ("y", 5)]:
+        buf.offer("counts", row)
+
+    assert buf.flush() is True
+    assert sorted(writer.calls) == [("a", [(1,), (2,)]), ("counts", [("x", 3), ("y", 5)])]
+    assert buf.pending() == 0
+
+
+def test_bad_row_is_retried_alone_and_dead_lettered():
+    writer = Writer(bad={(2,)})
+    buf = _buffer(writer, max_attempts=3)
+    for row in [(1,), (2,), (3,)]:
+        buf.offer("a", row)
+
+    # Batch scheitert → Zeile für Zeile; nur (2,) bleibt zurück
+    assert buf.flush() is False
+    assert ("a", (1,)) in writer.written and ("a", (3,)) in writer.written
+    assert buf.pending() == 1
+    assert not buf.dead_letters
+
+    assert buf.flush() is False
+    assert buf.pending() == 1
+    # dritter Fehlversuch → Dead Letter, der Puffer ist danach leer
+    assert buf.flush() is True
+    assert buf.pending() == 0
+    assert [(t, r) for _, t, r, _ in buf.dead_letters] == [("a", (2,))]
+    assert buf.stats["dead_lettered"] == 1
+    assert buf.stats["row_retries"] == 3
+
+
+def test_bad_row_does_not_block_other_tables():
+    writer = Writer(bad={(2,)})
+    buf = _buffer(writer)
+    buf.offer("a", (2,))
+    buf.offer("b", (7,))
+
+    buf.flush()
+    assert ("b", (7,)) in writer.written
+
+
+def test_transient_error_restores_rows_unchanged():
+    writer = Writer(down=True)
+    buf = _buffer(writer)
+    buf.offer("a", (1,))
+    buf.offer("a", (2,))
+
+    assert buf.flush() is False
+    assert buf.pending() == 2
+    # Verbindungsfehler zählen nicht als Fehlversuch der Zeilen
+    assert buf.stats["row_retries"] == 0
+
+    writer.down = False
+    assert buf.flush() is True
+    assert [r for _, r in writer.written] == [(1,), (2,)]
+
+
+def test_transient_error_during_row_retry_keeps_attempts():
+    writer = Writer(bad={(2,)})
+    buf = _buffer(writer, max_attempts=2)
+    buf.offer("a", (2,))
+    buf.flush()                      # 1. Fehlversuch
+    writer.down = True
+    assert buf.flush() is False      # DB weg: kein Versuch verbraucht
+    writer.down = False
+    assert buf.flush() is True       # 2. Fehlversuch → Dead Letter
+    assert len(buf.dead_letters) == 1
+
+
+def test_get_dead_letters_newest_first(monkeypatch):
+    writer = Writer(bad={(1,), (2,)})
+    buf = _buffer(writer, max_attempts=1)
+    monkeypatch.setattr(write_buffer, "_buffer", buf)
+    buf.offer("a", (1,))
+    buf.flush()
+    buf.offer("a", (2,))
+    buf.flush()
+
+    rows = [r for _, _, r, _ in write_buffer.get_dead_letters()]
+    assert rows == [(2,), (1,)]
+
+
+def test_count_pending_sees_queued_retried_and_inflight_rows():
+    seen = []
+
+    class Probe(Writer):
+        def __call__(self, spec, rows):
+            # während des Schreibens zählt die Zeile weiter als ausstehend
+            seen.append(buf.count_pending("a", lambda r: r[0] == "x"))
+            super().__call__(spec, rows)
+
+    writer = Probe(bad={("x", 2)})
+    buf = _buffer(writer)
+    buf.offer("a", ("x", 1))
+    buf.offer("a", ("x", 2))
+    buf.offer("a", ("y", 3))
+    assert buf.count_pending("a", lambda r: r[0] == "x") == 2
+
+    buf.flush()
+    assert seen[0] == 2
+    # geschrieben ist raus, die fehlerhafte Zeile wartet auf den nächsten Versuch
+    assert buf.count_pending("a", lambda r: r[0] == "x") == 1
+    assert buf.count_pending("b", lambda r: True) == 0
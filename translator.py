@@ -1,56 +1,255 @@
 import os
+import asyncio
 import logging
-import openai
-from database import get_cached_translation, set_cached_translation
+import threading
+from collections import OrderedDict
+import metrics
+import ai_client
+from database import get_cached_translation, set_cached_translation, translation_key, _call_db
 
 logger = logging.getLogger(__name__)
 
-# OpenAI API-Key setzen
+# OpenAI API-Key prüfen (die Aufrufe selbst laufen über ai_client)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY ist nicht gesetzt. Bitte in den Umgebungsvariablen hinterlegen.")
-openai.api_key = OPENAI_API_KEY
 
 # Festes Modell für Übersetzung
 TRANSLATION_MODEL = "gpt-3.5-turbo"
 
-def translate_hybrid(text: str, target_lang: str, source_lang: str = 'auto') -> str:
-    """
-    Übersetzt 'text' ins Zielsprachformat 'target_lang' mit:
-    1) Cache-Abfrage
-    2) OpenAI API-Call (neues Interface openai.chat.completions.create)
-    3) Nur echte Übersetzungen cachen
+# Stufe 1: In-Process-LRU vor translations_cache (Stufe 2, DB) und der API (Stufe 3)
+TRANSLATION_LRU_SIZE = int(os.getenv("TRANSLATION_LRU_SIZE", "4096"))
+
+_lru: "OrderedDict[tuple[str, str], str]" = OrderedDict()
+_lru_lock = threading.Lock()
+_stats = {"catalog_hits": 0, "lru_hits": 0, "db_hits": 0, "api_calls": 0, "api_errors": 0, "coalesced": 0}
+
+# Stufe 0: vorkompilierte UI-Kataloge aus catalog.py – {sprache: {quelltext: übersetzung}}
+_catalog: dict[str, dict[str, str]] = {}
+
+
+def install_catalog(lang: str, mapping: dict, merge: bool = False) -> None:
+    """Katalog einer Sprache setzen (merge=True: Einträge ergänzen). Ersetzt das dict als Ganzes."""
+    table = dict(_catalog.get(lang, {})) if merge else {}
+    table.update(mapping)
+    _catalog[lang] = table
+
+
+def catalog_lookup(text: str, lang: str) -> str | None:
+    table = _catalog.get(lang)
+    if table is None:
+        return None
+    hit = table.get(text)
+    if hit is not None:
+        _stats["catalog_hits"] += 1
+    return hit
+
+
+def _lru_get(key):
+    with _lru_lock:
+        val = _lru.get(key)
+        if val is not None:
+            _lru.move_to_end(key)
+            _stats["lru_hits"] += 1
+        return val
+
+
+def _lru_put(key, value: str) -> None:
+    with _lru_lock:
+        _lru[key] = value
+        _lru.move_to_end(key)
+        while len(_lru) > TRANSLATION_LRU_SIZE:
+            _lru.popitem(last=False)
 
-    Fällt die API aus oder liefert keinen neuen Text, wird der Originaltext zurückgegeben.
-    """
-    # 1) Cache abfragen
-    cached = get_cached_translation(text, target_lang)
-    if cached:
-        return cached
 
-    # 2) Anfrage an OpenAI mit neuer Schnittstelle
+def _request(text: str, target_lang: str, source_lang: str) -> dict:
+    prompt = f"Bitte übersetze den folgenden Text von {source_lang} nach {target_lang}: \"{text}\""
+    return dict(
+        model=TRANSLATION_MODEL,
+        messages=[
+            {"role": "system", "content": "Du bist ein hilfreicher Übersetzungsassistent."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0
+    )
+
+
+def _clean(response) -> str:
+    translated = (response.choices[0].message.content or "").strip()
+    # Falls die API den String in Anführungszeichen zurückgibt, abschneiden:
+    return translated.strip().strip('"').strip("'")
+
+
+def _api_translate(text: str, target_lang: str, source_lang: str) -> str | None:
+    """Ein API-Aufruf (blockierend, für Threads); None bei Fehler."""
+    _stats["api_calls"] += 1
+    try:
+        return _clean(ai_client.chat_sync(**_request(text, target_lang, source_lang)))
+    except Exception as e:
+        _stats["api_errors"] += 1
+        logger.warning(f"OpenAI-Übersetzung fehlgeschlagen, Fallback auf Originaltext: {e}")
+        return None
+
+
+async def _api_translate_async(text: str, target_lang: str, source_lang: str) -> str | None:
+    _stats["api_calls"] += 1
     try:
-        prompt = f"Bitte übersetze den folgenden Text von {source_lang} nach {target_lang}: \"{text}\""
-        response = openai.chat.completions.create(
-            model=TRANSLATION_MODEL,
-            messages=[
-                {"role": "system", "content": "Du bist ein hilfreicher Übersetzungsassistent."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        translated = response.choices[0].message.content.strip()
-        # Falls die API den String in Anführungszeichen zurückgibt, abschneiden:
-        translated = translated.strip().strip('"').strip("'")
+        return _clean(await ai_client.chat(**_request(text, target_lang, source_lang)))
     except Exception as e:
+        _stats["api_errors"] += 1
         logger.warning(f"OpenAI-Übersetzung fehlgeschlagen, Fallback auf Originaltext: {e}")
-        translated = text
+        return None
 
-    # 3) Nur echte Übersetzungen ins Cache schreiben
+
+def _translate_uncached(key, text: str, target_lang: str, source_lang: str) -> str:
+    """Stufe 2 + 3: DB-Cache, sonst API. Füllt das LRU."""
+    try:
+        cached = get_cached_translation(text, target_lang)
+    except Exception as e:
+        logger.error(f"Übersetzungs-Cache nicht lesbar: {e}")
+        cached = None
+    if cached:
+        _stats["db_hits"] += 1
+        _lru_put(key, cached)
+        return cached
+
+    translated = _api_translate(text, target_lang, source_lang)
+    if translated is None:
+        return text  # Fehler nicht merken → nächster Aufruf versucht es erneut
+
+    # Nur echte Übersetzungen in die DB; „bleibt gleich“ (z. B. de → de) nur im LRU,
+    # damit derselbe Text nicht bei jedem Aufruf erneut an die API geht
     if translated and translated != text:
         try:
             set_cached_translation(text, target_lang, translated)
         except Exception as e:
             logger.error(f"Konnte Übersetzung nicht cachen: {e}")
+    result = translated or text
+    _lru_put(key, result)
+    return result
+
+
+async def _translate_uncached_async(key, text: str, target_lang: str, source_lang: str) -> str:
+    """Wie _translate_uncached, aber DB über den DB-Executor und API über den Async-Client."""
+    try:
+        cached = await _call_db(get_cached_translation, text, target_lang)
+    except Exception as e:
+        logger.error(f"Übersetzungs-Cache nicht lesbar: {e}")
+        cached = None
+    if cached:
+        _stats["db_hits"] += 1
+        _lru_put(key, cached)
+        return cached
+
+    translated = await _api_translate_async(text, target_lang, source_lang)
+    if translated is None:
+        return text
+
+    if translated and translated != text:
+        try:
+            await _call_db(set_cached_translation, text, target_lang, translated)
+        except Exception as e:
+            logger.error(f"Konnte Übersetzung nicht cachen: {e}")
+    result = translated or text
+    _lru_put(key, result)
+    return result
+
+
+# Gleichzeitige Anfragen für denselben (Text, Sprache) teilen sich einen Lookup/API-Call
+class _Pending:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+_pending: dict[tuple[str, str], _Pending] = {}
+_pending_lock = threading.Lock()
+_pending_async: dict[tuple[str, str], asyncio.Future] = {}
+
+
+def _translate_coalesced(key, text: str, target_lang: str, source_lang: str) -> str:
+    with _pending_lock:
+        p = _pending.get(key)
+        leader = p is None
+        if leader:
+            p = _pending[key] = _Pending()
+    if not leader:
+        _stats["coalesced"] += 1
+        p.event.wait()
+        return p.result if p.result is not None else text
+    try:
+        p.result = _translate_uncached(key, text, target_lang, source_lang)
+        return p.result
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+        p.event.set()
+
+
+def translate_hybrid(text: str, target_lang: str, source_lang: str = 'auto') -> str:
+    """
+    Übersetzt 'text' ins Zielsprachformat 'target_lang' mit:
+    0) UI-Katalog (catalog.py, nur tr()-Literale)
+    1) In-Memory-LRU
+    2) DB-Cache (translations_cache, Schlüssel sha256(text))
+    3) OpenAI API-Call (gemeinsamer Client aus ai_client)
+
+    Fällt die API aus oder liefert keinen neuen Text, wird der Originaltext zurückgegeben.
+    Blockiert bei einem Miss (DB + chat_sync mit Retries) – nur aus Worker-Threads aufrufen,
+    Handler nutzen translate_hybrid_async bzw. tr_async.
+    """
+    if not text:
+        return text
+    hit = catalog_lookup(text, target_lang)
+    if hit is not None:
+        return hit
+    key = (translation_key(text), target_lang)
+    hit = _lru_get(key)
+    if hit is not None:
+        return hit
+    return _translate_coalesced(key, text, target_lang, source_lang)
+
+
+async def translate_hybrid_async(text: str, target_lang: str, source_lang: str = 'auto') -> str:
+    """Wie translate_hybrid, blockiert aber den Event-Loop nicht (DB-Executor + Async-Client)."""
+    if not text:
+        return text
+    hit = catalog_lookup(text, target_lang)
+    if hit is not None:
+        return hit
+    key = (translation_key(text), target_lang)
+    hit = _lru_get(key)
+    if hit is not None:
+        return hit
+    fut = _pending_async.get(key)
+    if fut is not None:
+        _stats["coalesced"] += 1
+        result = await asyncio.shield(fut)
+        if result is None:   # erster Aufrufer abgebrochen → selbst übersetzen
+            return await translate_hybrid_async(text, target_lang, source_lang)
+        return result
+    fut = asyncio.get_running_loop().create_future()
+    _pending_async[key] = fut
+    try:
+        result = await _translate_uncached_async(key, text, target_lang, source_lang)
+        fut.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        # nicht den gemeinsamen Future abbrechen: die übrigen Wartenden wurden nicht gecancelt
+        fut.set_result(None)
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # als abgerufen markieren, falls niemand wartet
+        raise
+    finally:
+        _pending_async.pop(key, None)
+
+
+def get_translation_stats() -> dict:
+    return dict(_stats, lru_size=len(_lru), catalog_entries=sum(len(t) for t in _catalog.values()))
+
 
-    return translated
+metrics.gauge("translations", get_translation_stats)
@@ -0,0 +1,176 @@
+"""
+Vertrauensstufen je (Chat, Nutzer) für Spam- und KI-Moderation.
+
+Grundlage ist eine Abfrage je Nutzer (database.get_trust_history: Beitrittsdatum, Nachrichten
+der letzten TRUST_WINDOW_DAYS Tage, Strike-Punkte, Spam-Events, KI-Treffer). Danach wird im
+Speicher fortgeschrieben: jede Nachricht zählt mit, jeder Verstoß stuft sofort auf "flagged"
+herunter. Nach TRUST_TTL_S wird aus der DB neu aufgebaut.
+
+Die Abfrage läuft nie im Nachrichtenpfad: unbekannte Nutzer gelten sofort als "new" (volle
+Prüfung), die Historie wird im Hintergrund geladen (höchstens TRUST_LOAD_CONCURRENCY parallel
+auf dem Analytics-Pool). Abgelaufene Einträge gelten weiter, bis der Neuaufbau fertig ist.
+
+Stufen:
+  flagged – Strikes/Verstöße im Fenster → volle Prüfung, Vorfilter darf nichts freigeben
+  new     – kürzer als min_days dabei oder weniger als min_msgs Nachrichten → volle Prüfung
+  trusted – lange dabei, aktiv, sauber → KI-Moderation nur stichprobenartig (sample_rate),
+            Emoji-/Flood-Heuristiken entfallen; Link-Regeln und Tageslimits gelten weiter
+
+Admins stellen je Chat ein (/trust): an/aus, min_days, min_msgs, sample_rate.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import datetime
+from collections import Counter, OrderedDict
+import metrics
+from database import _call_db, get_trust_history, get_trust_settings
+
+logger = logging.getLogger(__name__)
+
+TRUST_TTL_S = float(os.getenv("TRUST_TTL_S", "21600"))
+TRUST_MAX_ENTRIES = int(os.getenv("TRUST_MAX_ENTRIES", "50000"))
+TRUST_WINDOW_DAYS = int(os.getenv("TRUST_WINDOW_DAYS", "90"))
+TRUST_LOAD_CONCURRENCY = int(os.getenv("TRUST_LOAD_CONCURRENCY", "2"))
+# mehr offene Ladevorgänge (z. B. Beitrittswelle) → weitere Nutzer bleiben vorerst "new"
+TRUST_MAX_PENDING_LOADS = int(os.getenv("TRUST_MAX_PENDING_LOADS", "500"))
+
+FLAGGED = "flagged"
+NEW = "new"
+TRUSTED = "trusted"
+
+
+class TrustSettings:
+    __slots__ = ("enabled", "min_days", "min_msgs", "sample_rate")
+
+    def __init__(self, enabled, min_days, min_msgs, sample_rate):
+        self.enabled = bool(enabled)
+        self.min_days = max(0, int(min_days))
+        self.min_msgs = max(0, int(min_msgs))
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+
+class _Entry:
+    __slots__ = ("joined_at", "msgs", "flagged", "expires")
+
+    def __init__(self, joined_at, msgs: int, flagged: bool, expires: float):
+        self.joined_at = joined_at
+        self.msgs = msgs
+        self.flagged = flagged
+        self.expires = expires
+
+
+_entries: "OrderedDict[tuple[int, int], _Entry]" = OrderedDict()
+_inflight: dict[tuple[int, int], asyncio.Task] = {}
+_load_sem: asyncio.Semaphore | None = None
+_stats = Counter()
+
+metrics.gauge("trust", lambda: dict(_stats, entries=len(_entries), loading=len(_inflight)))
+
+
+async def get_settings(chat_id: int) -> TrustSettings:
+    return TrustSettings(*await _call_db(get_trust_settings, chat_id))
+
+
+async def _load(chat_id: int, user_id: int) -> None:
+    global _load_sem
+    if _load_sem is None:
+        _load_sem = asyncio.Semaphore(max(1, TRUST_LOAD_CONCURRENCY))
+    key = (chat_id, user_id)
+    async with _load_sem:
+        _stats["loads"] += 1
+        try:
+            joined_at, msgs, strikes, spam, ai_hits = await _call_db(get_trust_history, chat_id, user_id, TRUST_WINDOW_DAYS)
+            entry = _Entry(joined_at, msgs, bool(strikes or spam or ai_hits), time.monotonic() + TRUST_TTL_S)
+        except Exception as e:
+            # ohne Historie kein Vertrauen – kurz später erneut versuchen
+            logger.debug(f"Trust-Historie ({chat_id}, {user_id}) nicht lesbar: {e}")
+            entry = _Entry(None, 0, False, time.monotonic() + 60)
+    current = _entries.get(key)
+    if current is not None and current.flagged and current.expires > time.monotonic():
+        entry.flagged = True   # Verstoß während des Ladens (flag) nicht überschreiben
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > TRUST_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def _schedule_load(chat_id: int, user_id: int) -> None:
+    key = (chat_id, user_id)
+    if key in _inflight:
+        return
+    if len(_inflight) >= TRUST_MAX_PENDING_LOADS:
+        _stats["load_skipped"] += 1
+        return
+    task = asyncio.get_running_loop().create_task(_load(chat_id, user_id))
+    _inflight[key] = task
+
+    def _done(t):
+        _inflight.pop(key, None)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning(f"Trust-Laden ({chat_id}, {user_id}) fehlgeschlagen: {t.exception()}")
+    task.add_done_callback(_done)
+
+
+def _entry(chat_id: int, user_id: int) -> _Entry | None:
+    """Eintrag aus dem Speicher; fehlt er oder ist er abgelaufen, wird im Hintergrund (neu) geladen."""
+    entry = _entries.get((chat_id, user_id))
+    if entry is None or entry.expires <= time.monotonic():
+        _schedule_load(chat_id, user_id)
+    if entry is not None:
+        _entries.move_to_end((chat_id, user_id))
+    return entry
+
+
+def _tier(entry: _Entry, settings: TrustSettings) -> str:
+    if entry.flagged:
+        return FLAGGED
+    if entry.joined_at is None or entry.msgs < settings.min_msgs:
+        return NEW
+    age = datetime.datetime.now(datetime.timezone.utc) - entry.joined_at
+    return TRUSTED if age >= datetime.timedelta(days=settings.min_days) else NEW
+
+
+async def get_tier(chat_id: int, user_id: int | None, settings: TrustSettings | None = None) -> str:
+    """Stufe eines Nutzers; ohne Nutzer oder bei abgeschaltetem Trust immer NEW (volle Prüfung)."""
+    if user_id is None:
+        return NEW
+    settings = settings or await get_settings(chat_id)
+    if not settings.enabled:
+        return NEW
+    entry = _entry(chat_id, user_id)
+    tier = NEW if entry is None else _tier(entry, settings)
+    _stats[tier] += 1
+    return tier
+
+
+async def should_moderate(chat_id: int, user_id: int | None) -> tuple[bool, str]:
+    """(volle KI-Prüfung?, Stufe) – vertraute Nutzer nur mit Wahrscheinlichkeit sample_rate."""
+    settings = await get_settings(chat_id)
+    tier = await get_tier(chat_id, user_id, settings)
+    if tier != TRUSTED or random.random() < settings.sample_rate:
+        return True, tier
+    _stats["sampled_out"] += 1
+    return False, tier
+
+
+def note_message(chat_id: int, user_id: int | None) -> None:
+    """Nachricht im Speicher mitzählen (nur für bereits geladene Nutzer)."""
+    entry = _entries.get((chat_id, user_id))
+    if entry is not None:
+        entry.msgs += 1
+
+
+def flag(chat_id: int, user_id: int | None) -> None:
+    """Verstoß: sofort volle Prüfung, bis die DB-Historie beim nächsten Neuaufbau sauber ist."""
+    if user_id is None:
+        return
+    entry = _entries.get((chat_id, user_id))
+    if entry is not None:
+        entry.flagged = True
+    else:
+        _entries[(chat_id, user_id)] = _Entry(None, 0, True, time.monotonic() + TRUST_TTL_S)
+    _stats["flags"] += 1
+
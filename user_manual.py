@@ -1,6 +1,12 @@
+import asyncio
+import hashlib
+import logging
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
-from translator import translate_hybrid
+from telegram.error import BadRequest
+from translator import translate_hybrid_async
+
+logger = logging.getLogger(__name__)
 
 # Basis-Handbuch in deutscher Sprache
 HELP_TEXT = '''
@@ -125,35 +131,86 @@ HELP_TEXT = '''
 • PayPal: greeny187@outlook.de
 '''
 
+# --- Handbuch-Bundles ---
+# Je (Sprache, Dateiname) wird das übersetzte Handbuch einmal gerendert und als Bytes im
+# Speicher gehalten. Nach dem ersten Upload merkt sich bot_data (PicklePersistence) die
+# Telegram-file_id; weitere Aufrufe schicken nur noch die ID – ohne Übersetzung und Upload.
+# Der Schlüssel enthält einen Hash von HELP_TEXT, ein geändertes Handbuch wird neu hochgeladen.
+# Schlägt die Übersetzung fehl (Text unverändert), wird weder Bundle noch file_id gemerkt.
+_HELP_DIGEST = hashlib.sha256(HELP_TEXT.encode("utf-8")).hexdigest()[:12]
+_bundles: dict[tuple[str, str], bytes] = {}
+_rendering: dict[tuple[str, str], asyncio.Future] = {}
+
+
+async def _render_manual(lang: str, filename: str) -> tuple[bytes, bool]:
+    """(Bytes, cachebar) – unverändertes HELP_TEXT in einer anderen Sprache heißt API-Fehler."""
+    key = (lang, filename)
+    data = _bundles.get(key)
+    if data is not None:
+        return data, True
+    fut = _rendering.get(key)
+    if fut is not None:
+        rendered = await asyncio.shield(fut)
+        if rendered is None:   # erster Aufrufer abgebrochen → selbst rendern
+            return await _render_manual(lang, filename)
+        return rendered
+    fut = asyncio.get_running_loop().create_future()
+    _rendering[key] = fut
+    try:
+        text = HELP_TEXT if lang == "de" else await translate_hybrid_async(HELP_TEXT, target_lang=lang)
+        data = text.encode("utf-8")
+        # deutsches Handbuch als Fallback nicht unter der Zielsprache merken, beim nächsten Mal erneut
+        cacheable = lang == "de" or text != HELP_TEXT
+        if cacheable:
+            _bundles[key] = data
+        fut.set_result((data, cacheable))
+        return data, cacheable
+    finally:
+        # nicht abbrechen: die übrigen Wartenden wurden nicht gecancelt und rendern selbst
+        if not fut.done():
+            fut.set_result(None)
+        _rendering.pop(key, None)
+
+
+async def send_manual_document(message, context: ContextTypes.DEFAULT_TYPE, lang: str,
+                               filename: str, caption: str | None = None):
+    """Handbuch als Datei senden: gecachte file_id, sonst das In-Memory-Bundle hochladen."""
+    file_ids = context.bot_data.setdefault("manual_file_ids", {})
+    id_key = f"{_HELP_DIGEST}:{lang}:{filename}"
+    file_id = file_ids.get(id_key)
+    if file_id:
+        try:
+            return await message.reply_document(document=file_id, caption=caption)
+        except BadRequest as e:
+            logger.info(f"Handbuch-file_id {id_key} ungültig, lade neu hoch: {e}")
+            file_ids.pop(id_key, None)
+
+    data, cacheable = await _render_manual(lang, filename)
+    sent = await message.reply_document(document=data, filename=filename, caption=caption)
+    if cacheable and sent and sent.document:
+        file_ids[id_key] = sent.document.file_id
+    return sent
+
+
 async def send_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Sendet das Benutzerhandbuch in der Nutzersprache als Datei
     oder als kurze Nachricht mit Datei, abhängig vom Kontext.
     """
     user_lang = update.effective_user.language_code or 'de'
-    translated = translate_hybrid(HELP_TEXT, target_lang=user_lang)
-    
+
     # Kurze Einleitung senden
-    intro_text = translate_hybrid("*GreenyGroupManager - Handbuch*\n\nHier ist das vollständige Benutzerhandbuch als Datei:", 
-                                 target_lang=user_lang)
+    intro_text = await translate_hybrid_async("*GreenyGroupManager - Handbuch*\n\nHier ist das vollständige Benutzerhandbuch als Datei:",
+                                              target_lang=user_lang)
     await update.message.reply_text(intro_text, parse_mode='Markdown')
-    
-    # Handbuch als Datei senden
-    file_name = f"GreenyGroupManager_Manual_{user_lang}.txt"
-    with open(file_name, 'w', encoding='utf-8') as f:
-        f.write(translated)
-    
-    with open(file_name, 'rb') as f:
-        await update.message.reply_document(
-            document=f,
-            filename=file_name,
-            caption=translate_hybrid("Benutzerhandbuch", target_lang=user_lang)
-        )
-    
-    # Optional: Temporäre Datei löschen
-    import os
-    os.remove(file_name)
+
+    # Handbuch als Datei senden (aus dem Speicher bzw. per file_id)
+    await send_manual_document(
+        update.message, context, user_lang,
+        filename=f"GreenyGroupManager_Manual_{user_lang}.txt",
+        caption=await translate_hybrid_async("Benutzerhandbuch", target_lang=user_lang)
+    )
 
 help_handler = CommandHandler('help', send_manual)
 
-__all__ = ['help_handler']
+__all__ = ['help_handler', 'send_manual_document']
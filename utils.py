@@ -8,7 +8,8 @@ from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import ExtBot
 from telegram import ChatMember
 from database import list_members, remove_member
-from translator import translate_hybrid
+from translator import translate_hybrid_async
+import ai_client
 
 logger = logging.getLogger(__name__)
 
@@ -94,11 +95,12 @@ async def clean_delete_accounts_for_chat(chat_id: int, bot: ExtBot, *, dry_run:
 
     return removed
 
-def tr(text: str, lang: str) -> str:
+async def tr_async(text: str, lang: str) -> str:
+    # für Handler: Katalog/LRU-Treffer sofort, ein Miss übersetzt ohne den Event-Loop zu blockieren
     try:
-        return translate_hybrid(text, lang)
+        return await translate_hybrid_async(text, lang)
     except Exception as e:
-        logger.error(f"Fehler in tr(): {e}")
+        logger.error(f"Fehler in tr_async(): {e}")
         return text
 
 def is_deleted_account(member) -> bool:
@@ -123,18 +125,14 @@ async def ai_summarize(text: str, lang: str = "de") -> str | None:
     - Opt-in per group_settings.ai_rss_summary
     - Falls OPENAI_API_KEY fehlt oder lib nicht installiert => None
     """
-    key = os.getenv("OPENAI_API_KEY")
-    if not key or not text:
+    if not ai_client.available() or not text:
         return None
     try:
-        # lazy import (damit wir ohne openai laufen können)
-        from openai import OpenAI
-        client = OpenAI(api_key=key)
         prompt = (
             f"Fasse die folgende News extrem knapp auf {lang} zusammen "
             f"(max. 2 Sätze, keine Floskeln):\n\n{text}"
         )
-        resp = client.chat.completions.create(
+        resp = await ai_client.chat(
             model="gpt-4o-mini",
             messages=[{"role":"system","content":"Du schreibst kurz, sachlich, deutsch."},
                       {"role":"user","content":prompt}],
@@ -160,22 +158,28 @@ def _extract_domains_from_text(text:str) -> list[str]:
     return doms
 
 def ai_available() -> bool:
-    return bool(os.getenv("OPENAI_API_KEY"))
+    return ai_client.available()
 
-async def ai_moderate_image(image_url:str) -> dict|None:
+_VISION_KEYS = ("nudity","sexual_minors","violence","weapons","gore")
+
+def _vision_scores(out: dict) -> dict:
+    # Normiere & sichere Keys
+    out = dict(out or {})
+    for k in _VISION_KEYS:
+        out[k] = float(out.get(k,0))
+    return out
+
+async def ai_moderate_image(image_url:str, detail:str="auto") -> dict|None:
     """
     Liefert Scores 0..1 für: nudity, sexual_minors, violence, weapons, gore.
-    Nutzt gpt-4o-mini (Vision) per JSON-Ausgabe.
+    Nutzt gpt-4o-mini (Vision) per JSON-Ausgabe. image_url darf auch eine data:-URL sein.
     """
-    key = os.getenv("OPENAI_API_KEY")
-    if not key or not image_url:
+    if not ai_client.available() or not image_url:
         return None
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=key)
         prompt = ("Bewerte das Bild. Antworte NUR mit JSON-Objekt: "
                   '{"nudity":0..1,"sexual_minors":0..1,"violence":0..1,"weapons":0..1,"gore":0..1}')
-        res = client.chat.completions.create(
+        res = await ai_client.chat(
             model="gpt-4o-mini",
             temperature=0,
             max_tokens=120,
@@ -183,46 +187,74 @@ async def ai_moderate_image(image_url:str) -> dict|None:
                 {"role":"system","content":"Du antwortest ausschließlich mit JSON."},
                 {"role":"user","content":[
                     {"type":"text","text":prompt},
-                    {"type":"image_url","image_url":{"url": image_url}}
+                    {"type":"image_url","image_url":{"url": image_url, "detail": detail}}
                 ]}
             ]
         )
         data = res.choices[0].message.content.strip()
-        out = json.loads(data)
-        # Normiere & sichere Keys
-        for k in ("nudity","sexual_minors","violence","weapons","gore"):
-            out[k] = float(out.get(k,0))
-        return out
+        return _vision_scores(json.loads(data))
     except Exception as e:
         logger.info(f"AI vision unavailable: {e}")
         return None
+
+async def ai_moderate_images(image_urls:list[str], detail:str="low") -> list[dict]:
+    """
+    Mehrere Bilder in einem Vision-Request; Ergebnisliste in derselben Reihenfolge.
+    Wirft bei Fehlern/falscher Länge – der Aufrufer fällt dann auf ai_moderate_image zurück.
+    """
+    if len(image_urls) == 1:
+        one = await ai_moderate_image(image_urls[0], detail=detail)
+        if one is None:
+            raise RuntimeError("AI vision unavailable")
+        return [one]
+    prompt = (f"Bewerte jedes der {len(image_urls)} Bilder einzeln, in der gegebenen Reihenfolge. "
+              "Antworte NUR mit JSON: {\"images\":[{\"nudity\":0..1,\"sexual_minors\":0..1,"
+              "\"violence\":0..1,\"weapons\":0..1,\"gore\":0..1}, ...]}")
+    content = [{"type":"text","text":prompt}]
+    content += [{"type":"image_url","image_url":{"url": u, "detail": detail}} for u in image_urls]
+    res = await ai_client.chat(
+        model="gpt-4o-mini",
+        temperature=0,
+        max_tokens=60 + 60 * len(image_urls),
+        response_format={"type": "json_object"},
+        messages=[
+            {"role":"system","content":"Du antwortest ausschließlich mit JSON."},
+            {"role":"user","content":content}
+        ]
+    )
+    items = json.loads(res.choices[0].message.content).get("images") or []
+    if len(items) != len(image_urls):
+        raise ValueError(f"{len(items)} Bewertungen für {len(image_urls)} Bilder")
+    return [_vision_scores(it) for it in items]
     
+def moderation_result(out) -> dict:
+    """Ein Ergebnis des Moderations-Endpoints → {'categories': {...}, 'flagged': bool}."""
+    scores = {}
+    # Map auf unsere Keys
+    cats = out.category_scores or {}
+    if hasattr(cats, "model_dump"):   # openai>=1: pydantic-Modell, Schlüssel wie "self-harm" nur per Alias
+        cats = cats.model_dump(by_alias=True)
+    # heuristische Zuordnung (je nach API-Version)
+    scores["toxicity"]   = float(cats.get("harassment/threats", 0.0) or cats.get("harassment", 0.0))
+    scores["hate"]       = float(cats.get("hate", 0.0) or cats.get("hate/threatening", 0.0))
+    scores["sexual"]     = float(cats.get("sexual/minors", 0.0) or cats.get("sexual", 0.0))
+    scores["harassment"] = float(cats.get("harassment", 0.0))
+    scores["selfharm"]   = float(cats.get("self-harm", 0.0))
+    scores["violence"]   = float(cats.get("violence", 0.0) or cats.get("violence/graphic", 0.0))
+    return {"categories": scores, "flagged": bool(out.flagged)}
+
 async def ai_moderate_text(text:str, model:str="omni-moderation-latest") -> dict|None:
     """
     Rückgabe: {'categories': {'toxicity':score,...}, 'flagged': bool}
     Versucht erst Moderation-API, fallback auf Chat-Classifier (gpt-4o-mini).
     """
-    key = os.getenv("OPENAI_API_KEY")
-    if not key or not text:
+    if not ai_client.available() or not text:
         return None
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=key)
         try:
             # Moderations-Endpoint
-            res = client.moderations.create(model=model, input=text)
-            out = res.results[0]
-            scores = {}
-            # Map auf unsere Keys
-            cats = out.category_scores or {}
-            # heuristische Zuordnung (je nach API-Version)
-            scores["toxicity"]   = float(cats.get("harassment/threats", 0.0) or cats.get("harassment", 0.0))
-            scores["hate"]       = float(cats.get("hate", 0.0) or cats.get("hate/threatening", 0.0))
-            scores["sexual"]     = float(cats.get("sexual/minors", 0.0) or cats.get("sexual", 0.0))
-            scores["harassment"] = float(cats.get("harassment", 0.0))
-            scores["selfharm"]   = float(cats.get("self-harm", 0.0))
-            scores["violence"]   = float(cats.get("violence", 0.0) or cats.get("violence/graphic", 0.0))
-            return {"categories": scores, "flagged": bool(out.flagged)}
+            res = await ai_client.moderate(model=model, input=text)
+            return moderation_result(res.results[0])
         except Exception:
             # Fallback via Chat-Classifier
             prompt = (
@@ -230,7 +262,7 @@ async def ai_moderate_text(text:str, model:str="omni-moderation-latest") -> dict
                 "toxicity,hate,sexual,harassment,selfharm,violence (Werte 0..1). "
                 "Nur das JSON, keine Erklärungen.\n\n" + text[:6000]
             )
-            res = client.chat.completions.create(
+            res = await ai_client.chat(
                 model="gpt-4o-mini",
                 messages=[{"role":"system","content":"Du antwortest nur mit JSON."},
                           {"role":"user","content":prompt}],
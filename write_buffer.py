@@ -0,0 +1,320 @@
+"""
+Write-behind-Puffer für Hot-Path-Inserts (Message-Logs, Tageszähler, Members …).
+
+Statt pro Nachricht mehrere Einzel-INSERTs abzusetzen, werden die Zeilen hier
+gesammelt und alle DB_WRITE_BEHIND_FLUSH_MS bzw. ab DB_WRITE_BEHIND_MAX_ROWS
+Zeilen geschrieben – je Tabelle ein Multi-Row-Statement (execute_values) in einer eigenen
+Transaktion, Upserts vorher im Speicher zusammengeführt.
+
+Fehler: Verbindungsprobleme (is_transient) legen die Zeilen unverändert zurück. Scheitert ein
+Batch an den Daten (Constraint, FK, Typ), wird die Tabelle Zeile für Zeile geschrieben; nur
+die schuldigen Zeilen bleiben zurück und werden bei den nächsten Flushes einzeln wiederholt.
+Nach DB_WRITE_BEHIND_MAX_ATTEMPTS Fehlversuchen landen sie im Dead-Letter-Log
+(logger.error + get_dead_letters()), statt andere Tabellen aufzuhalten.
+
+Die eigentliche Schreibfunktion liefert database.py (configure), die Tabellen
+registrieren sich per register_table(). Lesende Zählungen, die eigene Zeilen sehen müssen
+(Tageslimit, KI-Eskalation), addieren count_pending() statt vorher zu flushen.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = (os.getenv("DB_WRITE_BEHIND", "1").strip().lower() not in ("0", "false", "no", "off"))
+FLUSH_INTERVAL_MS = int(os.getenv("DB_WRITE_BEHIND_FLUSH_MS", "500"))
+FLUSH_MAX_ROWS = int(os.getenv("DB_WRITE_BEHIND_MAX_ROWS", "500"))
+# Harte Obergrenze im Speicher: darüber schreibt der Aufrufer selbst (Backpressure)
+MAX_PENDING_ROWS = int(os.getenv("DB_WRITE_BEHIND_MAX_PENDING", "20000"))
+MAX_ATTEMPTS = int(os.getenv("DB_WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+DEAD_LETTER_KEEP = int(os.getenv("DB_WRITE_BEHIND_DEAD_LETTERS", "200"))
+
+
+class TableSpec:
+    """SQL + optionale Merge-Funktion für eine gepufferte Tabelle."""
+    __slots__ = ("name", "sql", "template", "merge")
+
+    def __init__(self, name: str, sql: str, template: str | None = None, merge=None):
+        self.name = name
+        self.sql = sql            # INSERT … VALUES %s … (für execute_values)
+        self.template = template
+        self.merge = merge        # rows -> rows (z. B. Zähler addieren, Duplikate entfernen)
+
+
+_specs: dict[str, TableSpec] = {}
+
+
+def register_table(name: str, sql: str, template: str | None = None, merge=None) -> None:
+    _specs[name] = TableSpec(name, sql, template, merge)
+
+
+def merge_sum(key_len: int):
+    """Merge für Zähler-Upserts: gleiche Schlüssel (erste key_len Felder) → letztes Feld addieren."""
+    def _merge(rows):
+        acc: dict = {}
+        for r in rows:
+            k = r[:key_len]
+            acc[k] = acc.get(k, 0) + r[-1]
+        return [k + (n,) for k, n in acc.items()]
+    return _merge
+
+
+def merge_unique(key_len: int, combine=None):
+    """Merge für Upserts: pro Schlüssel nur eine Zeile (sonst 'ON CONFLICT … cannot affect row a second time')."""
+    def _merge(rows):
+        acc: dict = {}
+        for r in rows:
+            k = r[:key_len]
+            prev = acc.get(k)
+            acc[k] = combine(prev, r) if (prev is not None and combine) else r
+        return list(acc.values())
+    return _merge
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_interval_ms: int, max_rows: int, max_pending: int, max_attempts: int = MAX_ATTEMPTS):
+        self.flush_interval = max(0.01, flush_interval_ms / 1000.0)
+        self.max_rows = max(1, max_rows)
+        self.max_pending = max(self.max_rows, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self._writer = None
+        self._is_transient = lambda exc: False
+        self._rows: dict[str, list] = {}
+        self._pending = 0
+        # einzeln zu wiederholende Zeilen: Tabelle → [(Zeile, Fehlversuche)]
+        self._retry: dict[str, list] = {}
+        self._retry_rows = 0
+        # gerade im Flush befindliche Zeilen (Tabelle → Zeilen), damit count_pending sie mitzählt
+        self._writing: dict[str, list] = {}
+        self.dead_letters: deque = deque(maxlen=max(1, DEAD_LETTER_KEEP))
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+        self.stats = {"enqueued": 0, "flushed_rows": 0, "flushes": 0, "flush_errors": 0,
+                      "backpressure": 0, "dropped": 0, "row_retries": 0, "dead_lettered": 0}
+
+    # --- Konfiguration ---
+    def configure(self, writer, is_transient=None) -> None:
+        """
+        writer(spec: TableSpec, rows: list[tuple]) schreibt eine Tabelle in einer eigenen Transaktion.
+        is_transient(exc) → True für Verbindungs-/Pool-Fehler (Zeilen zurücklegen, nicht zählen).
+        """
+        self._writer = writer
+        if is_transient is not None:
+            self._is_transient = is_transient
+
+    def pending(self) -> int:
+        return self._pending + self._retry_rows
+
+    def count_pending(self, table: str, match) -> int:
+        """
+        Noch nicht geschriebene Zeilen von `table`, für die match(row) gilt – inklusive der Zeilen,
+        die ein laufender Flush gerade schreibt. Vor dem DB-Lesen aufrufen: eine Zeile, die
+        dazwischen committet wird, zählt dann doppelt statt gar nicht (im Zweifel zu hoch).
+        """
+        with self._cond:
+            rows = list(self._rows.get(table, ())) + list(self._writing.get(table, ()))
+            rows += [r for r, _ in self._retry.get(table, ())]
+        return sum(1 for r in rows if match(r))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+            self._thread.start()
+
+    # --- Einreihen ---
+    def offer(self, table: str, row: tuple) -> bool:
+        """Nimmt eine Zeile an, solange das Speicherlimit nicht erreicht ist (nie blockierend)."""
+        with self._cond:
+            if self._pending >= self.max_pending:
+                return False
+            self._rows.setdefault(table, []).append(row)
+            self._pending += 1
+            self.stats["enqueued"] += 1
+            if self._pending >= self.max_rows:
+                self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    def put(self, table: str, row: tuple) -> None:
+        """Wie offer(), bei vollem Puffer schreibt der Aufrufer selbst (Backpressure)."""
+        while not self.offer(table, row):
+            self.stats["backpressure"] += 1
+            if not self.flush():
+                # DB nicht erreichbar und Puffer voll → älteste Zeilen opfern statt unbegrenzt zu wachsen
+                self._shed()
+
+    # --- Schreiben ---
+    def _take(self):
+        with self._cond:
+            rows, self._rows = self._rows, {}
+            retry, self._retry = self._retry, {}
+            self._pending = 0
+            self._writing = {t: list(lst) for t, lst in rows.items()}
+            for t, items in retry.items():
+                self._writing.setdefault(t, []).extend(r for r, _ in items)
+        return rows, retry
+
+    def _done(self, table: str, restore: list = (), retry: list = ()):
+        """Tabelle fertig: Zeilen aus _writing nehmen, Übriggebliebenes zurücklegen."""
+        with self._cond:
+            self._writing.pop(table, None)
+            if restore:
+                self._rows[table] = list(restore) + self._rows.get(table, [])
+                self._pending += len(restore)
+            if retry:
+                self._retry.setdefault(table, []).extend(retry)
+
+    def _shed(self):
+        with self._cond:
+            over = self._pending - self.max_pending + self.max_rows
+            for table in list(self._rows):
+                if over <= 0:
+                    break
+                lst = self._rows[table]
+                n = min(over, len(lst))
+                del lst[:n]
+                self._pending -= n
+                over -= n
+                self.stats["dropped"] += n
+        logger.warning("Write-behind: Puffer voll, älteste Zeilen verworfen (gesamt %s)", self.stats["dropped"])
+
+    def _dead_letter(self, spec: TableSpec, row: tuple, exc: Exception) -> None:
+        self.stats["dead_lettered"] += 1
+        self.dead_letters.append((time.time(), spec.name, row, repr(exc)))
+        logger.error("Write-behind: Zeile für %s nach %s Versuchen verworfen: %r (%s)",
+                     spec.name, self.max_attempts, row, exc)
+
+    def _write_rows(self, spec: TableSpec, items: list) -> list:
+        """Zeilen einzeln schreiben. Liefert die noch offenen [(Zeile, Versuche)]."""
+        left = []
+        for i, (row, attempts) in enumerate(items):
+            try:
+                self._writer(spec, [row])
+                self.stats["flushed_rows"] += 1
+            except Exception as e:
+                if self._is_transient(e):
+                    # DB weg: Rest unverändert zurücklegen, nicht weiter hämmern
+                    return left + items[i:]
+                attempts += 1
+                self.stats["row_retries"] += 1
+                if attempts >= self.max_attempts:
+                    self._dead_letter(spec, row, e)
+                else:
+                    left.append((row, attempts))
+        return left
+
+    def flush(self) -> bool:
+        """Schreibt alles Ausstehende. True = alles geschrieben (oder nichts zu tun)."""
+        if self._writer is None:
+            return False
+        with self._flush_lock:
+            rows, retry = self._take()
+            if not rows and not retry:
+                return True
+            ok = True
+            for table in list(rows) + [t for t in retry if t not in rows]:
+                spec = _specs.get(table)
+                if spec is None:
+                    self._done(table)
+                    continue
+                items = retry.get(table, [])
+                fresh = rows.get(table) or []
+                if fresh:
+                    merged = spec.merge(fresh) if spec.merge else fresh
+                    try:
+                        self._writer(spec, merged)
+                        self.stats["flushes"] += 1
+                        self.stats["flushed_rows"] += len(fresh)
+                    except Exception as e:
+                        self.stats["flush_errors"] += 1
+                        if self._is_transient(e):
+                            logger.warning("Write-behind: %s (%s Zeilen) nicht geschrieben, erneuter Versuch folgt: %s",
+                                           table, len(fresh), e)
+                            self._done(table, restore=fresh, retry=items)
+                            ok = False
+                            continue
+                        logger.warning("Write-behind: Batch %s (%s Zeilen) fehlgeschlagen, schreibe einzeln: %s",
+                                       table, len(merged), e)
+                        items = items + [(r, 0) for r in merged]
+                left = self._write_rows(spec, items) if items else []
+                self._done(table, retry=left)
+                if left:
+                    ok = False
+            with self._cond:
+                self._retry_rows = sum(len(lst) for lst in self._retry.values())
+            return ok
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if self._pending < self.max_rows:
+                    self._cond.wait(self.flush_interval)
+            if self.pending():
+                if not self.flush():
+                    time.sleep(min(5.0, self.flush_interval * 4))
+
+    def close(self) -> None:
+        """Stoppt den Hintergrund-Thread und schreibt den Rest (post_shutdown / atexit)."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for _ in range(3):
+            if not self.pending() or self.flush():
+                break
+        if self.pending():
+            logger.error("Write-behind: %s Zeilen konnten beim Shutdown nicht geschrieben werden", self.pending())
+
+
+_buffer = WriteBehindBuffer(FLUSH_INTERVAL_MS, FLUSH_MAX_ROWS, MAX_PENDING_ROWS)
+
+
+def configure(writer, is_transient=None) -> None:
+    _buffer.configure(writer, is_transient)
+
+
+def is_enabled() -> bool:
+    return WRITE_BEHIND_ENABLED and _buffer._writer is not None and not _buffer._stopped
+
+
+def offer(table: str, row: tuple) -> bool:
+    return _buffer.offer(table, row)
+
+
+def put(table: str, row: tuple) -> None:
+    _buffer.put(table, row)
+
+
+def pending() -> int:
+    return _buffer.pending()
+
+
+def count_pending(table: str, match) -> int:
+    return _buffer.count_pending(table, match)
+
+
+def flush() -> bool:
+    return _buffer.flush()
+
+
+def close() -> None:
+    _buffer.close()
+
+
+def get_stats() -> dict:
+    return dict(_buffer.stats, pending=_buffer.pending())
+
+
+def get_dead_letters(limit: int = 20) -> list[tuple]:
+    """Zuletzt verworfene Zeilen: (unix_ts, tabelle, zeile, fehler), neueste zuerst."""
+    return list(_buffer.dead_letters)[-limit:][::-1]
+
+
+atexit.register(close)